@@ -1,18 +1,17 @@
 import configparser
+import functools
 import pathlib
-import platform
 import sys
-from datetime import datetime as dt
-from importlib.metadata import version
 from typing import List, Tuple
 
-from loguru import logger as LOGGER
+from kodi_logger import LOGGER
 
 PACKAGE_NAME = "kodi_cli"
 
 
 # -- Version routines ----------------------------------------------------------------------------------
 def get_version() -> str:
+    from importlib.metadata import version
     try:
         ver = version(PACKAGE_NAME)
     except:
@@ -31,6 +30,7 @@ def get_version() -> str:
 
 def _get_version_from_mod_time() -> str:
     # version based on the mod timestamp of the most current updated python code file
+    from datetime import datetime as dt
     file_list = list(pathlib.Path(__file__).parent.glob("**/*.py"))
     ver_date = dt(2000,1,1,0,0,0,0)
     for file_nm in file_list:
@@ -38,6 +38,7 @@ def _get_version_from_mod_time() -> str:
     ver = f'{ver_date.year}.{ver_date.month}.{ver_date.day}'
     return ver
 
+@functools.lru_cache(maxsize=None)
 def resolve_config_location(file_name: str) -> str:
     LOGGER.trace(f'Attempting to resolve location for: {file_name}')
     found_location = file_name
@@ -62,6 +63,7 @@ def get_host_info() -> dict:
     - OS Release, Type and Version
     - Python version
     """
+    import platform
     host_info = {}
     host_info['Hostname'] = platform.node()
     host_info['Processor'] = platform.processor()
@@ -71,6 +73,26 @@ def get_host_info() -> dict:
     host_info['Python'] = platform.python_version()
     return host_info
 
+# -- Host routines -------------------------------------------------------------------------------------
+def resolve_hosts(host_spec: str) -> List[str]:
+    """
+    Expand a host specification into a list of hosts.
+    host_spec is a hostname, a comma separated list of hostnames, or the name of a
+    group in the [HOST_GROUPS] config section (i.e. living_room = kodi001,kodi002).
+    """
+    hosts = []
+    for token in str(host_spec).split(','):
+        token = token.strip()
+        if not token:
+            continue
+        if _CONFIG.has_option(HOST_GROUPS_SECTION, token):
+            group_hosts = _CONFIG.get(HOST_GROUPS_SECTION, token).split(',')
+            hosts.extend([ x.strip() for x in group_hosts if x.strip() ])
+        else:
+            hosts.append(token)
+    # Remove duplicates, keep order
+    return list(dict.fromkeys(hosts))
+
 # -- Config file routines ------------------------------------------------------------------------------
 def _get_section_desc(key: str) -> Tuple[str, str]:
     entry = _KEYWORD_SECTIONS.get(key, None)
@@ -114,6 +136,9 @@ def create_template_config(overwrite: bool = False):
             new_config[section] = {}
         val =  getattr(this_module, keyword, 'TBD')
         new_config[section][keyword] = str(val)
+    if _CONFIG.has_section(HOST_GROUPS_SECTION):
+        # Host groups are user defined, carry them over
+        new_config[HOST_GROUPS_SECTION] = dict(_CONFIG.items(HOST_GROUPS_SECTION))
 
     notes = _config_notes_block()
     with open(filename, 'w',) as h_file:
@@ -168,6 +193,8 @@ CONFIG_EXISTS = pathlib.Path(FILE_CONFIG).exists()
 _CONFIG = configparser.ConfigParser()
 _CONFIG.read(FILE_CONFIG)
 
+HOST_GROUPS_SECTION = 'HOST_GROUPS'
+
 # ===================================================================================================================
 _KEYWORD_SECTIONS = {
     "logging_enabled":      {"section": "LOGGING", "desc": "Turn on/off file logging"},
@@ -177,24 +204,50 @@ _KEYWORD_SECTIONS = {
     "logging_level":        {"section": "LOGGING", "desc": "Log level (ERROR, WARNING, INFO, DEBUG, TRACE)"},
     "logger_blacklist":     {"section": "LOGGING", "desc": "Comma seperated list of Loggers to disable"},
 
-    "host":                 {"section": "SERVER", "desc": "Target Kodi Host"},
+    "host":                 {"section": "SERVER", "desc": "Target Kodi Host(s), hostname, list (a,b) or HOST_GROUPS name"},
     "port":                 {"section": "SERVER", "desc": "Kodi service listening port"},
+    "pool_size":            {"section": "SERVER", "desc": "Max keep-alive connections per host"},
+    "transport":            {"section": "SERVER", "desc": "http (port) or tcp (tcp_port, raw json-rpc, pipelined)"},
+    "tcp_port":             {"section": "SERVER", "desc": "Kodi json-rpc tcp port"},
+    "validate_params":      {"section": "SERVER", "desc": "Check parameters against the method definitions before sending"},
+    "retry_attempts":       {"section": "SERVER", "desc": "Attempts for read-only (Get*) calls failing on connection errors/timeouts (1 = no retry)"},
+    "retry_backoff":        {"section": "SERVER", "desc": "Seconds before the first retry, doubled (with jitter) for each retry"},
+    "retry_deadline":       {"section": "SERVER", "desc": "No retry is started after this many seconds"},
+    "breaker_threshold":    {"section": "SERVER", "desc": "Consecutive failures before calls to a host fail fast (0 = off)"},
+    "breaker_probe":        {"section": "SERVER", "desc": "Seconds between background checks of a failing host"},
     "kodi_user":            {"section": "LOGIN",  "desc": "Kodi username"},
     "kodi_pw":              {"section": "LOGIN",  "desc": "Kodi password"},
+    "response_cache":       {"section": "CACHE",  "desc": "Cache responses of read-only (Get*) methods"},
+    "cache_ttl":            {"section": "CACHE",  "desc": "Seconds a cached response is used (default)"},
+    "cache_namespace_ttls": {"section": "CACHE",  "desc": "Per namespace seconds, i.e. Player=0,Addons=900 (0 = no caching)"},
+    "cache_size":           {"section": "CACHE",  "desc": "Max cached responses"},
+    "library_db":           {"section": "CACHE",  "desc": "Local library mirror (sqlite) used by kodi-cli query"},
     "format_output":        {"section": "OUTPUT", "desc": "Output in JSON readable format"},
     "csv_output":           {"section": "OUTPUT", "desc": "Output in CSV format"},
+    "output_format":        {"section": "OUTPUT", "desc": "Output format of list results: json, csv, tsv or ndjson"},
+    "metrics_file":         {"section": "OUTPUT", "desc": "Append per-request metrics (ndjson) to this file, blank = off"},
 }
 
 # ===================================================================================================================
-__version__ = get_version()
+def __getattr__(name: str):
+    # Values that are expensive to determine are resolved on first reference
+    if name == '__version__':
+        value = get_version()
+    elif name == 'logging_filename':
+        value = _CONFIG.get(_get_section_desc('logging_filename')[0], 'logging_filename', fallback=None)
+        if value is None:
+            value = resolve_config_location(f'{PACKAGE_NAME}.log')
+    else:
+        raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
+    setattr(sys.modules[__name__], name, value)
+    return value
 
 DEFAULT_FILE_LOGFMT = "<green>{time:MM/DD/YY HH:mm:ss}</green> |<level>{level: <8}</level>|<cyan>{name:12}</cyan>|<cyan>{line:3}</cyan>| <level>{message}</level>"
 DEFAULT_CONSOLE_LOGFMT = "<level>{message}</level>"
 DEBUG_CONSOLE_LOGFMT = "[<level>{level: <8}</level>] <cyan>{name:15}</cyan>[<cyan>{line:3}</cyan>] <level>{message}</level>"
 
 logging_enabled: str    = _CONFIG.getboolean(_get_section_desc('logging_enabled')[0], 'logging_enabled', fallback=False)
-_default_log_name = resolve_config_location(f'{PACKAGE_NAME}.log')
-logging_filename: str   = _CONFIG.get(_get_section_desc('logging_filename')[0],       'logging_filename', fallback=_default_log_name)
+# logging_filename: str - resolved on first reference, see __getattr__()
 logging_rotation: str   = _CONFIG.get(_get_section_desc('logging_rotation')[0],       'logging_rotation', fallback='1 MB')
 logging_retention: int  = _CONFIG.getint(_get_section_desc('logging_retention')[0],   'logging_retention', fallback=3)
 logging_level: str      = _CONFIG.get(_get_section_desc('logging_level')[0],          'logging_level',    fallback='INFO')
@@ -202,10 +255,27 @@ logger_blacklist: str   = _CONFIG.get(_get_section_desc('logger_blacklist')[0],
 
 host: str               = _CONFIG.get(_get_section_desc('host')[0], 'host', fallback='localhost')
 port: int               = _CONFIG.getint(_get_section_desc('port')[0], 'port', fallback=8080)
+pool_size: int          = _CONFIG.getint(_get_section_desc('pool_size')[0], 'pool_size', fallback=10)
+transport: str          = _CONFIG.get(_get_section_desc('transport')[0], 'transport', fallback='http')
+tcp_port: int           = _CONFIG.getint(_get_section_desc('tcp_port')[0], 'tcp_port', fallback=9090)
+validate_params: bool   = _CONFIG.getboolean(_get_section_desc('validate_params')[0], 'validate_params', fallback=True)
+retry_attempts: int     = _CONFIG.getint(_get_section_desc('retry_attempts')[0], 'retry_attempts', fallback=3)
+retry_backoff: float    = _CONFIG.getfloat(_get_section_desc('retry_backoff')[0], 'retry_backoff', fallback=0.25)
+retry_deadline: float   = _CONFIG.getfloat(_get_section_desc('retry_deadline')[0], 'retry_deadline', fallback=10.0)
+breaker_threshold: int  = _CONFIG.getint(_get_section_desc('breaker_threshold')[0], 'breaker_threshold', fallback=3)
+breaker_probe: float    = _CONFIG.getfloat(_get_section_desc('breaker_probe')[0], 'breaker_probe', fallback=5.0)
 
 kodi_user: str          = _CONFIG.get(_get_section_desc('kodi_user')[0], 'kodi_user', fallback='kodi')
 kodi_pw: str            =_CONFIG.get(_get_section_desc('kodi_pw')[0], 'kodi_pw', fallback='kodi')
 
+response_cache: bool    = _CONFIG.getboolean(_get_section_desc('response_cache')[0], 'response_cache', fallback=False)
+cache_ttl: int          = _CONFIG.getint(_get_section_desc('cache_ttl')[0], 'cache_ttl', fallback=300)
+cache_namespace_ttls: str = _CONFIG.get(_get_section_desc('cache_namespace_ttls')[0], 'cache_namespace_ttls', fallback='')
+cache_size: int         = _CONFIG.getint(_get_section_desc('cache_size')[0], 'cache_size', fallback=1000)
+library_db: str         = _CONFIG.get(_get_section_desc('library_db')[0], 'library_db', fallback='~/.kodi_cli/library.sqlite')
+
 format_output: bool     =_CONFIG.getboolean(_get_section_desc('format_output')[0], 'format_output', fallback=False)
 csv_output: bool        =_CONFIG.getboolean(_get_section_desc('csv_output')[0],    'csv_output', fallback=False)
+output_format: str      = _CONFIG.get(_get_section_desc('output_format')[0], 'output_format', fallback='json')
+metrics_file: str       = _CONFIG.get(_get_section_desc('metrics_file')[0], 'metrics_file', fallback='')
 _json_rpc_loc: str      = _CONFIG.get(section='SERVER', option='_json_rpc_loc', fallback='./json-defs')
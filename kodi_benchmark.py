@@ -0,0 +1,420 @@
+"""
+Benchmark suite for kodi-cli, run against the stand-in Kodi server (kodi_mock_server.py).
+
+A mock server process is started with a synthetic library (shows, seasons, episodes, movies,
+songs) and response latency (its own process, so it does not compete with the measured
+code for the GIL), then the selected benchmarks are run:
+
+    startup    CLI cold start (new process per run: help, JSONRPC.Ping, GetMovies)
+    request    KodiObj.send_request latency per call (http and tcp transport)
+    inventory  kodi_libraray_inventory end-to-end wall time and peak memory (new process)
+    output     CSV/TSV/NDJSON/JSON output throughput (items and bytes per second)
+    codec      json codecs (kodi_json: stdlib json, orjson if installed) decoding/encoding large
+               synthetic GetMovies/GetSongs responses (no server involved)
+
+Results are printed and, with -o, written as json.  --compare lists the metrics that
+changed more than --threshold percent from a previous result file.
+
+    python kodi_benchmark.py [-b BENCHMARK ...] [--shows N] [--seasons N] [--episodes N] [--movies N] [--songs N]
+                             [-d DELAY] [-r RUNS] [-n CALLS] [--codec-items N] [-o FILE] [--compare FILE] [--threshold PCT]
+"""
+import argparse
+import contextlib
+import gc
+import json
+import os
+import pathlib
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional, Tuple
+
+from kodi_metrics import percentile
+from kodi_mock_server import LIBRARY_SIZES, MockKodi
+from kodi_transport import JsonResponse
+
+THIS_PATH = pathlib.Path(__file__).absolute().parent
+BENCHMARKS = ['startup', 'request', 'inventory', 'output', 'codec']
+RESULT_VERSION = 1
+MOVIE_PROPERTIES = ['title', 'genre', 'year', 'rating', 'playcount', 'dateadded', 'file']
+
+
+# == Measurement ====================================================================================
+def summarize(times: List[float]) -> dict:
+    """Latency summary (ms) of times (seconds)"""
+    return {
+        'count': len(times),
+        'min_ms': round(min(times) * 1000, 3),
+        'mean_ms': round(statistics.mean(times) * 1000, 3),
+        'p50_ms': round(percentile(times, 50) * 1000, 3),
+        'p95_ms': round(percentile(times, 95) * 1000, 3),
+        'p99_ms': round(percentile(times, 99) * 1000, 3),
+        'max_ms': round(max(times) * 1000, 3),
+    }
+
+def run_process(cmd: List[str], cwd: pathlib.Path) -> Tuple[float, Optional[float], int]:
+    """Run cmd, return (wall seconds, peak rss MB or None if not available, exit code)"""
+    start = time.perf_counter()
+    proc = subprocess.Popen(cmd, cwd=cwd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    if not hasattr(os, 'wait4'):
+        # Windows, no resource usage of the child
+        return_code = proc.wait()
+        return time.perf_counter() - start, None, return_code
+    _, status, usage = os.wait4(proc.pid, 0)
+    elapsed = time.perf_counter() - start
+    proc.returncode = os.waitstatus_to_exitcode(status) if hasattr(os, 'waitstatus_to_exitcode') else status >> 8
+    # ru_maxrss is KB on linux, bytes on macOS
+    peak_mb = usage.ru_maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+    return elapsed, round(peak_mb, 1), proc.returncode
+
+class MockServerProcess:
+    """kodi_mock_server.py in a subprocess (free ports), a context manager"""
+    def __init__(self, library: Dict[str, int], delay: float = 0.0, jitter: bool = False):
+        self._cmd = [sys.executable, '-u', str(THIS_PATH / 'kodi_mock_server.py'), '-p', '0', '-t', '0',
+                     '-n', str(library['movies']), '-d', str(delay)]
+        self._cmd += [ arg for size in LIBRARY_SIZES for arg in (f'--{size}', str(library[size])) ]
+        self._cmd += ['--shuffle'] if jitter else []
+        self._proc: subprocess.Popen = None
+        self.http_port = None
+        self.tcp_port = None
+
+    def start(self) -> 'MockServerProcess':
+        self._proc = subprocess.Popen(self._cmd, cwd=THIS_PATH, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+        # First line: Mock Kodi listening - http: 12345  tcp: 12346  (Ctrl-C to stop)
+        ports = re.search(r'http: (\d+)\s+tcp: (\d+)', self._proc.stdout.readline())
+        if not ports:
+            self.stop()
+            raise RuntimeError('Mock server did not start')
+        self.http_port, self.tcp_port = int(ports.group(1)), int(ports.group(2))
+        return self
+
+    def stop(self):
+        self._proc.terminate()
+        self._proc.wait()
+        self._proc.stdout.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+class _CountingSink:
+    """stdout replacement that only counts what is written (text, or bytes to buffer)"""
+    def __init__(self):
+        self.bytes_written = 0
+        self.buffer = _CountingBuffer(self)
+
+    def write(self, text: str) -> int:
+        self.bytes_written += len(text.encode('utf-8'))
+        return len(text)
+
+    def flush(self):
+        pass
+
+class _CountingBuffer:
+    def __init__(self, sink: _CountingSink):
+        self._sink = sink
+
+    def write(self, data: bytes) -> int:
+        self._sink.bytes_written += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+
+# == Benchmarks =====================================================================================
+def bench_startup(server: MockServerProcess, runs: int) -> dict:
+    """Wall time of new kodi_cli processes"""
+    target = ['-H', '127.0.0.1', '-P', str(server.http_port), '--no-cache']
+    commands = {
+        'help': ['help'],
+        'JSONRPC.Ping': target + ['JSONRPC.Ping'],
+        'VideoLibrary.GetMovies': target + ['VideoLibrary.GetMovies'],
+    }
+    results = {}
+    for name, args in commands.items():
+        times = []
+        errors = 0
+        for _ in range(runs):
+            elapsed, _, return_code = run_process([sys.executable, str(THIS_PATH / 'kodi_cli.py')] + args, THIS_PATH)
+            times.append(elapsed)
+            errors += 1 if return_code != 0 else 0
+        results[name] = dict(summarize(times), errors=errors)
+    return results
+
+def bench_requests(server: MockServerProcess, calls: int, movies: int) -> dict:
+    """send_request latency, one KodiObj per transport (connections reused between calls)"""
+    from kodi_interface import KodiObj
+    requests = {
+        'JSONRPC.Ping': ('JSONRPC', 'Ping', {}),
+        'VideoLibrary.GetMovies': ('VideoLibrary', 'GetMovies', {'properties': MOVIE_PROPERTIES, 'limits': {'start': 0, 'end': movies}}),
+    }
+    results = {}
+    for transport, port in [('http', server.http_port), ('tcp', server.tcp_port)]:
+        kodi = KodiObj('127.0.0.1', port, transport=transport)
+        results[transport] = {}
+        for name, (namespace, method, params) in requests.items():
+            kodi.send_request(namespace, method, params)  # warm up: connection, schema
+            times = []
+            errors = 0
+            response_bytes = 0
+            for _ in range(calls):
+                start = time.perf_counter()
+                success = kodi.send_request(namespace, method, params)
+                times.append(time.perf_counter() - start)
+                errors += 0 if success else 1
+                response_bytes = len(kodi.response or '')
+            results[transport][name] = dict(summarize(times), errors=errors, response_bytes=response_bytes)
+        kodi.close()
+    return results
+
+def bench_inventory(server: MockServerProcess, runs: int, workers: int, library: Dict[str, int]) -> dict:
+    """End-to-end kodi_libraray_inventory runs (tv shows, movies, songs), each in a new process"""
+    items = library['shows'] * library['seasons'] * library['episodes'] + library['movies'] + library['songs']
+    cmd = [sys.executable, str(THIS_PATH / 'kodi_libraray_inventory.py'), '-H', '127.0.0.1', '-P', str(server.http_port),
+           '-t', '-m', '-s', '-w', str(workers)]
+    results = {}
+    for plan in ['bulk', 'season']:
+        times = []
+        peaks = []
+        errors = 0
+        for _ in range(runs):
+            with tempfile.TemporaryDirectory() as work_dir:
+                elapsed, peak_mb, return_code = run_process(cmd + ['--plan', plan], pathlib.Path(work_dir))
+            times.append(elapsed)
+            errors += 1 if return_code != 0 else 0
+            if peak_mb is not None:
+                peaks.append(peak_mb)
+        median = statistics.median(times)
+        results[plan] = dict(summarize(times), errors=errors, items=items,
+                             items_per_sec=round(items / median, 1),
+                             peak_rss_mb=max(peaks) if peaks else None)
+    return results
+
+def bench_output(items: int, runs: int) -> dict:
+    """CSV/TSV/NDJSON/JSON output of a list response of items movies, written to a counting sink"""
+    import kodi_output_factory as output_factory
+    from kodi_schema import KodiSchema
+    kodi = MockKodi(list_size=items)
+    response = kodi.handle({'id': 1, 'jsonrpc': '2.0', 'method': 'VideoLibrary.GetMovies', 'params': {'properties': MOVIE_PROPERTIES}})
+    content = json.dumps(response).encode('utf-8')
+    movies = response['result']['movies']
+
+    factory = output_factory.ObjectFactory()
+    factory.register_builder("CSV", output_factory.CSV_OutputServiceBuilder())
+    factory.register_builder("TSV", output_factory.TSV_OutputServiceBuilder())
+    factory.register_builder("NDJSON", output_factory.NDJSON_OutputServiceBuilder())
+    factory.register_builder("JSON", output_factory.JSON_OutputServiceBuilder())
+    list_schema = KodiSchema(pathlib.Path(__file__).absolute().parent / 'json-defs').get_list_schema('VideoLibrary.GetMovies')
+    outputs = {
+        # a new response each run, as received (not decoded yet)
+        'json': lambda: factory.create("JSON", response=JsonResponse(content)),
+        'json_pretty': lambda: factory.create("JSON", response=JsonResponse(content), pretty=True),
+        'json_items': lambda: factory.create("JSON", items=iter(movies), list_key='movies'),
+        'csv': lambda: factory.create("CSV", response=JsonResponse(content), list_schema=list_schema, properties=MOVIE_PROPERTIES),
+        'csv_items': lambda: factory.create("CSV", items=iter(movies), list_schema=list_schema, properties=MOVIE_PROPERTIES),
+        'tsv': lambda: factory.create("TSV", response=JsonResponse(content), list_schema=list_schema, properties=MOVIE_PROPERTIES),
+        'ndjson': lambda: factory.create("NDJSON", response=JsonResponse(content), list_schema=list_schema, properties=MOVIE_PROPERTIES),
+    }
+    results = {}
+    for name, create in outputs.items():
+        times = []
+        for _ in range(runs):
+            sink = _CountingSink()
+            output_obj = create()
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(sink):
+                output_obj.output_result()
+            times.append(time.perf_counter() - start)
+        median = statistics.median(times)
+        results[name] = dict(summarize(times), items=items, bytes=sink.bytes_written,
+                             items_per_sec=round(items / median, 1),
+                             mb_per_sec=round(sink.bytes_written / median / (1024 * 1024), 2))
+    return results
+
+def synthetic_response(list_key: str, items: int) -> dict:
+    """A GetMovies/GetSongs response with items entries shaped like Kodi's (nested cast/streamdetails, long plots)"""
+    plot = ('A retired détective is drawn back for one last case, «a story» of loyalty, loss and redemption. ' * 3).strip()
+    entries = []
+    for idx in range(items):
+        if list_key == 'movies':
+            entries.append({
+                'movieid': idx + 1, 'label': f'Movie {idx}', 'title': f'Movie {idx}', 'year': 1950 + idx % 75,
+                'rating': round(5 + (idx % 50) / 10, 6), 'votes': str(1000 + idx), 'playcount': idx % 3,
+                'runtime': 5400 + idx % 3600, 'genre': ['Drama', 'Thriller'], 'director': [f'Director {idx % 97}'],
+                'plot': plot, 'tagline': f'Tagline {idx}', 'mpaa': 'Rated PG-13', 'dateadded': '2023-04-01 20:15:00',
+                'file': f'smb://nas/movies/Movie {idx} ({1950 + idx % 75})/Movie {idx}.mkv',
+                'cast': [ {'name': f'Actor {idx % 500 + n}', 'role': f'Role {n}', 'order': n,
+                           'thumbnail': f'image://http%3a%2f%2fimage.tmdb.org%2f{idx}_{n}.jpg/'} for n in range(5) ],
+                'streamdetails': {'audio': [{'channels': 6, 'codec': 'eac3', 'language': 'eng'}],
+                                  'subtitle': [{'language': 'eng'}, {'language': 'fre'}],
+                                  'video': [{'aspect': 2.3975, 'codec': 'hevc', 'duration': 5400 + idx % 3600,
+                                             'hdrtype': '', 'height': 1080, 'stereomode': '', 'width': 1920}]},
+                'art': {'fanart': f'image://fanart_{idx}.jpg/', 'poster': f'image://poster_{idx}.jpg/'},
+            })
+        else:
+            entries.append({
+                'songid': idx + 1, 'label': f'Song {idx}', 'title': f'Song {idx}', 'artist': [f'Artist {idx % 300}'],
+                'albumartist': [f'Artist {idx % 300}'], 'album': f'Album {idx // 12}', 'track': idx % 12 + 1,
+                'duration': 180 + idx % 240, 'genre': ['Rock', 'Alternative'], 'year': 1970 + idx % 55,
+                'rating': 0, 'userrating': idx % 10, 'playcount': idx % 7, 'lastplayed': '2024-01-31 21:00:00',
+                'file': f'/music/Artist {idx % 300}/Album {idx // 12}/{idx % 12 + 1:02} - Song {idx}.flac',
+                'musicbrainztrackid': f'{idx:08x}-4f2a-4c3b-9d8e-{idx:012x}',
+            })
+    return {'id': 1, 'jsonrpc': '2.0', 'result': {'limits': {'start': 0, 'end': items, 'total': items}, list_key: entries}}
+
+def bench_codec(items: int, runs: int) -> dict:
+    """Decode (bytes -> objects) and encode (compact/pretty) large list responses with each installed codec"""
+    import kodi_json
+    payloads = {}
+    for list_key in ['movies', 'songs']:
+        response = synthetic_response(list_key, items)
+        payloads[list_key] = (response, kodi_json.create_codec('json').dumpb(response))
+    results = {}
+    for name in kodi_json.available_codecs():
+        codec = kodi_json.create_codec(name)
+        results[name] = {}
+        for list_key, (response, content) in payloads.items():
+            operations = {
+                'decode': lambda: codec.loads(content),
+                'encode': lambda: codec.dumpb(response),
+                'encode_pretty': lambda: codec.dumpb(response, pretty=True),
+            }
+            for operation, run in operations.items():
+                times = []
+                for _ in range(runs):
+                    # As timeit: no gc pauses, freeing the result is not timed
+                    gc.collect()
+                    gc.disable()
+                    try:
+                        start = time.perf_counter()
+                        result = run()
+                        times.append(time.perf_counter() - start)
+                    finally:
+                        gc.enable()
+                    del result
+                median = statistics.median(times)
+                results[name][f'{list_key} {operation}'] = dict(summarize(times), items=items, bytes=len(content),
+                                                                items_per_sec=round(items / median, 1),
+                                                                mb_per_sec=round(len(content) / median / (1024 * 1024), 2))
+    return results
+
+
+# == Results ========================================================================================
+def flatten(results: dict, prefix: str = '') -> Dict[str, float]:
+    """Numeric result values keyed by their dotted path (i.e. request.http.JSONRPC.Ping.p50_ms)"""
+    values = {}
+    for key, value in results.items():
+        path = f'{prefix}{key}'
+        if isinstance(value, dict):
+            values.update(flatten(value, f'{path}.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            values[path] = value
+    return values
+
+def compare(current: dict, baseline: dict, threshold: float) -> List[Tuple[str, float, float, float]]:
+    """Return (metric, baseline, current, change %) of the headline metrics that changed more than threshold %"""
+    tracked = ('.p50_ms', '.p95_ms', '.items_per_sec', '.mb_per_sec', '.peak_rss_mb')
+    current_values = flatten(current.get('results', {}))
+    baseline_values = flatten(baseline.get('results', {}))
+    changes = []
+    for metric, value in current_values.items():
+        previous = baseline_values.get(metric)
+        if not metric.endswith(tracked) or not previous:
+            continue
+        change = (value - previous) / previous * 100
+        if abs(change) >= threshold:
+            changes.append((metric, previous, value, change))
+    return changes
+
+def print_summary(results: dict):
+    for benchmark, groups in results.items():
+        print(f'\n{benchmark}\n')
+        print(f'  {"Case":45} {"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9} {"items/s":>11} {"peak MB":>8}')
+        print(f"  {'—'*45} {'—'*9} {'—'*9} {'—'*9} {'—'*11} {'—'*8}")
+        for case, metrics in flatten_cases(groups):
+            items_per_sec = metrics.get('items_per_sec')
+            peak = metrics.get('peak_rss_mb')
+            errors = f'  ({metrics["errors"]} errors)' if metrics.get('errors') else ''
+            print(f'  {case:45} {metrics["p50_ms"]:9.2f} {metrics["p95_ms"]:9.2f} {metrics["p99_ms"]:9.2f} '
+                  f'{items_per_sec if items_per_sec is not None else "":>11} {peak if peak is not None else "":>8}{errors}')
+
+def flatten_cases(groups: dict, prefix: str = '') -> List[Tuple[str, dict]]:
+    """(case name, metrics) of the nested benchmark result groups"""
+    cases = []
+    for name, value in groups.items():
+        if 'p50_ms' in value:
+            cases.append((f'{prefix}{name}', value))
+        else:
+            cases.extend(flatten_cases(value, f'{prefix}{name} '))
+    return cases
+
+def main():
+    parser = argparse.ArgumentParser(description='kodi-cli benchmarks (against kodi_mock_server)')
+    parser.add_argument('-b', '--benchmark', nargs='+', choices=BENCHMARKS, default=BENCHMARKS, help='Benchmarks to run (default all)')
+    parser.add_argument('--shows', type=int, default=20, help='Synthetic library: number of tv shows')
+    parser.add_argument('--seasons', type=int, default=4, help='Synthetic library: seasons per show')
+    parser.add_argument('--episodes', type=int, default=12, help='Synthetic library: episodes per season')
+    parser.add_argument('--movies', type=int, default=500, help='Synthetic library: number of movies')
+    parser.add_argument('--songs', type=int, default=2000, help='Synthetic library: number of songs')
+    parser.add_argument('-d', '--delay', type=float, default=0.0, help='Seconds the mock server delays each response')
+    parser.add_argument('--jitter', action='store_true', help='Random delays (up to -d) instead of a fixed delay')
+    parser.add_argument('-r', '--runs', type=int, default=5, help='Runs per process/output benchmark')
+    parser.add_argument('-n', '--calls', type=int, default=200, help='send_request calls per request benchmark')
+    parser.add_argument('-w', '--workers', type=int, default=4, help='Inventory workers (season plan)')
+    parser.add_argument('--output-items', type=int, default=10000, help='Items in the output benchmark response')
+    parser.add_argument('--codec-items', type=int, default=20000, help='Items in the codec benchmark responses')
+    parser.add_argument('-o', '--output', type=str, help='Write results (json) to this file')
+    parser.add_argument('--compare', type=str, metavar='FILE', help='Compare with a previous result file')
+    parser.add_argument('--threshold', type=float, default=10.0, help='Percent change reported by --compare')
+    args = parser.parse_args()
+
+    library = {'shows': args.shows, 'seasons': args.seasons, 'episodes': args.episodes, 'movies': args.movies, 'songs': args.songs}
+    results = {}
+    with MockServerProcess(library, args.delay, args.jitter) as server:
+        for benchmark in args.benchmark:
+            print(f'Running {benchmark}...', file=sys.stderr)
+            if benchmark == 'startup':
+                results[benchmark] = bench_startup(server, args.runs)
+            elif benchmark == 'request':
+                results[benchmark] = bench_requests(server, args.calls, args.movies)
+            elif benchmark == 'inventory':
+                results[benchmark] = bench_inventory(server, args.runs, args.workers, library)
+            elif benchmark == 'output':
+                results[benchmark] = bench_output(args.output_items, args.runs)
+            elif benchmark == 'codec':
+                results[benchmark] = bench_codec(args.codec_items, args.runs)
+
+    report = {
+        'version': RESULT_VERSION,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'settings': dict(library, delay=args.delay, jitter=args.jitter, runs=args.runs, calls=args.calls,
+                         workers=args.workers, output_items=args.output_items, codec_items=args.codec_items),
+        'results': results,
+    }
+    print_summary(results)
+    if args.output:
+        pathlib.Path(args.output).write_text(json.dumps(report, indent=2), encoding='UTF-8')
+        print(f'\nResults written to {args.output}')
+    if args.compare:
+        baseline = json.loads(pathlib.Path(args.compare).read_text(encoding='UTF-8'))
+        if baseline.get('settings') != report['settings']:
+            print(f'\nNote: {args.compare} was run with other settings')
+        changes = compare(report, baseline, args.threshold)
+        print(f'\nChanged more than {args.threshold}% from {args.compare}\n')
+        for metric, previous, value, change in changes:
+            print(f'  {metric:60} {previous:>12} {value:>12} {change:+7.1f}%')
+        if not changes:
+            print('  none')
+    print()
+
+if __name__ == "__main__":
+    main()
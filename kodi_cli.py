@@ -1,31 +1,32 @@
 import argparse
+import contextlib
+import io
+import itertools
 import os
 import pathlib
+import shlex
 import sys
 import textwrap
-from typing import Tuple
+import threading
+import time
+from typing import Iterator, List, Tuple
 
-from loguru import logger as LOGGER
+from kodi_logger import LOGGER
 
 import cfg
 import kodi_common as util
+import kodi_json
 import kodi_output_factory as output_factory
+from kodi_columns import ListSchema, requested_properties
 from kodi_interface import KodiObj
+from kodi_retry import RetryPolicy
+from kodi_transport import JsonResponse
 
-# CSV_CAPABLE_COMMANDS =  {
-#     'Addons.GetAddons': 'addons',
-#     'AudioLibrary.GetAlbums': 'albums',
-#     'AudioLibrary.GetArtists': 'artists',
-#     'AudioLibrary.GetGenres': 'genres',
-#     'AudioLibrary.GetRecentlyAddedAlbums': 'albums',
-#     'AudioLibrary.GetRecentlyAddedSongs': 'songs',
-#     'AudioLibrary.GetRecentlyPlayedAlbums': 'albums',
-#     'AudioLibrary.GetRecentlyPlayedSongs': 'songs',
-#     'VideoLibrary.GetRecentlyAddedEpisodes': 'episodes' 
-#     }
-    
-
-__version__ = cfg.get_version()
+def __getattr__(name: str):
+    # version lookup is deferred until it is displayed
+    if name == '__version__':
+        return cfg.__version__
+    raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
 
 # # === Validation routines =================================================
 # def is_integer(token: str) -> bool:
@@ -137,11 +138,58 @@ def parse_input(args: list) -> Tuple[str, str, str, dict]:
 
     return reference, namespace, method, parm_kwargs
 
+def _is_method_token(token: str) -> bool:
+    return token.count('.') == 1 and "=" not in token and not token.startswith('.') and not token.endswith('.')
+
+def split_commands(args: list) -> List[list]:
+    """Split CLI command tokens into one token list per Namespace.Method command"""
+    command_list = []
+    for token in args:
+        # a new command starts with Namespace.Method, parameters are always key=value (or help)
+        if not command_list or (_is_method_token(token) and _is_method_token(command_list[-1][0])):
+            command_list.append([token])
+        else:
+            command_list[-1].append(token)
+    return command_list
+
+def run_batch(kodi: KodiObj, factory: output_factory.ObjectFactory, command_list: List[list], batch_size: int) -> int:
+    """Validate and send multiple commands as JSON-RPC batch request(s), output json list of responses"""
+    commands = []
+    for command_args in command_list:
+        _, namespace, method, param_dict = parse_input(command_args)
+        if not kodi.check_command(namespace, method):
+            kodi.help(f'{namespace}.{method}')
+            return -2
+        commands.append((namespace, method, param_dict))
+
+    kodi.send_batch(commands, batch_size)
+    if list_output_format() != 'JSON':
+        LOGGER.info(f'{list_output_format().lower()} option is not available for batch commands...')
+    output_obj = factory.create("JSON", response=kodi.response, pretty=cfg.format_output)
+    output_obj.output_result()
+    return kodi.response_status_code
+
+def run_streamed(kodi: KodiObj, factory: output_factory.ObjectFactory, items: Iterator[dict], list_key: str, list_schema: ListSchema = None,
+                 properties: List[str] = None) -> int:
+    """Output list results (paged or streamed) as they arrive"""
+    first_item = next(items, None)
+    if first_item is None and not kodi.request_success:
+        # Failed on first page, output the error response
+        output_obj = factory.create("JSON", response=kodi.response, pretty=cfg.format_output)
+    else:
+        items = itertools.chain([first_item], items) if first_item is not None else iter([])
+        if list_output_format() != 'JSON':
+            output_obj = factory.create(list_output_format(), list_key=list_key, items=items, list_schema=list_schema, properties=properties)
+        else:
+            output_obj = factory.create("JSON", pretty=cfg.format_output, items=items, list_key=list_key, envelope=lambda: kodi.response)
+    output_obj.output_result()
+    return kodi.response_status_code
+
 # === Intro help page ================================================================================
 def display_script_help(usage: str):
     """Display script help dialog to explain how program works"""
     print()
-    print(f'kodi_cli: v{__version__}\n')
+    print(f'kodi_cli: v{cfg.__version__}\n')
     print(usage)
     print('Commands are based on Kodi namespaces and methods for each namespace.  When executing a command')
     print('you supply the namespace, the method and any parameters (if required).\n')
@@ -207,9 +255,12 @@ def display_program_info():
     LOGGER.info(f'  API version  : {kodi._kodi_api_version}')
     LOGGER.info('')
 
-def initialize_loggers(args: argparse.Namespace):
-    log_filename = pathlib.Path(cfg.logging_filename) # pathlib.Path('./logs/da-photo.log')
+def console_log_format(log_level: str) -> str:
+    if log_level.upper() == 'INFO':
+        return cfg.DEFAULT_CONSOLE_LOGFMT
+    return cfg.DEBUG_CONSOLE_LOGFMT
 
+def initialize_loggers(args: argparse.Namespace):
     log_level = cfg.logging_level
     # if args.verbose:
     #     if args.verbose == 1:
@@ -219,14 +270,10 @@ def initialize_loggers(args: argparse.Namespace):
     #     elif args.verbose > 2:
     #         log_level = 'TRACE' 
         
-    if log_level.upper() == 'INFO':
-        console_format = cfg.DEFAULT_CONSOLE_LOGFMT
-    else:
-        console_format = cfg.DEBUG_CONSOLE_LOGFMT
-
-    c_handle = cfg.configure_logger(log_format=console_format, log_level=log_level)
+    c_handle = cfg.configure_logger(log_format=console_log_format(log_level), log_level=log_level)
     f_handle = -1
     if cfg.logging_enabled:
+        log_filename = pathlib.Path(cfg.logging_filename) # pathlib.Path('./logs/da-photo.log')
         f_handle = cfg.configure_logger(log_filename, log_format=cfg.DEFAULT_FILE_LOGFMT, log_level=log_level,
                                        rotation=cfg.logging_rotation, retention=cfg.logging_retention)
         
@@ -254,8 +301,8 @@ def apply_overrides(args: argparse.Namespace):
             cfg.logging_level = 'TRACE'
 
 # ==== Main script body =================================================================================
-def main() -> int:
-    parser = argparse.ArgumentParser(description=f'Kodi CLI controller  v{__version__}')
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description='Kodi CLI controller')
     parser.formatter_class = argparse.RawDescriptionHelpFormatter
     parser.description = textwrap.dedent('''\
         command is formatted as follows:
@@ -263,23 +310,119 @@ def main() -> int:
 
         example - Retrieve list of 5 addons:
             kodi-cli -H myHost Addons.GetAddons properties=[name,version,summary] limits={start:0,end:5}
+
+        example - Same command on several hosts (or a [HOST_GROUPS] group from the config file):
+            kodi-cli -H kodi001,kodi002,kodi003 Player.GetActivePlayers
+
+        example - Multiple commands, sent as a single batch request:
+            kodi-cli -H myHost Application.GetProperties properties=[muted,volume] Player.GetActivePlayers
+
+        interactive shell / daemon (commands run in one long-lived process):
+            kodi-cli shell
+            kodi-cli daemon [socket_path]     (use kodi-cli-client to send commands)
+
+        notifications (json lines, tcp port):
+            kodi-cli -H myHost listen [Player.OnPlay System.* ...]     (help notifications to list)
+
+        load test (workers, duration or total requests, weighted method mix):
+            kodi-cli -H myHost bench workers=8 duration=30 VideoLibrary.GetMovies limits={start:0,end:100}
+            kodi-cli -H myHost bench requests=5000 mix=JSONRPC.Ping:5,Player.GetActivePlayers:1 report=bench.json
+
+        local library mirror (created with kodi_libraray_inventory --sqlite, no Kodi request):
+            kodi-cli query movies genre=Comedy year=1990-1999 unwatched
+            kodi-cli query unwatched [show name]      (also: search, recent, artist, stats, sql, help)
         ''')
-    parser.add_argument("-H","--host", type=str, default=cfg.host, help="Kodi hostname")
+    parser.add_argument("-H","--host", type=str, default=cfg.host, help="Kodi hostname, list of hosts (a,b,c) or host group name")
+    parser.add_argument("-W","--fanout-workers", type=int, default=8, help="Max hosts called concurrently (multiple hosts)")
     parser.add_argument("-P","--port", type=int, default=cfg.port,help="Kodi RPC listen port")
+    parser.add_argument("--pool-size", type=int, default=cfg.pool_size,help="Max keep-alive connections per host")
+    parser.add_argument("-T","--transport", type=str, choices=['http','tcp'], default=cfg.transport, help="Kodi RPC transport, tcp pipelines requests on one socket")
+    parser.add_argument("--tcp-port", type=int, default=cfg.tcp_port, help="Kodi RPC tcp port (tcp transport)")
+    parser.add_argument("--no-validate", dest="validate_params", action="store_false", default=cfg.validate_params,
+                        help="Send parameters as entered, without checking them against the method definitions")
+    parser.add_argument("--retries", dest="retry_attempts", type=int, default=cfg.retry_attempts,
+                        help="Attempts for read-only calls failing on connection errors/timeouts (1 = no retry)")
+    parser.add_argument("--retry-deadline", type=float, default=cfg.retry_deadline, help="Seconds after which no retry is started")
     parser.add_argument("-u","--kodi-user", type=str, default=cfg.kodi_user,help="Kodi authenticaetion username")
     parser.add_argument("-p","--kodi_pw", type=str, default=cfg.kodi_pw,help="Kodi autentication password")
     parser.add_argument('-C','--create_config', action='store_true', help='Create default config')
     parser.add_argument('-CO','--create_config_overwrite', action='store_true', help='Create default config, overwrite if exists')
+    parser.add_argument("--cache", dest="response_cache", action="store_true", default=cfg.response_cache, help="Cache responses of read-only (Get*) methods")
+    parser.add_argument("--no-cache", dest="response_cache", action="store_false", help="Do not use the response cache")
+    parser.add_argument("--cache-ttl", type=int, default=cfg.cache_ttl, help="Seconds a cached response is used")
+    parser.add_argument("--library-db", type=str, default=cfg.library_db, help="Library mirror used by query")
     parser.add_argument("-f","--format_output", action="store_true", default=cfg.format_output,help="Format json output")
-    parser.add_argument('-c',"--csv-output", action="store_true", default=cfg.csv_output,help="Format csv output (only specific commands)")    
+    parser.add_argument('-c',"--csv-output", action="store_true", default=cfg.csv_output,help="Format csv output (list results, same as -O csv)")
+    parser.add_argument("-O","--output-format", type=str.lower, choices=output_factory.OUTPUT_FORMATS, default=cfg.output_format,
+                        help="Output format of list results (csv/tsv/ndjson rows are written as items are decoded)")
+    parser.add_argument("-s","--stream", action="store_true", help="Parse list results while they are received, output items as they are parsed")
+    parser.add_argument("--page-size", type=int, default=0, help="Retrieve list results in pages of this size (methods with limits)")
+    parser.add_argument("-b","--batch-size", type=int, default=20, help="Max commands per JSON-RPC batch request (multiple commands)")
+    parser.add_argument("--stats", action="store_true", help="Print timing/size statistics of the requests sent (stderr)")
+    parser.add_argument("--metrics-file", type=str, default=cfg.metrics_file, help="Append per-request metrics (ndjson) to this file")
     parser.add_argument("-v","--verbose", action='count', help="Verbose output, -v = INFO, -vv = DEBUG, -vvv TRACE")
     parser.add_argument("-i","--info", action='store_true', help='display program info and quit')
-    parser.add_argument("command", type=str, nargs='*', help="RPC command  namespace.method (help namespace to list)")
-    args = parser.parse_args()
-    
-    apply_overrides(args)
-    initialize_loggers(args)
+    parser.add_argument("command", type=str, nargs='*', help="RPC command(s)  namespace.method (help namespace to list)")
+    return parser
 
+def build_output_factory() -> output_factory.ObjectFactory:
+    factory = output_factory.ObjectFactory()
+    factory.register_builder("CSV", output_factory.CSV_OutputServiceBuilder())
+    factory.register_builder("TSV", output_factory.TSV_OutputServiceBuilder())
+    factory.register_builder("NDJSON", output_factory.NDJSON_OutputServiceBuilder())
+    factory.register_builder("JSON", output_factory.JSON_OutputServiceBuilder())
+    return factory
+
+def list_output_format() -> str:
+    """Output builder for list results: CSV (-c), else the output_format setting"""
+    return 'CSV' if cfg.csv_output else cfg.output_format.upper()
+
+def get_response_cache(kodi_cache: dict) -> 'ResponseCache':
+    """Return the response cache for the current cache settings (None if not enabled)"""
+    if not cfg.response_cache:
+        return None
+    from kodi_response_cache import ResponseCache, parse_namespace_ttls
+    key = ('response_cache', cfg.cache_ttl, cfg.cache_namespace_ttls, cfg.cache_size)
+    response_cache = kodi_cache.get(key)
+    if response_cache is None:
+        response_cache = ResponseCache(max_entries=cfg.cache_size, default_ttl=cfg.cache_ttl,
+                                       namespace_ttls=parse_namespace_ttls(cfg.cache_namespace_ttls))
+        kodi_cache[key] = response_cache
+    return response_cache
+
+def get_kodi(kodi_cache: dict, host: str = None) -> KodiObj:
+    """Return KodiObj for the current host settings, re-using (warm) objects from kodi_cache"""
+    host = host or cfg.host
+    port = cfg.tcp_port if cfg.transport == 'tcp' else cfg.port
+    response_cache = get_response_cache(kodi_cache)
+    retry_policy = RetryPolicy.from_settings(cfg)
+    key = (host, port, cfg.kodi_user, cfg.kodi_pw, cfg._json_rpc_loc, cfg.pool_size, cfg.transport, id(response_cache), cfg.validate_params,
+           repr(retry_policy))
+    kodi = kodi_cache.get(key)
+    if kodi is None:
+        kodi = KodiObj(host, port, cfg.kodi_user, cfg.kodi_pw, cfg._json_rpc_loc, cfg.pool_size, transport=cfg.transport,
+                       response_cache=response_cache, validate_params=cfg.validate_params, retry_policy=retry_policy)
+        kodi_cache[key] = kodi
+    kodi.metrics = kodi_cache.get('metrics')
+    return kodi
+
+def run_measured(args: argparse.Namespace, parser: argparse.ArgumentParser, kodi_cache: dict, factory: output_factory.ObjectFactory) -> int:
+    """dispatch() the command, its requests measured for --stats (summary) and metrics_file (ndjson), if requested"""
+    if not (args.stats or cfg.metrics_file):
+        return dispatch(args, parser, kodi_cache, factory)
+    from kodi_metrics import MetricsRecorder
+    recorder = MetricsRecorder(cfg.metrics_file or None, keep=args.stats)
+    kodi_cache['metrics'] = recorder
+    try:
+        return dispatch(args, parser, kodi_cache, factory)
+    finally:
+        del kodi_cache['metrics']
+        recorder.close()
+        if args.stats:
+            recorder.print_summary()
+
+def dispatch(args: argparse.Namespace, parser: argparse.ArgumentParser, kodi_cache: dict, factory: output_factory.ObjectFactory) -> int:
+    """Run the request described by the (overridden) args"""
     if args.create_config or args.create_config_overwrite:
         # create_config(args)
         try:
@@ -301,7 +444,119 @@ def main() -> int:
         display_script_help(parser.format_usage())
         return -1  # missing arguments
 
-    kodi = KodiObj(cfg.host, cfg.port, cfg.kodi_user, cfg.kodi_pw, cfg._json_rpc_loc)
+    if args.command[0] == 'query':
+        # Answered from the local library mirror, Kodi is not contacted
+        return run_query(args.command[1:], factory)
+    if args.command[0] == 'bench':
+        return run_bench(args.command[1:], kodi_cache, factory)
+
+    hosts = cfg.resolve_hosts(cfg.host)
+    if len(hosts) > 1:
+        return run_fanout(hosts, kodi_cache, factory, args)
+
+    kodi = get_kodi(kodi_cache, hosts[0] if hosts else None)
+    return execute_command(kodi, factory, args)
+
+def run_query(tokens: List[str], factory: output_factory.ObjectFactory) -> int:
+    """Run a canned query (or sql) against the library mirror"""
+    import kodi_library_db
+    import sqlite3
+    if not tokens or tokens[0] == 'help':
+        print('Queries (kodi-cli query <name> [args]):')
+        for name, (_, _, desc) in kodi_library_db.QUERIES.items():
+            print(f'  {name:10} {desc}')
+        return 0
+    try:
+        list_key, rows = kodi_library_db.run_query(cfg.library_db, tokens[0], tokens[1:])
+    except (ValueError, FileNotFoundError, sqlite3.Error) as ex:
+        LOGGER.error(str(ex))
+        return -1
+    if list_output_format() != 'JSON':
+        output_obj = factory.create(list_output_format(), list_key=list_key, items=rows)
+    else:
+        output_obj = factory.create("JSON", pretty=cfg.format_output, items=rows, list_key=list_key)
+    output_obj.output_result()
+    return 0
+
+def run_bench(tokens: List[str], kodi_cache: dict, factory: output_factory.ObjectFactory) -> int:
+    """Load test the host with a method (or mix) from concurrent workers, report throughput/latency/errors/sizes"""
+    import kodi_load
+    try:
+        options, command_args = kodi_load.parse_bench_options(tokens)
+    except ValueError as ve:
+        LOGGER.error(str(ve))
+        return -1
+    hosts = cfg.resolve_hosts(cfg.host)
+    if len(hosts) != 1:
+        LOGGER.error('bench runs against a single host')
+        return -1
+    # A connection per worker, responses are never taken from the response cache
+    port = cfg.tcp_port if cfg.transport == 'tcp' else cfg.port
+    kodi = KodiObj(hosts[0], port, cfg.kodi_user, cfg.kodi_pw, cfg._json_rpc_loc, max(cfg.pool_size, options['workers']),
+                   transport=cfg.transport, validate_params=cfg.validate_params, metrics=kodi_cache.get('metrics'),
+                   retry_policy=RetryPolicy.from_settings(cfg))
+    try:
+        if options['mix']:
+            commands = kodi_load.load_mix(kodi, options['mix'])
+        elif command_args:
+            _, namespace, method, param_dict = parse_input(command_args)
+            if not kodi.check_command(namespace, method, param_dict):
+                return -1
+            commands = [kodi_load.BenchCommand(namespace, method, param_dict)]
+        else:
+            commands = [kodi_load.BenchCommand('JSONRPC', 'Ping')]
+        report = kodi_load.run_load(kodi, commands, options['workers'], options['duration'], options['requests'], options['warmup'])
+    except (ValueError, OSError) as ex:
+        LOGGER.error(str(ex))
+        return -1
+    finally:
+        kodi.close()
+
+    if options['report']:
+        report_file = pathlib.Path(options['report']).expanduser()
+        report_file.write_bytes(kodi_json.dumpb(dict(report, host=hosts[0], transport=cfg.transport, options=options), pretty=True))
+        LOGGER.info(f'Bench report written to {report_file}')
+    if list_output_format() != 'JSON':
+        factory.create(list_output_format(), list_key='methods', items=kodi_load.report_rows(report)).output_result()
+    else:
+        kodi_load.print_report(report, hosts[0])
+    return 0 if report['total'] else -1
+
+def run_fanout(hosts: List[str], kodi_cache: dict, factory: output_factory.ObjectFactory, args: argparse.Namespace) -> int:
+    """Run the command(s) against all hosts concurrently, output is tagged with the host name"""
+    import kodi_fanout
+    kodi = get_kodi(kodi_cache, hosts[0])
+    commands = []
+    for command_args in split_commands(args.command):
+        reference, namespace, method, param_dict = parse_input(command_args)
+        if reference or namespace == "help" or 'help' in param_dict.keys():
+            # help is local, no need to ask every host
+            return execute_command(kodi, factory, args)
+        if not kodi.check_command(namespace, method):
+            kodi.help(f'{namespace}.{method}')
+            return -2
+        commands.append((namespace, method, param_dict))
+
+    cache_lock = threading.Lock()
+    def get_host_kodi(host: str) -> KodiObj:
+        with cache_lock:
+            return get_kodi(kodi_cache, host)
+
+    results = kodi_fanout.fan_out(hosts, get_host_kodi, commands, args.fanout_workers, args.batch_size)
+    list_key = kodi.get_list_key(commands[0][0], commands[0][1]) if len(commands) == 1 else None
+    if list_output_format() != 'JSON':
+        output_obj = factory.create(list_output_format(), list_key=list_key, items=kodi_fanout.fan_out_rows(results, list_key))
+    else:
+        output_obj = factory.create("JSON", response=JsonResponse.from_json(results), pretty=cfg.format_output)
+    output_obj.output_result()
+
+    error_codes = [ entry['status_code'] for entry in results if entry['status_code'] != 0 ]
+    return error_codes[0] if error_codes else 0
+
+def execute_command(kodi: KodiObj, factory: output_factory.ObjectFactory, args: argparse.Namespace) -> int:
+    command_list = split_commands(args.command)
+    if len(command_list) > 1:
+        return run_batch(kodi, factory, command_list, args.batch_size)
 
     # Process command-line input
     reference, namespace, method, param_dict = parse_input(args.command)
@@ -310,7 +565,8 @@ def main() -> int:
         return 0
 
     if namespace == "help":
-        kodi.help()
+        # help [namespace|Namespace.Method|notifications]
+        kodi.help(args.command[1] if len(args.command) > 1 else None)
         return 0
 
     method_sig = f'{namespace}.{method}'
@@ -322,26 +578,187 @@ def main() -> int:
         kodi.help(method_sig)
         return -2
     
-    factory = output_factory.ObjectFactory()
-    factory.register_builder("CSV", output_factory.CSV_OutputServiceBuilder())
-    factory.register_builder("JSON", output_factory.JSON_OutputServiceBuilder())
+    list_schema = kodi.get_list_schema(namespace, method)
+    properties = requested_properties(param_dict)
+    if args.page_size > 0 and kodi.supports_limits(namespace, method):
+        items = kodi.iter_results(namespace, method, param_dict, args.page_size, prefetch=True)
+        return run_streamed(kodi, factory, items, kodi.get_list_key(namespace, method), list_schema, properties)
+
+    if args.stream and list_schema:
+        items = kodi.stream_results(namespace, method, param_dict)
+        return run_streamed(kodi, factory, items, list_schema.key, list_schema, properties)
 
     kodi.send_request(namespace, method, param_dict)
-    response = kodi.response_text
-    if cfg.csv_output and method_sig in kodi.CSV_CAPABLE_COMMANDS.keys():
-        json_node = kodi.CSV_CAPABLE_COMMANDS[method_sig]
-        output_obj = factory.create("CSV", response_text=response, list_key=json_node)
+    response = kodi.response  # decoded only if needed (csv, pretty), else written as received
+    output_format = list_output_format()
+    if output_format != 'JSON' and list_schema and kodi.request_success and kodi.response_status_code == 0:
+        # rows are written as the items of the list node are decoded
+        output_obj = factory.create(output_format, response=response, list_schema=list_schema, properties=properties)
     else:
-        if cfg.csv_output:
-            LOGGER.info('csv option is not available for this command...')
+        if output_format != 'JSON' and kodi.response_status_code == 0:
+            LOGGER.info(f'{output_format.lower()} option is not available for this command...')
         if cfg.format_output:
             pretty = True
         else:
             pretty = False
-        output_obj = factory.create("JSON", response_text=response, pretty=pretty)
+        output_obj = factory.create("JSON", response=response, pretty=pretty)
     
     output_obj.output_result()    
     return kodi.response_status_code
 
+# ==== Shell / daemon mode ==============================================================================
+# Startup arguments that are not passed on to the commands of a shell/daemon session
+SESSION_ONLY_ARGS = ['command', 'info', 'create_config', 'create_config_overwrite']
+
+class CommandSession():
+    """
+    Long-lived command processor (shell/daemon), keeps parser, output builders and
+    KodiObj instances (schema and warm connections) between commands.
+    """
+    def __init__(self, parser: argparse.ArgumentParser):
+        self._parser = parser
+        self._factory = build_output_factory()
+        self._kodi_cache = {}
+        self._lock = threading.RLock()
+
+    def run(self, argv: List[str]) -> int:
+        """Run one command line (without program name), output to stdout"""
+        if argv and argv[0] in ['shell', 'daemon', 'listen']:
+            print(f'{argv[0]} is not available in this mode')
+            return -1
+        try:
+            args = self._parser.parse_args(argv)
+        except SystemExit as se:
+            return se.code if isinstance(se.code, int) else -1
+        # cfg holds the current settings, commands are run one at a time
+        with self._lock:
+            apply_overrides(args)
+            try:
+                return run_measured(args, self._parser, self._kodi_cache, self._factory)
+            except Exception as ex:
+                LOGGER.error(repr(ex))
+                return -1
+
+    def run_captured(self, argv: List[str]) -> Tuple[int, str, str]:
+        """Run one command line, return return code and captured stdout/stderr"""
+        out_buf = io.StringIO()
+        err_buf = io.StringIO()
+        with self._lock:
+            # Logger sinks are bound to the real stderr, log messages (i.e. invalid params) are captured by a sink of their own
+            log_handle = LOGGER.add(err_buf.write, level=cfg.logging_level, format=console_log_format(cfg.logging_level))
+            try:
+                with contextlib.redirect_stdout(out_buf), contextlib.redirect_stderr(err_buf):
+                    rc = self.run(argv)
+            finally:
+                LOGGER.remove(log_handle)
+        return rc, out_buf.getvalue(), err_buf.getvalue()
+
+    def close(self):
+        for kodi in self._kodi_cache.values():
+            kodi.close()
+
+def run_shell(parser: argparse.ArgumentParser) -> int:
+    """Interactive command loop"""
+    try:
+        import readline  # noqa: F401 (line editing/history for input())
+    except ImportError:
+        pass
+    session = CommandSession(parser)
+    print(f'kodi-cli v{cfg.__version__} shell.  Enter commands as on the command line (without kodi-cli), exit to quit.')
+    rc = 0
+    while True:
+        try:
+            line = input('kodi> ').strip()
+        except (EOFError, KeyboardInterrupt):
+            print()
+            break
+        if not line:
+            continue
+        if line in ['exit', 'quit']:
+            break
+        try:
+            argv = shlex.split(line)
+        except ValueError as ve:
+            print(f'Unable to parse command: {ve}')
+            continue
+        rc = session.run(argv)
+        if rc != 0:
+            print(f'[rc: {rc}]')
+    session.close()
+    return 0
+
+def run_daemon(parser: argparse.ArgumentParser, daemon_args: List[str]) -> int:
+    """Serve commands from kodi-cli-client over a local (unix) socket"""
+    import kodi_daemon
+    socket_path = daemon_args[0] if daemon_args else kodi_daemon.DEFAULT_SOCKET
+    session = CommandSession(parser)
+    try:
+        kodi_daemon.serve(socket_path, session.run_captured)
+    except (OSError, RuntimeError) as ex:
+        LOGGER.critical(repr(ex))
+        return -1
+    finally:
+        session.close()
+    return 0
+
+def run_listen(patterns: List[str]) -> int:
+    """Write notifications (matching patterns, default all) from the host(s) as json lines"""
+    from kodi_notifications import ndjson_writer
+    patterns = patterns if patterns else ['*']
+    writer = ndjson_writer()
+    kodi_list = []
+    for host in cfg.resolve_hosts(cfg.host):
+        kodi = KodiObj(host, cfg.tcp_port, cfg.kodi_user, cfg.kodi_pw, cfg._json_rpc_loc, transport='tcp')
+        try:
+            for pattern in patterns:
+                kodi.on_notification(pattern, writer)
+        except ValueError as ve:
+            LOGGER.error(f'{ve}. Try help notifications')
+            return -2
+        kodi_list.append(kodi)
+
+    if len(kodi_list) == 1:
+        try:
+            return 0 if kodi_list[0].listen() else -20
+        except KeyboardInterrupt:
+            return 0
+
+    # One listener thread per host
+    threads = [ threading.Thread(target=kodi.listen, daemon=True) for kodi in kodi_list ]
+    for thread in threads:
+        thread.start()
+    try:
+        while any(thread.is_alive() for thread in threads):
+            time.sleep(0.5)
+    except KeyboardInterrupt:
+        pass
+    for kodi in kodi_list:
+        kodi.stop_listening()
+    return 0
+
+def main() -> int:
+    parser = build_parser()
+    args = parser.parse_args()
+    
+    apply_overrides(args)
+    initialize_loggers(args)
+
+    if args.command and args.command[0] in ['shell', 'daemon']:
+        # Options of a session command are layered on top of the startup options
+        parser.set_defaults(**{ key: val for key, val in vars(args).items() if key not in SESSION_ONLY_ARGS })
+    if args.command and args.command[0] == 'shell':
+        return run_shell(parser)
+    if args.command and args.command[0] == 'daemon':
+        return run_daemon(parser, args.command[1:])
+    if args.command and args.command[0] == 'listen':
+        return run_listen(args.command[1:])
+
+    kodi_cache = {}
+    try:
+        return run_measured(args, parser, kodi_cache, build_output_factory())
+    finally:
+        for kodi in kodi_cache.values():
+            kodi.close()
+
 if __name__ == "__main__":
     sys.exit(main())
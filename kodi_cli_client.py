@@ -0,0 +1,30 @@
+"""
+Thin client for kodi-cli daemon mode.
+
+Sends the command line to a running 'kodi-cli daemon' and prints the result, so repeated
+commands cost one round trip to Kodi and no schema loading/connection setup.
+
+    kodi-cli-client [-S socket_path] <kodi-cli arguments>
+"""
+import sys
+
+import kodi_daemon
+
+
+def main() -> int:
+    argv = sys.argv[1:]
+    socket_path = None
+    if len(argv) > 1 and argv[0] in ['-S', '--socket']:
+        socket_path = argv[1]
+        argv = argv[2:]
+    try:
+        rc, out_text, err_text = kodi_daemon.send_command(socket_path, argv)
+    except OSError as ex:
+        print(f'Unable to reach kodi-cli daemon ({kodi_daemon.resolve_socket_path(socket_path)}): {ex}', file=sys.stderr)
+        return -1
+    sys.stdout.write(out_text)
+    sys.stderr.write(err_text)
+    return rc
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,240 @@
+"""
+List results as rows: the list node of list returning methods and the columns of its items,
+derived from the method return schemas (methods.json/types.json).
+
+A method returns a list when its result object holds a single array (besides limits), i.e.
+VideoLibrary.GetMovies -> result.movies.  The item type of the array gives the key columns
+(required properties, i.e. movieid, label) and the nested objects that have a fixed set of
+fields (i.e. resume -> resume.position, resume.total).
+
+Columns are the key columns followed by the requested properties (in request order), so
+every row of a method/properties combination has the same layout, whatever the first item
+holds.  Nested values are flattened: fixed objects to parent.field columns, lists of values
+joined with ', ', other objects (and lists of objects) as compact json.
+"""
+import operator
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import kodi_json
+
+LIMITS_KEY = 'limits'
+SCALAR_TYPES = ['string', 'integer', 'number', 'boolean', 'null']
+LIST_SEPARATOR = ', '
+
+
+class ListSchema():
+    """List node of a list returning method and the layout of its items"""
+    def __init__(self, key: str, item_type: str = None, required: List[str] = None, fields: Dict[str, List[str]] = None,
+                 scalars: List[str] = None):
+        self.key = key                      # list node in the result, i.e. 'movies'
+        self.item_type = item_type          # i.e. 'Video.Details.Movie' (None for inline/scalar items)
+        self.required = required or []     # key columns, own properties before inherited ones
+        self.fields = fields or {}          # property -> fields, for objects with a fixed set of fields
+        self.scalars = scalars or []       # properties that never hold a list/object (written as is)
+
+    def __repr__(self) -> str:
+        return f'ListSchema({self.key}, {self.item_type}, required={self.required}, fields={self.fields}, scalars={self.scalars})'
+
+
+# == Schema derivation ==============================================================================
+class ListSchemaBuilder():
+    """Derive the ListSchema of every list returning method from the return schemas"""
+    def __init__(self, references: dict):
+        self._references = references
+
+    def build(self, methods: Dict[str, dict]) -> Dict[str, ListSchema]:
+        list_schemas = {}
+        for method, definition in methods.items():
+            list_schema = self.list_schema(definition.get('returns'))
+            if list_schema is not None:
+                list_schemas[method] = list_schema
+        return list_schemas
+
+    def list_schema(self, returns) -> Optional[ListSchema]:
+        """ListSchema of a return definition, None if it does not return a list"""
+        returns = self._resolve(returns)
+        if not isinstance(returns, dict) or returns.get('type') != 'object':
+            return None
+        nodes = { name: self._resolve(prop_def) for name, prop_def in returns.get('properties', {}).items() if name != LIMITS_KEY }
+        if len(nodes) != 1:
+            # None, or a set of properties (i.e. Application.GetProperties)
+            return None
+        key, node = next(iter(nodes.items()))
+        if not isinstance(node, dict) or node.get('type') != 'array':
+            return None
+        items = node.get('items', {})
+        item_type = items.get('$ref') if isinstance(items, dict) else None
+        item_def = self._resolve(items)
+        if not isinstance(item_def, dict) or 'properties' not in item_def:
+            return ListSchema(key, item_type)
+        fields = {}
+        scalars = []
+        for name, prop_def in item_def['properties'].items():
+            prop_def = self._resolve(prop_def)
+            if not isinstance(prop_def, dict):
+                continue
+            if prop_def.get('additionalProperties') is False and prop_def.get('properties'):
+                fields[name] = list(prop_def['properties'].keys())
+            elif self._is_scalar(prop_def):
+                scalars.append(name)
+        return ListSchema(key, item_type, self._required(items), fields, scalars)
+
+    def _is_scalar(self, definition: dict) -> bool:
+        types = definition.get('type')
+        if types is None:
+            return False
+        for type_def in (types if isinstance(types, list) else [types]):
+            type_def = self._resolve(type_def)
+            type_name = type_def.get('type') if isinstance(type_def, dict) else type_def
+            if type_name not in SCALAR_TYPES:
+                return False
+        return True
+
+    def _resolve(self, definition):
+        """Follow $ref and merge extended types (own properties win)"""
+        seen = set()
+        while isinstance(definition, dict) and '$ref' in definition and definition['$ref'] not in seen:
+            seen.add(definition['$ref'])
+            definition = self._references.get(definition['$ref'], {})
+        if isinstance(definition, dict) and 'extends' in definition:
+            merged = {}
+            for base_id in self._bases(definition):
+                merged = self._merge(merged, self._resolve({'$ref': base_id}))
+            definition = self._merge(merged, { key: value for key, value in definition.items() if key != 'extends' })
+        return definition
+
+    @staticmethod
+    def _merge(base: dict, own: dict) -> dict:
+        merged = dict(base, **own)
+        merged['properties'] = dict(base.get('properties', {}), **own.get('properties', {}))
+        return merged
+
+    def _required(self, definition, seen: set = None) -> List[str]:
+        """Required properties, the type's own before those of the types it extends"""
+        seen = seen if seen is not None else set()
+        while isinstance(definition, dict) and '$ref' in definition and definition['$ref'] not in seen:
+            seen.add(definition['$ref'])
+            definition = self._references.get(definition['$ref'], {})
+        if not isinstance(definition, dict):
+            return []
+        required = [ name for name, prop_def in definition.get('properties', {}).items() if isinstance(prop_def, dict) and prop_def.get('required') ]
+        for base_id in self._bases(definition):
+            required += [ name for name in self._required({'$ref': base_id}, seen) if name not in required ]
+        return required
+
+    @staticmethod
+    def _bases(definition: dict) -> List[str]:
+        bases = definition.get('extends', [])
+        return [bases] if isinstance(bases, str) else bases
+
+
+# == Rows ===========================================================================================
+class ColumnLayout():
+    """
+    Column order of a list output and the flattening of items to rows.
+
+    How each column is written is decided once, when the layout is created: values of scalar
+    columns are written as they are, only the columns that may hold a list/object (or a field
+    of a fixed object) are converted.
+    """
+    def __init__(self, columns: List[str], fields: Dict[str, List[str]] = None, scalars: List[str] = None):
+        self.names = list(columns)
+        fields = fields or {}
+        scalars = set(scalars or [])
+        self.header: List[str] = []
+        self._keys: List[str] = []
+        self._converters: List[Tuple[int, Callable[[Any], Any]]] = []
+        for name in self.names:
+            for field in fields.get(name, [None]):
+                if field is not None:
+                    self._converters.append((len(self._keys), _field_converter(field)))
+                elif name not in scalars:
+                    self._converters.append((len(self._keys), cell))
+                self.header.append(f'{name}.{field}' if field is not None else name)
+                self._keys.append(name)
+        self._values = operator.itemgetter(*self._keys) if len(self._keys) > 1 else _single_getter(self._keys)
+
+    @classmethod
+    def create(cls, list_schema: ListSchema = None, properties: List[str] = None, first_item=None, list_key: str = None) -> 'ColumnLayout':
+        """
+        Layout for a list: key columns + requested properties (schema), else the keys of the
+        first item.  Keys of the first item that were not requested (i.e. label) are appended.
+        """
+        if first_item is not None and not isinstance(first_item, dict):
+            # list of values (i.e. availablearttypes)
+            return ScalarLayout(list_key or (list_schema.key if list_schema else 'value'))
+        first_item = first_item or {}
+        columns = list(list_schema.required) if list_schema else []
+        for name in (properties or []):
+            if name not in columns:
+                columns.append(name)
+        for name in first_item.keys():
+            if name not in columns:
+                columns.append(name)
+        fields = list_schema.fields if list_schema else {}
+        scalars = list(list_schema.scalars) if list_schema else []
+        # columns the schema does not describe, as the first item holds them
+        scalars += [ name for name in columns if isinstance(first_item.get(name), (str, int, float)) and name not in fields ]
+        return cls(columns, fields, scalars)
+
+    def row(self, item: dict) -> list:
+        try:
+            row = list(self._values(item))
+        except KeyError:
+            # not every column in this item
+            get = item.get
+            row = [ get(key) for key in self._keys ]
+        for index, convert in self._converters:
+            row[index] = convert(row[index])
+        return row
+
+    def ordered(self, item: dict) -> dict:
+        """item with its keys in column order (unflattened), keys not in the layout last"""
+        ordered = { name: item[name] for name in self.names if name in item }
+        if len(ordered) != len(item):
+            ordered.update(item)
+        return ordered
+
+
+class ScalarLayout(ColumnLayout):
+    """Single column layout for lists of values"""
+    def __init__(self, name: str):
+        super().__init__([name])
+
+    def row(self, item) -> list:
+        return [cell(item)]
+
+    def ordered(self, item):
+        return item
+
+
+def requested_properties(params: dict) -> List[str]:
+    """The properties parameter of a request as a list (it may have been entered as a single value)"""
+    properties = (params or {}).get('properties')
+    if not properties:
+        return []
+    if isinstance(properties, str):
+        return [ name.strip() for name in properties.split(',') if name.strip() ]
+    return [ str(name) for name in properties ]
+
+def cell(value) -> Any:
+    """Flatten a value to a csv cell"""
+    if value is None:
+        return ''
+    if isinstance(value, (str, int, float)):
+        return value
+    if isinstance(value, list):
+        if all(not isinstance(entry, (dict, list)) for entry in value):
+            return LIST_SEPARATOR.join('' if entry is None else str(entry) for entry in value)
+    return kodi_json.dumps(value)
+
+def _single_getter(keys: List[str]) -> Callable[[dict], tuple]:
+    # itemgetter does not return a tuple for a single key
+    def get(item: dict):
+        return tuple(item[key] for key in keys)
+    return get
+
+def _field_converter(field: str) -> Callable[[Any], Any]:
+    def convert(value):
+        return cell(value.get(field)) if isinstance(value, dict) else ''
+    return convert
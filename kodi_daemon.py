@@ -0,0 +1,93 @@
+"""
+Local socket server/client used by kodi-cli daemon mode.
+
+Protocol: the client sends one json line {"argv": [...]}, the server replies with one json
+line {"rc": int, "stdout": str, "stderr": str} and closes the connection.
+"""
+import os
+import pathlib
+import signal
+import socket
+import socketserver
+from typing import Callable, List, Tuple
+
+from kodi_logger import LOGGER
+import kodi_json
+
+DEFAULT_SOCKET = '~/.kodi_cli/kodi_cli.sock'
+SOCKET_ENV_VAR = 'KODI_CLI_SOCKET'
+
+
+def resolve_socket_path(socket_path: str = None) -> str:
+    if not socket_path:
+        socket_path = os.getenv(SOCKET_ENV_VAR, DEFAULT_SOCKET)
+    return str(pathlib.Path(socket_path).expanduser())
+
+class _CommandHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        line = self.rfile.readline()
+        try:
+            request = kodi_json.loads(line)
+            argv = [ str(x) for x in request['argv'] ]
+        except (ValueError, KeyError, TypeError) as ex:
+            reply = {'rc': -1, 'stdout': '', 'stderr': f'Invalid request: {repr(ex)}\n'}
+        else:
+            LOGGER.debug(f'daemon request: {argv}')
+            rc, out_text, err_text = self.server.command_runner(argv)
+            reply = {'rc': rc, 'stdout': out_text, 'stderr': err_text}
+        self.wfile.write(kodi_json.dumpb(reply) + b'\n')
+
+def serve(socket_path: str, command_runner: Callable[[List[str]], Tuple[int, str, str]]):
+    """Serve commands on unix socket_path until interrupted, command_runner(argv) returns (rc, stdout, stderr)"""
+    if not hasattr(socketserver, 'ThreadingUnixStreamServer'):
+        raise RuntimeError('daemon mode requires unix domain socket support')
+    socket_path = resolve_socket_path(socket_path)
+    sock_file = pathlib.Path(socket_path)
+    sock_file.parent.mkdir(parents=True, exist_ok=True)
+    if sock_file.exists():
+        if _is_listening(socket_path):
+            raise RuntimeError(f'A daemon is already listening on {socket_path}')
+        sock_file.unlink()
+
+    server = socketserver.ThreadingUnixStreamServer(socket_path, _CommandHandler)
+    server.daemon_threads = True
+    server.command_runner = command_runner
+    os.chmod(socket_path, 0o600)
+    LOGGER.info(f'kodi-cli daemon listening on {socket_path} (ctrl-c to stop)')
+    signal.signal(signal.SIGTERM, _raise_interrupt)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if sock_file.exists():
+            sock_file.unlink()
+        LOGGER.info('kodi-cli daemon stopped')
+
+def send_command(socket_path: str, argv: List[str], timeout: float = 60.0) -> Tuple[int, str, str]:
+    """Send a command line to the daemon, returns (rc, stdout, stderr)"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(resolve_socket_path(socket_path))
+        sock.sendall(kodi_json.dumpb({'argv': argv}) + b'\n')
+        chunks = []
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    reply = kodi_json.loads(b''.join(chunks))
+    return reply['rc'], reply['stdout'], reply['stderr']
+
+def _raise_interrupt(signum, frame):
+    # SIGTERM stops the daemon the same way as ctrl-c (socket file is removed)
+    raise KeyboardInterrupt()
+
+def _is_listening(socket_path: str) -> bool:
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(socket_path)
+        return True
+    except OSError:
+        return False
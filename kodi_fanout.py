@@ -0,0 +1,63 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Tuple
+
+from kodi_logger import LOGGER
+from kodi_interface import KodiObj
+import kodi_json
+
+
+def fan_out(hosts: List[str], get_kodi: Callable[[str], KodiObj], commands: List[Tuple[str, str, dict]],
+            workers: int = 8, batch_size: int = 20) -> List[dict]:
+    """
+    Send the same command(s) to every host, at most 'workers' hosts at a time.
+
+    A single command is sent with send_request(), multiple commands with send_batch().
+    Returns one entry per host (in host order):
+        {"host": name, "status_code": int, "elapsed_ms": float, "response": decoded json response}
+    """
+    def call_host(host: str) -> dict:
+        start = time.perf_counter()
+        try:
+            kodi = get_kodi(host)
+            if len(commands) == 1:
+                namespace, method, params = commands[0]
+                kodi.send_request(namespace, method, params)
+            else:
+                kodi.send_batch(commands, batch_size)
+            status_code = kodi.response_status_code
+            response = kodi.response_json
+        except Exception as ex:
+            LOGGER.debug(f'{host}: {repr(ex)}')
+            status_code = -50
+            response = {"error": {"code": -50, "data": {"host": host}, "message": repr(ex)}}
+        elapsed_ms = round((time.perf_counter() - start) * 1000, 1)
+        LOGGER.debug(f'  {host:20} status: {status_code}  elapsed: {elapsed_ms} ms')
+        return {"host": host, "status_code": status_code, "elapsed_ms": elapsed_ms, "response": response}
+
+    LOGGER.debug(f'Fan-out {len(commands)} command(s) to {len(hosts)} hosts ({workers} workers)')
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        return list(executor.map(call_host, hosts))
+
+def fan_out_rows(results: List[dict], list_key: str = None) -> List[dict]:
+    """Flatten fan-out results to csv rows, one row per list item (list_key) or one row per host"""
+    rows = []
+    for entry in results:
+        tag = {"host": entry['host'], "status_code": entry['status_code'], "elapsed_ms": entry['elapsed_ms']}
+        response = entry['response'] or {}
+        items = None
+        if list_key and isinstance(response, dict):
+            items = response.get('result', {}).get(list_key) if isinstance(response.get('result'), dict) else None
+        if items:
+            for item in items:
+                row = dict(tag)
+                row.update(item)
+                rows.append(row)
+        else:
+            row = dict(tag)
+            row['response'] = kodi_json.dumps(response.get('error', response.get('result')) if isinstance(response, dict) else response)
+            rows.append(row)
+
+    # Same columns on every row (hosts may fail or return different fields)
+    columns = list(dict.fromkeys(key for row in rows for key in row.keys()))
+    return [ {col: row.get(col, '') for col in columns} for row in rows ]
@@ -0,0 +1,325 @@
+"""
+Help rendering for Kodi methods, notifications and types.
+
+HelpParameter resolves a parameter definition ($ref chains, enums, defaults) for display.
+HelpIndex resolves every method, notification and type once, sharing the $ref resolution,
+so help output only formats the stored results (see KodiSchema.help_index).
+"""
+import shutil
+from typing import Dict, List, Tuple
+
+from kodi_logger import LOGGER
+import kodi_json
+
+_UNSET = object()  # marks a value not set while resolving a reference
+
+
+class HelpParameter():
+    # Console geometry, measured once per help render (see _get_console_size)
+    _max_rows = 0
+    _max_cols = 0
+    
+    def __init__(self, parameter_dict: dict = None, reference_dict: dict = None, memo: dict = None):
+        self._parameter_block = parameter_dict
+        self._reference_block = reference_dict
+        # Resolved $ref results, shared by all parameters of an index build
+        self._memo = {} if memo is None else memo
+
+        self.name = None
+        self.description = None
+        self.default = ""
+        self.minItems = None
+        self.minLength = None
+        self.minimum = None
+        self.properties = None
+        self.required = None
+        self.types = None
+        self.uniqueItems = None
+        self.reference = None
+        self.values = ""
+
+    
+    def populate(self):
+        LOGGER.trace(f'populate() - block: {self._parameter_block}')
+        self._populate_from_param_dict()
+        if self.reference:
+            self.values += self._populate_values_from_reference_dict(self.reference)
+
+
+    def _populate_from_param_dict(self):
+        LOGGER.trace('_populate_from_param_dict()')
+        self.name = self._get_parameter_value(self._parameter_block,'name')
+        self.description = self._get_parameter_value(self._parameter_block,'description')
+        self.default = self._get_parameter_value(self._parameter_block,'default')
+        self.minItems = self._get_parameter_value(self._parameter_block,'minItems')
+        self.minLength = self._get_parameter_value(self._parameter_block,'minLength')
+        self.minimum = self._get_parameter_value(self._parameter_block,'minimum')
+        self.properties = self._get_parameter_value(self._parameter_block,'properties')
+        self.required = self._get_parameter_value(self._parameter_block,'required')
+        type_token = self._get_parameter_value(self._parameter_block,'type')
+        self.types = self._get_types(self._parameter_block)
+        self.uniqueItems = self._get_parameter_value(self._parameter_block,'uniqueItems')
+        self.reference = self._get_parameter_value(self._parameter_block, '$ref')        
+        if not self.reference:
+            items = self._get_parameter_value(self._parameter_block, "items", None)
+            if items:
+                self.reference = self._get_parameter_value(items, "$ref")
+
+    def _populate_values_from_reference_dict(self, ref_id: str) -> str:
+        LOGGER.trace(f'_populate_from_reference_dict({ref_id})')
+        key = ('values', ref_id)
+        if key not in self._memo:
+            resolver = HelpParameter(None, self._reference_block, self._memo)
+            resolver.types = resolver.default = _UNSET
+            values = resolver._resolve_reference_values(ref_id)
+            self._memo[key] = (values, resolver.description, resolver.types, resolver.default)
+        values, description, types, default = self._memo[key]
+        if not self.description:
+            self.description = description
+        if types is not _UNSET:
+            self.types = types
+        if default is not _UNSET:
+            self.default = default
+        return values
+
+    def _resolve_reference_values(self, ref_id: str) -> str:
+        values = ""
+        ref_block = self._get_reference_id_definition(ref_id)
+        LOGGER.debug(f'{ref_block}')
+        if ref_block:
+            if 'type' not in ref_block:
+                if 'items' in ref_block:
+                    ref_block = ref_block.get('items')
+            
+            if 'type' in ref_block:
+                r_types = ref_block.get('type')
+                if not self.description:
+                    self.description = self._get_parameter_value(ref_block, 'description')
+                r_enums = []
+                if type(r_types) is str:
+                    if r_types == "string":
+                        r_enums = ref_block.get('enums',[])
+                        self.types = self._get_types(ref_block)
+                    elif r_types == "boolean":
+                        r_enums = ['True','False']
+
+                elif type(r_types) is list:
+                    for r_type in r_types:
+                        if type(r_type) is dict:
+                            if r_type.get('enums'):
+                                r_enums.extend(r_type['enums'])
+                            elif r_type.get('type') == 'boolean':
+                                r_enums.extend(['True','False'])
+                            elif r_type.get('type') == 'integer':
+                                r_max = r_type.get('maximum')
+                                r_min = r_type.get('minimum')
+                                if r_max:
+                                    r_enums.extend([f'{r_min}..{r_max}'])
+                    r_enums = sorted(set(r_enums)) # unique list
+                    values = ', '.join(r_enums)
+
+        return values
+
+    def print_parameter_definition(self):
+        print(f'{self.name}')
+        self._print_parameter_line('   Desc     ', self.description)
+        self._print_parameter_line('   Min Items', self.minItems)
+        self._print_parameter_line('   Required ', self.required)
+        self._print_parameter_line('   Reference', self.reference)
+        # self._print_parameter_line('   Maximum  ', p_max)
+        if self.types:
+            self._print_types()
+        self._print_parameter_line('   UniqItems', self.uniqueItems)
+        self._print_parameter_line('   Minimum  ', self.minimum)
+        self._print_parameter_line('   Values   ', self.values)
+        self._print_parameter_line('   Default  ', self.default)
+        print()        
+
+
+    def _print_types(self):
+        indent = 8
+        type_list = self.types.split('|')
+        type_list = list(filter(None, type_list))
+        type_set = sorted(set(type_list)) # Remove duplicates
+        caption = '   Type     '
+        for p_type in type_set:
+            if len(p_type) > self._max_cols - len(caption):
+                token = p_type.split('[')
+                if len(token) > 1:
+                    self._print_parameter_line(caption, token[0])
+                    p_type = f'{" "*indent}[{token[1]}'
+                    caption = '            '
+            self._print_parameter_line(caption, p_type, indent)
+            caption = '            '
+
+    def _get_types(self, block_dict: dict) -> str:
+        return_type = ""
+        LOGGER.trace(f'_get_types() - bloc_dict\n        {block_dict}')
+        type_token = self._get_parameter_value(block_dict, "type", "")
+        if not type_token and '$ref' in block_dict:
+            LOGGER.trace(f'$ref Type refinement: {block_dict}')
+            return_type = self._get_reference_types(block_dict['$ref'])
+        else:
+            token_type = type(type_token)
+            type_caption = f'{type_token}:'
+            type_caption = f'{type_caption:7}'
+            LOGGER.trace(f'  type_token: {type_token}  token_type: {token_type}  type_caption: {type_caption}')
+            if token_type in [ list, dict ]:
+                if token_type is list:
+                    LOGGER.trace(f'list Type refinement: {block_dict}')
+                    return_type = ""
+                    for type_entry in type_token:
+                        if type(type_entry) is str:
+                            return_type += f'{type_entry},'
+                        else:
+                            return_type += f'{self._get_types(type_entry)}|'
+                else:
+                    LOGGER.trace(f'dict Type refinement: {block_dict}')
+                    return_type += f'{self._get_types(type_token)}|'
+
+            elif token_type == str: 
+                if type_token == "boolean":
+                    LOGGER.trace(f'bool Type refinement: {block_dict}')
+                    return_type = f'{type_caption} True,False'
+
+                elif type_token == "integer":
+                    LOGGER.trace(f'int Type refinement: {block_dict}')
+                    t_max = int(block_dict.get('maximum',-1))
+                    t_min = int(block_dict.get('minimum', -1))
+                    return_type = type_caption
+                    if t_max > 0 and t_min >= 0:
+                        return_type = f'{type_caption} ({t_min}..{t_max})'
+                    else:
+                        return_type = type_token
+                # TODO: Handle 'array' type in block dict
+                elif 'enum' in block_dict:
+                    LOGGER.trace(f'enums Type refinement: {block_dict}')
+                    enums = sorted(set(block_dict['enum']))
+                    return_type = f"{type_caption} enum [{','.join(enums)}]"
+                    # return_type = f"{type_caption} enum"
+
+                else:
+                    LOGGER.trace(f'str Type refinement: {block_dict}')
+                    if 'additionalProperties' in block_dict:
+                        return_type = f"{type_caption} additionalProperties"
+                    elif 'items' in block_dict:
+                        return_type = f"{type_caption} items"
+                    elif 'description' in block_dict:
+                        return_type = f'{type_caption} {block_dict["description"]}'
+                    elif '$ref' in block_dict:
+                        return_type = f'{type_caption} {block_dict["$ref"]}'
+
+                if return_type:
+                    if 'default' in block_dict:  # and not self.default:
+                        self.default = str(block_dict['default'])
+                else:
+                    LOGGER.trace(f'NO Type refinement: {block_dict}')
+                    return_type = f'{type_caption} {list(block_dict.keys())[0]}'
+            else:   
+                # TODO: Expand here for type  type(range|min|max|...)
+                LOGGER.trace(f'unk Type refinement: {block_dict}')
+                return_type = type_token
+
+        if return_type.endswith(','):
+            return_type = return_type[:-1]
+        LOGGER.trace(f'_get_types() returns: {return_type}')
+        return return_type
+
+    def _get_reference_types(self, ref_id: str) -> str:
+        """Types of a referenced definition, resolved once (replays the default it sets)"""
+        key = ('types', ref_id)
+        if key not in self._memo:
+            return_type = ""
+            resolver = HelpParameter(None, self._reference_block, self._memo)
+            resolver.default = _UNSET
+            ref_block = self._get_reference_id_definition(ref_id)
+            if ref_block:
+                return_type = resolver._get_types(ref_block)
+            self._memo[key] = (return_type, resolver.default)
+        return_type, default = self._memo[key]
+        if default is not _UNSET:
+            self.default = default
+        return return_type
+
+    def _get_parameter_value(self, p_dict: dict, key: str, default: str = None) -> str:
+        token = p_dict.get(key, default)
+        # LOGGER.debug(f'_get_parameter_value()  key: {key:15}  dict: {p_dict}')
+        return token
+
+    def _get_reference_id_definition(self, ref_id: str) -> str:
+        LOGGER.trace(f'_get_reference_id_definition({ref_id})')
+        ref_dict = self._reference_block.get(ref_id, None)
+        if ref_dict:
+            LOGGER.debug(f'Retrieved referenceId: {ref_id}')
+        else:
+            LOGGER.trace(f'No reference found for: {ref_id}')
+        return ref_dict 
+
+
+    @classmethod
+    def _print_parameter_line(cls, caption: str, value: str, value_indent: int = 0):
+        if value:
+            if cls._max_cols <= 0:
+                cls._get_console_size()
+            sep = ":"
+            if len(caption.strip()) == 0:
+                sep = " "
+            label = f'{caption:13}{sep} '
+            # max_len is largest size of value before screen overflow
+            max_len = cls._max_cols - len(label)
+            print(f'{label}',end='')
+            value = str(value)
+            while len(value) > max_len:
+                idx = value.rfind(",", 0, max_len)
+                if idx <= 0:
+                    idx = value.rfind(" ",0, max_len)
+                if idx <= 0:
+                    max_len = len(value)
+                else:
+                    print(f'{value[0:idx+1]}')
+                    value = value[idx+1:].strip()
+                    value = f'{" "*value_indent}{value}'
+                    print(f"{' '*len(label)}",end='')
+            print(value)
+
+    @classmethod
+    def _get_console_size(cls) -> Tuple[int, int]:
+        """Retrieve console size in Rows and Columns (LINES/COLUMNS, the terminal, or 24x80)"""
+        size = shutil.get_terminal_size()
+        cls._max_rows = int(size.lines)
+        cls._max_cols = int(size.columns)
+        return cls._max_rows, cls._max_cols
+
+    def strip(self) -> 'HelpParameter':
+        """Drop the definition blocks once populated (index entries only keep the results)"""
+        self._parameter_block = None
+        self._reference_block = None
+        self._memo = None
+        return self
+
+
+
+class HelpIndex():
+    """Resolved help parameters of all methods and notifications, json text of all definitions"""
+    def __init__(self, namespaces: dict, references: dict, notifications: dict):
+        memo = {}
+        self.methods: Dict[str, List[HelpParameter]] = {}
+        self.raw: Dict[str, str] = {}
+        for ns, methods in namespaces.items():
+            for method, definition in methods.items():
+                self.methods[f'{ns}.{method}'] = self._resolve_params(definition.get('params', []), references, memo)
+                self.raw[f'{ns}.{method}'] = kodi_json.dumps(definition, pretty=True)
+        self.notifications: Dict[str, List[HelpParameter]] = {}
+        for name, definition in notifications.items():
+            self.notifications[name] = self._resolve_params(definition.get('params', []), references, memo)
+            self.raw[name] = kodi_json.dumps(definition, pretty=True)
+        for ref_id, definition in references.items():
+            self.raw[ref_id] = kodi_json.dumps(definition, pretty=True)
+
+    def _resolve_params(self, param_list: List[dict], references: dict, memo: dict) -> List[HelpParameter]:
+        params = []
+        for param_item in param_list:
+            hp = HelpParameter(param_item, references, memo)
+            hp.populate()
+            params.append(hp.strip())
+        return params
@@ -1,4 +1,4 @@
-from loguru import logger as LOGGER
+from kodi_logger import LOGGER
 import sys
 
 from kodi_interface import KodiObj
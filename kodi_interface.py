@@ -1,326 +1,55 @@
-import http.client
-import json
-from loguru import logger as LOGGER
-import os
+import fnmatch
+import itertools
+from kodi_logger import LOGGER
 import pathlib
 import socket
+import threading
 import time
-import requests
-from typing import Tuple
+from typing import Any, Iterator, List, Tuple
+
+from kodi_columns import ListSchema
+from kodi_help import HelpIndex, HelpParameter
+from kodi_json_stream import JsonListStream
+from kodi_metrics import MetricsRecorder, RequestMetrics, measuring
+from kodi_notifications import NotificationHandler, NotificationListener
+from kodi_response_cache import ResponseCache
+from kodi_retry import RetryPolicy, get_breaker
+from kodi_schema import KodiSchema
+from kodi_transport import DEFAULT_TCP_PORT, JsonResponse, KodiTransport, TransportError, create_transport
+from kodi_validator import INVALID_PARAMS_CODE, ParameterError, invalid_params_response
 
 # TODO:
-#   Edit parameters prior to call for cleaner error messages
 #   Parse parameter json better
 
-class HelpParameter():
-    _max_rows = 0
-    _max_cols = 0
-    
-    def __init__(self, parameter_dict: dict = None, reference_dict: dict = None):
-        self._parameter_block = parameter_dict
-        self._reference_block = reference_dict
-
-        self.name = None
-        self.description = None
-        self.default = ""
-        self.minItems = None
-        self.minLength = None
-        self.minimum = None
-        self.properties = None
-        self.required = None
-        self.types = None
-        self.uniqueItems = None
-        self.reference = None
-        self.values = ""
-
-        self._parameter_block = parameter_dict
-        self._reference_block = reference_dict
-        self._get_console_size()
-        
-    
-    def populate(self):
-        LOGGER.trace(f'populate() - block: {self._parameter_block}')
-        self._populate_from_param_dict()
-        if self.reference:
-            self.values += self._populate_values_from_reference_dict(self.reference)
-
-
-    def _populate_from_param_dict(self):
-        LOGGER.trace('_populate_from_param_dict()')
-        self.name = self._get_parameter_value(self._parameter_block,'name')
-        self.description = self._get_parameter_value(self._parameter_block,'description')
-        self.default = self._get_parameter_value(self._parameter_block,'default')
-        self.minItems = self._get_parameter_value(self._parameter_block,'minItems')
-        self.minLength = self._get_parameter_value(self._parameter_block,'minLength')
-        self.minimum = self._get_parameter_value(self._parameter_block,'minimum')
-        self.properties = self._get_parameter_value(self._parameter_block,'properties')
-        self.required = self._get_parameter_value(self._parameter_block,'required')
-        type_token = self._get_parameter_value(self._parameter_block,'type')
-        self.types = self._get_types(self._parameter_block)
-        self.uniqueItems = self._get_parameter_value(self._parameter_block,'uniqueItems')
-        self.reference = self._get_parameter_value(self._parameter_block, '$ref')        
-        if not self.reference:
-            items = self._get_parameter_value(self._parameter_block, "items", None)
-            if items:
-                self.reference = self._get_parameter_value(items, "$ref")
-
-    def _populate_values_from_reference_dict(self, ref_id: str) -> str:
-        LOGGER.trace(f'_populate_from_reference_dict({ref_id})')
-        values = ""
-        ref_block = self._get_reference_id_definition(ref_id)
-        LOGGER.debug(f'{ref_block}')
-        if ref_block:
-            if 'type' not in ref_block:
-                if 'items' in ref_block:
-                    ref_block = ref_block.get('items')
-            
-            if 'type' in ref_block:
-                r_types = ref_block.get('type')
-                if not self.description:
-                    self.description = self._get_parameter_value(ref_block, 'description')
-                r_enums = []
-                if type(r_types) is str:
-                    if r_types == "string":
-                        r_enums = ref_block.get('enums',[])
-                        self.types = self._get_types(ref_block)
-                    elif r_types == "boolean":
-                        r_enums = ['True','False']
-
-                elif type(r_types) is list:
-                    for r_type in r_types:
-                        if type(r_type) is dict:
-                            if r_type.get('enums'):
-                                r_enums.extend(r_type['enums'])
-                            elif r_type.get('type') == 'boolean':
-                                r_enums.extend(['True','False'])
-                            elif r_type.get('type') == 'integer':
-                                r_max = r_type.get('maximum')
-                                r_min = r_type.get('minimum')
-                                if r_max:
-                                    r_enums.extend([f'{r_min}..{r_max}'])
-                    r_enums = sorted(set(r_enums)) # unique list
-                    values = ', '.join(r_enums)
-
-        return values
-
-    def print_parameter_definition(self):
-        print(f'{self.name}')
-        self._print_parameter_line('   Desc     ', self.description)
-        self._print_parameter_line('   Min Items', self.minItems)
-        self._print_parameter_line('   Required ', self.required)
-        self._print_parameter_line('   Reference', self.reference)
-        # self._print_parameter_line('   Maximum  ', p_max)
-        if self.types:
-            self._print_types()
-        self._print_parameter_line('   UniqItems', self.uniqueItems)
-        self._print_parameter_line('   Minimum  ', self.minimum)
-        self._print_parameter_line('   Values   ', self.values)
-        self._print_parameter_line('   Default  ', self.default)
-        print()        
-
-
-    def _print_types(self):
-        indent = 8
-        type_list = self.types.split('|')
-        type_list = list(filter(None, type_list))
-        type_set = sorted(set(type_list)) # Remove duplicates
-        caption = '   Type     '
-        for p_type in type_set:
-            if len(p_type) > self._max_cols - len(caption):
-                token = p_type.split('[')
-                if len(token) > 1:
-                    self._print_parameter_line(caption, token[0])
-                    p_type = f'{" "*indent}[{token[1]}'
-                    caption = '            '
-            self._print_parameter_line(caption, p_type, indent)
-            caption = '            '
-
-    def _get_types(self, block_dict: dict) -> str:
-        return_type = ""
-        LOGGER.trace(f'_get_types() - bloc_dict\n        {block_dict}')
-        type_token = self._get_parameter_value(block_dict, "type", "")
-        if not type_token and '$ref' in block_dict:
-            LOGGER.trace(f'$ref Type refinement: {block_dict}')
-            ref_id = block_dict['$ref']
-            ref_block = self._get_reference_id_definition(ref_id)
-            if ref_block:
-                return_type = self._get_types(ref_block)
-        else:
-            token_type = type(type_token)
-            type_caption = f'{type_token}:'
-            type_caption = f'{type_caption:7}'
-            LOGGER.trace(f'  type_token: {type_token}  token_type: {token_type}  type_caption: {type_caption}')
-            if token_type in [ list, dict ]:
-                if token_type is list:
-                    LOGGER.trace(f'list Type refinement: {block_dict}')
-                    return_type = ""
-                    for type_entry in type_token:
-                        if type(type_entry) is str:
-                            return_type += f'{type_entry},'
-                        else:
-                            return_type += f'{self._get_types(type_entry)}|'
-                else:
-                    LOGGER.trace(f'dict Type refinement: {block_dict}')
-                    return_type += f'{self._get_types(type_token)}|'
-
-            elif token_type == str: 
-                if type_token == "boolean":
-                    LOGGER.trace(f'bool Type refinement: {block_dict}')
-                    return_type = f'{type_caption} True,False'
-
-                elif type_token == "integer":
-                    LOGGER.trace(f'int Type refinement: {block_dict}')
-                    t_max = int(block_dict.get('maximum',-1))
-                    t_min = int(block_dict.get('minimum', -1))
-                    return_type = type_caption
-                    if t_max > 0 and t_min >= 0:
-                        return_type = f'{type_caption} ({t_min}..{t_max})'
-                    else:
-                        return_type = type_token
-                # TODO: Handle 'array' type in block dict
-                elif 'enum' in block_dict:
-                    LOGGER.trace(f'enums Type refinement: {block_dict}')
-                    enums = sorted(set(block_dict['enum']))
-                    return_type = f"{type_caption} enum [{','.join(enums)}]"
-                    # return_type = f"{type_caption} enum"
-
-                else:
-                    LOGGER.trace(f'str Type refinement: {block_dict}')
-                    if 'additionalProperties' in block_dict:
-                        return_type = f"{type_caption} additionalProperties"
-                    elif 'items' in block_dict:
-                        return_type = f"{type_caption} items"
-                    elif 'description' in block_dict:
-                        return_type = f'{type_caption} {block_dict["description"]}'
-                    elif '$ref' in block_dict:
-                        return_type = f'{type_caption} {block_dict["$ref"]}'
-
-                if return_type:
-                    if 'default' in block_dict:  # and not self.default:
-                        self.default = str(block_dict['default'])
-                else:
-                    LOGGER.trace(f'NO Type refinement: {block_dict}')
-                    return_type = f'{type_caption} {list(block_dict.keys())[0]}'
-            else:   
-                # TODO: Expand here for type  type(range|min|max|...)
-                LOGGER.trace(f'unk Type refinement: {block_dict}')
-                return_type = type_token
-
-        if return_type.endswith(','):
-            return_type = return_type[:-1]
-        LOGGER.trace(f'_get_types() returns: {return_type}')
-        return return_type
-
-    def _get_parameter_value(self, p_dict: dict, key: str, default: str = None) -> str:
-        token = p_dict.get(key, default)
-        # LOGGER.debug(f'_get_parameter_value()  key: {key:15}  dict: {p_dict}')
-        return token
-
-    def _get_reference_id_definition(self, ref_id: str) -> str:
-        LOGGER.trace(f'_get_reference_id_definition({ref_id})')
-        ref_dict = self._reference_block.get(ref_id, None)
-        if ref_dict:
-            LOGGER.debug(f'Retrieved referenceId: {ref_id}')
-        else:
-            LOGGER.trace(f'No reference found for: {ref_id}')
-        return ref_dict 
-
-
-    def _print_parameter_line(cls, caption: str, value: str, value_indent: int = 0):
-        if value:
-            cls._get_console_size()
-            sep = ":"
-            if len(caption.strip()) == 0:
-                sep = " "
-            label = f'{caption:13}{sep} '
-            # max_len is largest size of value before screen overflow
-            max_len = cls._max_cols - len(label)
-            print(f'{label}',end='')
-            value = str(value)
-            while len(value) > max_len:
-                idx = value.rfind(",", 0, max_len)
-                if idx <= 0:
-                    idx = value.rfind(" ",0, max_len)
-                if idx <= 0:
-                    max_len = len(value)
-                else:
-                    print(f'{value[0:idx+1]}')
-                    value = value[idx+1:].strip()
-                    value = f'{" "*value_indent}{value}'
-                    print(f"{' '*len(label)}",end='')
-            print(value)
-
-    def _get_console_size(cls) -> Tuple[int, int]:
-        """Retrieve console size in Rows and Columns"""
-        cls._max_rows = int(os.getenv('LINES', -1))
-        cls._max_cols = int(os.getenv('COLUMNS', -1))
-        if cls._max_rows <= 0 or cls._max_cols <= 0:
-            size = os.get_terminal_size()
-            cls._max_rows = int(size.lines)
-            cls._max_cols = int(size.columns)
-        return cls._max_rows, cls._max_cols
-
 class KodiObj():
-    CSV_CAPABLE_COMMANDS =  {
-        'Addons.GetAddons': 'addons',
-        'AudioLibrary.GetAlbums': 'albums',
-        'AudioLibrary.GetArtists': 'artists',
-        'AudioLibrary.GetGenres': 'genres',
-        'AudioLibrary.GetRecentlyAddedAlbums': 'albums',
-        'AudioLibrary.GetRecentlyAddedSongs': 'songs',
-        'AudioLibrary.GetRecentlyPlayedAlbums': 'albums',
-        'AudioLibrary.GetRecentlyPlayedSongs': 'songs',
-        'VideoLibrary.GetRecentlyAddedEpisodes': 'episodes' 
-        }
-
-    def __init__(self, host: str = "localhost", port: int = 8080, user: str = None, password: str = None, json_loc: str = "./json-defs"):
+    # Read-only methods, besides Get*, whose responses may be cached
+    INTROSPECTION_COMMANDS = ['Introspect', 'Version', 'Permission']
+
+    def __init__(self, host: str = "localhost", port: int = 8080, user: str = None, password: str = None, json_loc: str = "./json-defs", pool_size: int = 10, schema_cache: bool = True, transport: str = "http", response_cache: ResponseCache = None, validate_params: bool = True,
+                 metrics: MetricsRecorder = None, retry_policy: RetryPolicy = None):
         LOGGER.debug("KodiObj created")
         self._host = host
-        self._ip = self._get_ip(host)
+        self._host_ip = None
         self._port = port
         self._userid = user
         self._password = password
-        self._kodi_api_version = None
-        self._namespaces = {}
-        self._kodi_references = {}
-        self._base_url = f'http://{host}:{port}/jsonrpc'
-        self._error_json = {
-                                "error": {
-                                    "code": -1,
-                                    "data": {
-                                    "method": "TBD"
-                                    },
-                                    "message": "Invalid params."
-                                }
-                            }
-
-        LOGGER.debug(f'  host: {host}, ip: {self._ip}, port: {port}')
+        self._request_ids = itertools.count(1)
+        self._response = threading.local()  # response state is per thread, KodiObj may be shared by workers
+        # http (port 8080) or tcp (raw json-rpc, port 9090), connections are opened on first request
+        self._transport: KodiTransport = create_transport(transport, host, port, user, password, pool_size)
+        self._transport_name = transport
+        self._response_cache = response_cache  # opt-in, read-only methods only
+        self._validate_params = validate_params  # checked/coerced against the schema before sending
+        self._metrics = metrics  # opt-in, every call to the host is measured and recorded
+        self._retry_policy = retry_policy if retry_policy else RetryPolicy()
+        self._breaker = get_breaker(host, port, self._retry_policy) if self._retry_policy.breaker_threshold > 0 else None
+        self._notification_handlers: List[Tuple[str, NotificationHandler]] = []
+        self._listener: NotificationListener = None
+
+        LOGGER.debug(f'  host: {host}, port: {port}, transport: {transport}, pool_size: {pool_size}, validate: {validate_params}')
         this_path = pathlib.Path(__file__).absolute().parent
-        json_dict_loc = this_path / pathlib.Path(json_loc) / "methods.json"
-        LOGGER.debug(f'  Loading method definitionsL {json_dict_loc}')
-        all_methods = dict(sorted(self._load_kodi_json_def(json_dict_loc).items()))
-        
-        last_ns = ""
-        for entry, value in all_methods.items():
-            token = entry.split('.')
-            ns = token[0]
-            method = token[1]
-            if ns != last_ns:
-                self._namespaces[ns] = {}
-                last_ns = ns
-            self._namespaces[ns][method] = value
-            self._namespaces[ns][method]['csv'] = (entry in KodiObj.CSV_CAPABLE_COMMANDS.keys())
-        
-        json_dict_loc = this_path / pathlib.Path(json_loc) / "types.json"
-        LOGGER.debug(f'  Loading reference/types definitions: {json_dict_loc}')
-        self._kodi_references = self._load_kodi_json_def(json_dict_loc)
-
-        kodi_version_loc = this_path / pathlib.Path(json_loc) / "version.txt"
-        if kodi_version_loc.exists():
-            self._kodi_api_version = kodi_version_loc.read_text().replace('\n','')
-        else:
-            self._kodi_api_version = "Unknown"
-        LOGGER.debug(f'  Kodi RPC Version: {self._kodi_api_version}')
+        # Definitions are loaded (from the schema cache when current) on first use
+        self._schema = KodiSchema(this_path / pathlib.Path(json_loc), use_cache=schema_cache)
         
         # if LOGGER.getEffectiveLevel() == logging.DEBUG:
         #     LOGGER.debug('HTTP Logging enabled.')
@@ -329,6 +58,79 @@ class KodiObj():
         #     self._requests_log.setLevel(logging.DEBUG)
         #     self._requests_log.propagate = True
         #     http.client.print = self._http_client_print
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def _ip(self) -> str:
+        # Resolved on first reference only, help and validation do not need the network
+        if self._host_ip is None:
+            self._host_ip = self._get_ip(self._host)
+        return self._host_ip
+
+    @property
+    def _namespaces(self) -> dict:
+        return self._schema.namespaces
+
+    @property
+    def _kodi_references(self) -> dict:
+        return self._schema.references
+
+    @property
+    def _notifications(self) -> dict:
+        return self._schema.notifications
+
+    @property
+    def _help_index(self) -> HelpIndex:
+        return self._schema.help_index
+
+    @property
+    def _kodi_api_version(self) -> str:
+        return self._schema.api_version
+
+    @property
+    def metrics(self) -> MetricsRecorder:
+        """Recorder of the per-call measurements (None: calls are not measured)"""
+        return self._metrics
+
+    @metrics.setter
+    def metrics(self, recorder: MetricsRecorder):
+        self._metrics = recorder
+
+    @property
+    def response(self) -> JsonResponse:
+        """The response body as received (decoded at most once, see JsonResponse), None if none"""
+        return getattr(self._response, 'body', None)
+
+    @property
+    def response_text(self) -> str:
+        body = self.response
+        return body.text if body is not None else None
+
+    @property
+    def response_json(self) -> Any:
+        """The decoded response, None if there is no (json) response"""
+        body = self.response
+        try:
+            return body.json if body is not None else None
+        except ValueError:
+            return None
+
+    @property
+    def response_status_code(self) -> int:
+        return getattr(self._response, 'status_code', None)
+
+    @property
+    def request_success(self) -> bool:
+        return getattr(self._response, 'success', False)
+
+    def close(self):
+        """Close the connection(s) to the host (re-opened on next request)"""
+        self._transport.close()
         
     def get_namespace_list(self) -> list:
         """Returns a list of the Kodi namespace objeccts"""
@@ -370,7 +172,13 @@ class KodiObj():
                 LOGGER.error(f'{full_namespace} has not been implemented')
                 return False
 
-        # TODO: Check for required parameters
+            if parms is not None and self._validate_params:
+                try:
+                    self._check_params(full_namespace, parms)
+                except ParameterError as pe:
+                    self._set_invalid_params(full_namespace, pe)
+                    return False
+
         LOGGER.debug(f'  {full_namespace} is valid.')
         return True
 
@@ -378,6 +186,287 @@ class KodiObj():
         """Send Namesmpace.Method command to target host"""
         LOGGER.trace(f"send_request('{namespace}'),('{command}'),('{input_params}')")
         method = f'{namespace}.{command}'
+        try:
+            req_parms = self._build_params(namespace, command, input_params)
+        except ParameterError as pe:
+            return self._set_invalid_params(method, pe)
+        if self._response_cache is None:
+            return self._call_kodi(method, req_parms)
+
+        if self.is_cacheable(namespace, command):
+            cache_key = self._response_cache.make_key(self._host, self._port, method, req_parms)
+            cached = self._response_cache.get(cache_key)
+            if cached is not None:
+                LOGGER.debug(f'  {method} response from cache')
+                self._set_response(cached[0], cached[1], True)
+                return True
+            success = self._call_kodi(method, req_parms)
+            if success and self.response_status_code == 0:
+                self._response_cache.put(cache_key, self._host, namespace, method, 0, self.response_text)
+            return success
+
+        success = self._call_kodi(method, req_parms)
+        if self.is_mutating(namespace, command):
+            self._response_cache.invalidate(self._host, namespace)
+        return success
+
+    def send_batch(self, commands: List[Tuple[str, str, dict]], batch_size: int = 20) -> List[dict]:
+        """
+        Send a list of (Namespace, Method, params) commands as JSON-RPC batch requests.
+
+        Commands are posted in chunks of batch_size, responses are matched back by id and
+        returned (as dictionaries) in the same order as the commands.  Commands with invalid
+        parameters are not sent, their entry is an 'Invalid params.' error.  response_text holds
+        the combined json list, response_status_code is 0 or the first error code returned.
+        """
+        LOGGER.trace(f'send_batch({len(commands)} commands, batch_size={batch_size})')
+        self._clear_response()
+        batch_size = max(1, batch_size)
+        results = []
+        success = True
+        for start in range(0, len(commands), batch_size):
+            chunk = commands[start:start+batch_size]
+            payloads = []
+            chunk_results = [None] * len(chunk)
+            for idx, (namespace, command, input_params) in enumerate(chunk):
+                method = f'{namespace}.{command}'
+                try:
+                    req_parms = self._build_params(namespace, command, input_params)
+                except ParameterError as pe:
+                    LOGGER.error(f'{method}: invalid params - {pe}')
+                    chunk_results[idx] = invalid_params_response(method, pe, None)
+                    continue
+                payloads.append(self._build_payload(method, req_parms))
+            if not payloads:
+                results.extend(chunk_results)
+                continue
+            LOGGER.debug(f'Sending batch of {len(payloads)} requests ({start+1}..{start+len(payloads)})')
+            batch_success = self._call_kodi_payload(payloads, f'batch[{start+1}..{start+len(payloads)}]')
+            if self._response_cache is not None:
+                for namespace in { ns for ns, cmd, _ in chunk if self.is_mutating(ns, cmd) }:
+                    self._response_cache.invalidate(self._host, namespace)
+            if batch_success:
+                responses = self._match_batch_response(payloads, self.response_json)
+            else:
+                success = False
+                error_resp = self.response_json
+                responses = [ {"id": payload['id'], "jsonrpc": "2.0", "error": error_resp['error']} for payload in payloads ]
+            responses = iter(responses)
+            results.extend(entry if entry is not None else next(responses) for entry in chunk_results)
+
+        error_codes = [ r['error']['code'] for r in results if 'error' in r ]
+        status_code = error_codes[0] if error_codes else 0
+        self._set_response(status_code, JsonResponse.from_json(results), success)
+        return results
+
+    def supports_limits(self, namespace: str, command: str) -> bool:
+        """Returns True if the method accepts a limits parameter (i.e. can be paged)"""
+        param_list = self._namespaces[namespace][command].get('params', [])
+        return any(parm_entry['name'] == 'limits' for parm_entry in param_list)
+
+    def is_cacheable(self, namespace: str, command: str) -> bool:
+        """Returns True for read-only Get* and introspection methods (responses may be cached)"""
+        if self._namespaces[namespace][command].get('permission') != 'ReadData':
+            return False
+        return command.startswith('Get') or command in KodiObj.INTROSPECTION_COMMANDS
+
+    def is_idempotent(self, namespace: str, command: str) -> bool:
+        """Returns True for methods that are safe to send again after a failure (read-only Get*, introspection, Ping)"""
+        return self.is_cacheable(namespace, command) or f'{namespace}.{command}' == 'JSONRPC.Ping'
+
+    def is_mutating(self, namespace: str, command: str) -> bool:
+        """Returns True for methods that change state (cached responses of the namespace are dropped)"""
+        return self._namespaces[namespace][command].get('permission', 'ReadData') != 'ReadData'
+
+    def get_list_key(self, namespace: str, command: str) -> str:
+        """Returns the name of the list node in the result of a list returning method (i.e. 'songs'), None if not a list"""
+        list_schema = self.get_list_schema(namespace, command)
+        return list_schema.key if list_schema else None
+
+    def get_list_schema(self, namespace: str, command: str) -> ListSchema:
+        """Returns the list node and item layout of a list returning method (from its return definition), None if not a list"""
+        return self._schema.get_list_schema(f'{namespace}.{command}')
+
+    def iter_results(self, namespace: str, command: str, input_params: dict, page_size: int = 500, prefetch: bool = False) -> Iterator[dict]:
+        """
+        Yield the list items of a paged method (one that accepts limits), page_size items per request.
+
+        Successive {start, end} windows are requested until result.limits.total (or the end of
+        an input limits window) is reached.  With prefetch, the next page is requested while
+        the current page is being consumed.  While items are yielded, the response is the envelope
+        of the current page with an empty list node, on completion the envelope of the last page
+        with the limits of all pages (or the error response on failure).
+        """
+        method = f'{namespace}.{command}'
+        if not self.supports_limits(namespace, command):
+            raise ValueError(f'{method} does not support limits (paging)')
+        list_key = self.get_list_key(namespace, command)
+        try:
+            req_parms = self._build_params(namespace, command, input_params)
+        except ParameterError as pe:
+            self._set_invalid_params(method, pe)
+            return
+        window = req_parms.pop('limits', {})
+        start = int(window.get('start', 0))
+        stop = int(window['end']) if 'end' in window and int(window['end']) >= 0 else None
+        page_size = max(1, page_size)
+        LOGGER.debug(f'iter_results({method}) list_key: {list_key}  page_size: {page_size}  window: {start}..{stop}')
+
+        def fetch_page(page_start: int) -> Tuple[bool, int, JsonResponse]:
+            page_end = page_start + page_size
+            if stop is not None:
+                page_end = min(page_end, stop)
+            LOGGER.trace(f'  fetch {method} page {page_start}..{page_end}')
+            page_parms = dict(req_parms, limits={'start': page_start, 'end': page_end})
+            success = self._call_kodi(method, page_parms)
+            return success, self.response_status_code, self.response
+
+        if prefetch:
+            from concurrent.futures import ThreadPoolExecutor
+        executor = ThreadPoolExecutor(max_workers=1) if prefetch else None
+        try:
+            pending = None
+            page_start = start
+            while True:
+                if pending is not None:
+                    success, code, body = pending.result()
+                else:
+                    success, code, body = fetch_page(page_start)
+                pending = None
+                if not success or code != 0:
+                    self._set_response(code, body, success)
+                    return
+                envelope = body.json
+                result = envelope['result']
+                items = result.get(list_key, [])
+                total = result.get('limits', {}).get('total', 0)
+                end = total if stop is None else min(total, stop)
+                page_start += page_size
+                more = len(items) > 0 and page_start < end
+                if more and executor:
+                    pending = executor.submit(fetch_page, page_start)
+                # Until the last page, the response is the envelope of the current page (list node emptied)
+                self._set_response(0, JsonResponse.from_json(dict(envelope, result=dict(result, **{list_key: []}))), True)
+                for item in items:
+                    yield item
+                if not more:
+                    break
+            limits = {'start': start, 'end': min(page_start, end), 'total': total}
+            self._set_response(0, JsonResponse.from_json(dict(envelope, result=dict(result, **{list_key: []}, limits=limits))), True)
+        finally:
+            if executor:
+                executor.shutdown(wait=True)
+
+    def stream_results(self, namespace: str, command: str, input_params: dict, chunk_size: int = 65536) -> Iterator[dict]:
+        """
+        Yield the list items of a list returning method while the response body is being read.
+
+        The body is read in chunk_size pieces and parsed incrementally, so memory use does not
+        grow with the size of the list.  While items are yielded, the response is the head of the
+        envelope (request id, empty list node); once consumed, it is the full response envelope
+        (with an empty list node, limits) or the error response.
+        """
+        method = f'{namespace}.{command}'
+        list_key = self.get_list_key(namespace, command)
+        if not list_key:
+            raise ValueError(f'{method} does not return a list')
+        self._clear_response()
+        try:
+            req_parms = self._build_params(namespace, command, input_params)
+        except ParameterError as pe:
+            self._set_invalid_params(method, pe)
+            return
+        payload = self._build_payload(method, req_parms)
+        LOGGER.trace(f'Making streamed call to {self._transport.url} for {method}')
+        LOGGER.trace(f"  Payload: {payload}")
+        if self._metrics is None:
+            yield from self._stream_payload(payload, method, list_key, chunk_size)
+            return
+        # Items are yielded while measuring, the time the caller spends on them is included
+        metrics = RequestMetrics(method, self._host, self._transport_name)
+        try:
+            with measuring(metrics):
+                yield from self._stream_payload(payload, method, list_key, chunk_size)
+        finally:
+            metrics.status_code = self.response_status_code
+            self._metrics.record(metrics)
+
+    def _stream_payload(self, payload: dict, method: str, list_key: str, chunk_size: int) -> Iterator[dict]:
+        # Not retried, items may already have been passed on
+        if self._host_is_down(method):
+            return
+        try:
+            stream = JsonListStream(self._transport.stream(payload, chunk_size), list_key)
+            # Until the stream is consumed, the response is the head of the envelope (list node emptied)
+            self._set_response(0, JsonResponse.from_json({"id": payload['id'], "jsonrpc": "2.0", "result": {list_key: []}}), True)
+            for item in stream:
+                yield item
+        except (TransportError, ValueError) as re:
+            LOGGER.debug(repr(re))
+            if getattr(re, 'transient', False) and self._breaker is not None:
+                self._breaker.record_failure()
+            self._set_error(-20, method, repr(re))
+            return
+        if self._breaker is not None:
+            self._breaker.record_success()
+
+        resp_json = stream.response
+        LOGGER.debug(f'  {stream.item_count} {list_key} streamed')
+        response = JsonResponse.from_json(resp_json)
+        self._set_response(response.error_code(), response, True)
+
+    # === Notification functions ==========================================================
+    def get_notification_list(self, pattern: str = '*') -> list:
+        """Returns the notification names (i.e. Player.OnPlay) matching pattern (i.e. Player.*)"""
+        return [ name for name in self._notifications.keys() if fnmatch.fnmatchcase(name, pattern) ]
+
+    def on_notification(self, pattern: str, handler: NotificationHandler):
+        """
+        Register handler(host, notification) for notifications matching pattern (Player.OnPlay,
+        Player.*, *).  Handlers are called from listen().
+        """
+        if not self.get_notification_list(pattern):
+            raise ValueError(f"'{pattern}' does not match any notification")
+        self._notification_handlers.append((pattern, handler))
+
+    def listen(self, tcp_port: int = None, reconnect: bool = True) -> bool:
+        """
+        Receive notifications from the host until stop_listening() (or KeyboardInterrupt).
+        Notifications are only sent on the tcp port (tcp_port, the port of the tcp transport
+        or 9090).  The connection is re-established when lost, unless reconnect is False.
+        """
+        if tcp_port is None:
+            tcp_port = self._port if self._transport_name == 'tcp' else DEFAULT_TCP_PORT
+        self._listener = NotificationListener(self._host, tcp_port, reconnect=reconnect)
+        for pattern, handler in self._notification_handlers:
+            self._listener.add_handler(pattern, handler)
+        try:
+            return self._listener.run()
+        finally:
+            self._listener.stop()
+
+    def stop_listening(self):
+        """Stop listen() (may be called from a handler or another thread)"""
+        if self._listener:
+            self._listener.stop()
+
+    def _check_params(self, method: str, input_params: dict) -> dict:
+        """Return input_params validated and coerced to the method's parameter types, raises ParameterError"""
+        validator = self._schema.get_validator(method)
+        if validator is None:
+            return input_params
+        return validator.validate(input_params)
+
+    def _set_invalid_params(self, method: str, error: ParameterError) -> bool:
+        LOGGER.error(f'{method}: invalid params - {error}')
+        self._set_response(INVALID_PARAMS_CODE, JsonResponse.from_json(invalid_params_response(method, error)), False)
+        return False
+
+    def _build_params(self, namespace: str, command: str, input_params: dict) -> dict:
+        """Build request parameters from input parameters (validated and coerced) and the method template defaults"""
+        method = f'{namespace}.{command}'
+        if self._validate_params:
+            input_params = self._check_params(method, input_params)
         LOGGER.debug(f'Load Command Template : {method}')
         param_template = self._namespaces[namespace][command]
         parm_list = param_template['params']
@@ -399,15 +488,22 @@ class KodiObj():
             else:
                 LOGGER.trace(f'    Key    : {parm_name:15}  Value: {parm_value} BYPASS')
         LOGGER.trace('')
-        return self._call_kodi(method, req_parms)
+        return req_parms
 
     # === Help functions ==========================================================
     def help(self, input_string: str = None):
         """Provide help context for the namespace or namespace.method"""
+        HelpParameter._get_console_size()  # once per render
         namesp = None
         method = None
         ref_id = None
         if input_string:
+            if input_string.lower() == 'notifications':
+                self._help_notifications()
+                return
+            if input_string in self._notifications:
+                self._help_notification(input_string)
+                return
             if input_string in self._kodi_references:
                 ref_id = input_string
             else:
@@ -448,7 +544,7 @@ class KodiObj():
         self._help_namespace_method(namesp, method)
 
     def _help_sep_line(self) -> str:
-        return f"{'—'*HelpParameter()._max_cols}"
+        return f"{'—'*HelpParameter._max_cols}"
 
 
     def _help_namespaces(self):
@@ -491,28 +587,45 @@ class KodiObj():
         param_list = help_json.get('params', [])
         p_names = self._get_parameter_names(param_list)
         print(self._help_sep_line())
-        HelpParameter()._print_parameter_line("Signature", f'{ns}.{method}({p_names})',)
+        HelpParameter._print_parameter_line("Signature", f'{ns}.{method}({p_names})',)
         # print(f'Signature    : {ns}.{method}({p_names})')
         description = help_json['description']
         if help_json.get('csv') == True:
             description = f'{description} (csv)'
-        HelpParameter()._print_parameter_line("Description", description,)
+        HelpParameter._print_parameter_line("Description", description,)
         print(self._help_sep_line())
 
-        if len(param_list) > 0:
-            for param_item in param_list:
-                hp = HelpParameter(param_item, self._kodi_references)
-                hp.populate()
-                hp.print_parameter_definition()
+        for hp in self._help_index.methods[f'{ns}.{method}']:
+            hp.print_parameter_definition()
+
+        LOGGER.info(f'\nRaw Json Definition:\n{self._help_index.raw[f"{ns}.{method}"]}')
+
+    def _help_notifications(self):
+        LOGGER.trace('_help_notifications()')
+        print('\nKodi notifications (kodi-cli listen):\n')
+        print('  Notification                        Description')
+        print(f"  {'—'*35} {'—'*50}")
+        for name, def_block in self._notifications.items():
+            print(f"  {name:35} {def_block['description']}")
+
+    def _help_notification(self, name: str):
+        LOGGER.trace(f'_help_notification({name})')
+        help_json = self._notifications[name]
+        print()
+        print(self._help_sep_line())
+        HelpParameter._print_parameter_line("Notification", name)
+        HelpParameter._print_parameter_line("Description", help_json['description'])
+        print(self._help_sep_line())
+        for hp in self._help_index.notifications[name]:
+            hp.print_parameter_definition()
 
-        LOGGER.info(f'\nRaw Json Definition:\n{json.dumps(help_json,indent=2)}')
+        LOGGER.info(f'\nRaw Json Definition:\n{self._help_index.raw[name]}')
 
     def _help_reference(self, ref_id: str):
         LOGGER.trace(f'__help_reference({ref_id})')
-        help_json = self._kodi_references.get(ref_id)
         print(self._help_sep_line())
         print(f'Reference: {ref_id}')
-        print(f'{json.dumps(help_json,indent=2)}')
+        print(self._help_index.raw[ref_id])
         print('')
 
     # === Private Class Fuctions ==============================================================
@@ -527,80 +640,127 @@ class KodiObj():
     def _http_client_print(self,*args):
         self._requests_log.debug(" ".join(args))    
 
-    def _load_kodi_json_def(self, file_name: pathlib.Path) -> dict:
-        """Load kodi namespace definition from configuration json file"""
-        # this_path = os.path.dirname(os.path.abspath(__file__))
-        # json_file = f'{this_path}{os.sep}kodi_namespaces.json'
-        if not file_name.exists():
-            raise FileNotFoundError(file_name)
-        with open(file_name,"r") as json_fh:
-            json_data = json.load(json_fh)
-        return json_data
-
     def _clear_response(self):
-        self.response_text = None
-        self.response_status_code = None
-        self.request_success = False
-
-    def _set_response(self, code: int, text: str, success: bool = False):
-        self.response_status_code = code
-        self.response_text = text
-        self.request_success = success
+        self._response.body = None
+        self._response.status_code = None
+        self._response.success = False
+
+    def _set_response(self, code: int, body: JsonResponse, success: bool = False):
+        """Set the response state, body may be a (plain) message text"""
+        self._response.status_code = code
+        self._response.body = JsonResponse(text=body) if isinstance(body, str) else body
+        self._response.success = success
         LOGGER.debug('  Response -')
         LOGGER.debug(f'    status_code: {code}')
-        LOGGER.debug(f'    resp_test  : {text}')
+        LOGGER.debug(f'    resp_test  : {self._response.body}')
         LOGGER.debug(f'    success    : {success}')
 
+    def _build_payload(self, method: str, params: dict) -> dict:
+        return {"jsonrpc": "2.0", "id": next(self._request_ids), "method": f"{method}", "params": params }
+
+    def _match_batch_response(self, payloads: List[dict], resp_json) -> List[dict]:
+        """Return batch responses in payload order, matched on request id"""
+        if isinstance(resp_json, dict):
+            # Kodi rejected the batch as a whole (i.e. parse error)
+            resp_json = [ {"id": payload['id'], "jsonrpc": "2.0", "error": resp_json.get('error')} for payload in payloads ]
+        responses = { entry.get('id'): entry for entry in resp_json }
+        results = []
+        for payload in payloads:
+            entry = responses.get(payload['id'])
+            if entry is None:
+                entry = {"id": payload['id'], "jsonrpc": "2.0",
+                         "error": {"code": -40, "data": {"method": payload['method']}, "message": "No response returned for request."}}
+            results.append(entry)
+        return results
+
     def _call_kodi(self, method: str, params: dict = {}) -> bool:
         self._clear_response()
-        MAX_RETRY = 2
-        payload = {"jsonrpc": "2.0", "id": 1, "method": f"{method}", "params": params }
-        headers = {"Content-type": "application/json"}
+        payload = self._build_payload(method, params)
+        return self._call_kodi_payload(payload, method)
+
+    def _call_kodi_payload(self, payload, method: str) -> bool:
+        if self._metrics is None:
+            return self._send_payload(payload, method)
+        metrics = RequestMetrics(method, self._host, self._transport_name)
+        try:
+            with measuring(metrics):
+                return self._send_payload(payload, method, metrics)
+        finally:
+            metrics.status_code = self.response_status_code
+            self._metrics.record(metrics)
+
+    def _send_payload(self, payload, method: str, metrics: RequestMetrics = None) -> bool:
         LOGGER.trace(f'Prep call to {self._host}')
-        LOGGER.trace(f"  URL    : {self._base_url}")
+        LOGGER.trace(f"  URL    : {self._transport.url}")
         LOGGER.trace(f"  Method : {method}")
         LOGGER.trace(f"  Payload: {payload}")
-
-        retry = 0
-        success = False  # default for 1st loop cycle
-        while not success and retry < MAX_RETRY:
+        if self._host_is_down(method):
+            return False
+
+        policy = self._retry_policy
+        retryable = self._is_idempotent_payload(payload)
+        deadline = time.monotonic() + policy.deadline
+        attempt = 1
+        while True:
             try:
-                LOGGER.trace(f'Making call to {self._base_url} for {method}')
-                resp = requests.post(self._base_url,
-                                    auth=(self._userid, self._password),
-                                    data=json.dumps(payload),
-                                    headers=headers, timeout=(5,3)) # connect, read
-
-                if resp.status_code == 200:
-                    resp_json = json.loads(resp.text)
-                    if 'error' in resp_json.keys():
-                        self._set_response(resp_json['error']['code'], resp.text, True)
-                    else:
-                        self._set_response(0, resp.text, True)
-                    success = True
-                else:
-                    retry = MAX_RETRY
-                    resp.raise_for_status()
-            except requests.RequestException as re:
-                LOGGER.debug(repr(re))
-                retry = MAX_RETRY + 1
-                self._error_json['error']['code'] = -20
-                self._error_json['error']['data']['method'] = method
-                self._error_json['error']['message'] = repr(re)
-                self._set_response(-20, json.dumps(self._error_json))
+                LOGGER.trace(f'Making call to {self._transport.url} for {method}')
+                response = self._transport.send(payload)
+                # Only decoded here if it may be an error, otherwise when (if) the caller needs it
+                decode_start = time.perf_counter()
+                error_code = response.error_code()
+                if metrics is not None and response.decoded:
+                    metrics.add_time('decode_ms', time.perf_counter() - decode_start)
+                self._set_response(error_code, response, True)
+                if self._breaker is not None:
+                    self._breaker.record_success()
+                return True
+            except TransportError as te:
+                LOGGER.debug(repr(te))
+                self._set_error(-20, method, repr(te))
+                transient = te.transient
+                host_failure = transient
             except Exception as ce:
+                # i.e. unreadable (truncated) response
                 LOGGER.debug(repr(ce))
-                retry += 1
-                if not hasattr(ce, "message"):
-                    self._error_json['error']['code'] = -30
-                    self._error_json['error']['code']['data']['method'] = method
-                    self._error_json['error']['message'] = repr(ce)
-                    self._set_response(-30, json.dumps(self._error_json))
-                time.sleep(2)
-
-        if not success:
-            LOGGER.trace(self._error_json)
-        return success
+                self._set_error(-30, method, repr(ce))
+                transient = True
+                host_failure = False
+
+            if not (retryable and transient) or attempt >= policy.attempts or (self._breaker is not None and self._breaker.is_open):
+                LOGGER.trace(self.response)
+                return self._call_failed(host_failure)
+            delay = policy.delay(attempt)
+            if time.monotonic() + delay > deadline:
+                LOGGER.debug(f'  {method}: no retry, {policy.deadline}s deadline reached')
+                return self._call_failed(host_failure)
+            LOGGER.debug(f'  {method}: attempt {attempt} failed, retry in {delay:.2f}s')
+            if metrics is not None:
+                metrics.retries += 1
+            time.sleep(delay)
+            attempt += 1
+
+    def _call_failed(self, host_failure: bool) -> bool:
+        """Retries exhausted: one breaker failure per call (not per attempt) if the host did not respond"""
+        if host_failure and self._breaker is not None:
+            self._breaker.record_failure()
+        return False
+
+    def _host_is_down(self, method: str) -> bool:
+        """True (response set to an error) if the host's circuit is open, the call is not sent"""
+        if self._breaker is None or not self._breaker.is_open:
+            return False
+        message = f'{self._host}:{self._port} is not responding (circuit open {self._breaker.down_for:.0f}s, probing in background)'
+        LOGGER.debug(f'  {method}: {message}')
+        self._set_error(-20, method, message)
+        return True
+
+    def _set_error(self, code: int, method: str, message: str):
+        error_json = {"error": {"code": code, "data": {"method": method}, "message": message}}
+        self._set_response(code, JsonResponse.from_json(error_json))
+
+    def _is_idempotent_payload(self, payload) -> bool:
+        entries = payload if isinstance(payload, list) else [payload]
+        return all(self.is_idempotent(*entry['method'].split('.', 1)) for entry in entries)
 
     def _get_parameter_names(self, json_param_list: list, identify_optional: bool = True) -> list:
         name_list = []
@@ -0,0 +1,241 @@
+"""
+Library inventory storage: csv files and the delta sync snapshot.
+
+The snapshot records, per movie/episode id, the values that change when an item is added,
+played or updated (dateadded, lastplayed, playcount).  A delta sync compares the current
+values with the snapshot and only retrieves new/changed items, the csv files are then
+patched (records of unchanged items are kept as-is).
+"""
+import csv
+import io
+import os
+import pathlib
+import re
+import time
+from typing import Any, Callable, Dict, Iterable, List, Set, Tuple
+
+from kodi_logger import LOGGER
+import kodi_common as util
+import kodi_json
+
+SNAPSHOT_FILE = './inventory_snapshot.json'
+SNAPSHOT_VERSION = 1
+WATERMARK_PROPERTIES = ['dateadded', 'lastplayed', 'playcount']
+
+Watermarks = Dict[str, list]  # item id (str) -> [dateadded, lastplayed, playcount]
+
+
+# == CSV ============================================================================================
+WRITE_BUFFER_SIZE = 1024 * 1024
+
+def _quoted(value: str) -> str:
+    return '"' + value.replace('"', "'") + '"'
+
+def _joined(value: list) -> str:
+    return _quoted(','.join(str(x) for x in value))
+
+def _joined_values(value: dict) -> str:
+    return _joined(value.values())
+
+def _other(value) -> str:
+    return _quoted(str(value))
+
+# Text int() may accept (matched first, an int() failing on most text values is slow)
+_INTEGER_TEXT = re.compile(r'\s*[+-]?\d+(?:_\d+)*\s*')
+
+def _text(value: str) -> str:
+    # Integer text (i.e. votes) is written as is
+    if _INTEGER_TEXT.fullmatch(value) and util.is_integer(value):
+        return value
+    return _quoted(value)
+
+# Formatter per value type, other values are written as is if they are integers (i.e. floats), else quoted
+_FORMATTERS: Dict[type, Callable[[Any], str]] = {str: _text, int: str, bool: str, list: _joined, dict: _joined_values}
+
+def csv_value(value) -> str:
+    """Format a value as written to the inventory csv files, integers (and integer text) as is"""
+    formatter = _FORMATTERS.get(type(value))
+    if formatter is not None:
+        return formatter(value)
+    return str(value) if util.is_integer(value) else _other(value)
+
+def csv_record(entry: dict, header: List[str] = None) -> str:
+    """Return the csv line for entry, columns in header order (default entry order)"""
+    if header is None:
+        return ','.join(csv_value(v) for v in entry.values())
+    return ','.join(csv_value(entry.get(col, '')) for col in header)
+
+def _column_formatter(sample) -> Callable[[Any], str]:
+    """
+    Formatter of a column, for the type of its value in the first record.  Values are formatted
+    as by csv_value() (a full export and a delta patch write the same record), the type lookup
+    is skipped for values of the first value's type.
+    """
+    expected = type(sample)
+    formatter = _FORMATTERS.get(expected)
+    if formatter is None:
+        return csv_value
+    def format_value(value) -> str:
+        return formatter(value) if type(value) is expected else csv_value(value)
+    return format_value
+
+
+class CsvWriter():
+    """
+    Inventory csv file, records are written as they arrive through a large write buffer.
+
+    The columns and the formatter of each column are taken from the first record, values
+    are then formatted without working out their type again.  Records go to a temporary
+    file that replaces file_nm on close, a failed export leaves the previous file in place
+    (and no file is written when there are no records).
+    """
+    def __init__(self, file_nm: str, buffer_size: int = WRITE_BUFFER_SIZE):
+        self._file_loc = pathlib.Path(file_nm)
+        self._tmp_file = self._file_loc.with_suffix(f'.{os.getpid()}.tmp')
+        self._buffer_size = buffer_size
+        self._out = None
+        self._columns: List[Tuple[str, Callable[[Any], str]]] = None
+        self.count = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close(discard=exc_type is not None)
+
+    def write(self, entry: dict):
+        if self._columns is None:
+            self._start(entry)
+        get = entry.get
+        self._out.write(','.join([ format_value(get(col, '')) for col, format_value in self._columns ]) + '\n')
+        self.count += 1
+
+    def _start(self, first_entry: dict):
+        self._columns = [ (col, _column_formatter(value)) for col, value in first_entry.items() ]
+        self._out = self._tmp_file.open('w', encoding='UTF-8', buffering=self._buffer_size)
+        self._out.write(','.join(first_entry.keys()) + '\n')
+
+    def close(self, discard: bool = False):
+        if self._out is None:
+            return
+        self._out.close()
+        self._out = None
+        if discard:
+            self._tmp_file.unlink()
+        else:
+            os.replace(self._tmp_file, self._file_loc)
+
+
+def split_csv_records(text: str) -> List[str]:
+    """Split csv text into records (a quoted value may contain line breaks)"""
+    records = []
+    pending = ''
+    for line in text.splitlines(keepends=True):
+        pending += line
+        # Values never contain a double quote (replaced on write), so an odd count means an open value
+        if pending.count('"') % 2 == 0:
+            records.append(pending)
+            pending = ''
+    if pending:
+        records.append(pending)
+    return records
+
+def patch_csv(file_nm: str, id_key: str, updates: Dict[str, dict], removed: Set[str], group_key: str = None) -> bool:
+    """
+    Apply changes to an inventory csv file.
+
+    Records whose id is in updates are replaced (or added if new), records whose id is in
+    removed are dropped, all other records are written back unchanged.  New records are
+    placed after the last record with the same group_key value (i.e. show_name), or at the
+    end.  Returns False if the file cannot be patched (missing, or columns differ).
+    """
+    file_loc = pathlib.Path(file_nm)
+    if not file_loc.exists():
+        return False
+    records = split_csv_records(file_loc.read_text(encoding='UTF-8'))
+    if not records:
+        return False
+    header = next(csv.reader([records[0].strip()]))
+    if id_key not in header or any(key not in header for entry in updates.values() for key in entry.keys()):
+        LOGGER.debug(f'  {file_nm} columns differ, unable to patch')
+        return False
+    id_idx = header.index(id_key)
+    group_idx = header.index(group_key) if group_key in header else None
+
+    pending = dict(updates)
+    output = [records[0]]
+    last_in_group: Dict[str, int] = {}
+    for record in records[1:]:
+        values = next(csv.reader(io.StringIO(record)), None)
+        if not values:
+            continue
+        item_id = values[id_idx]
+        if item_id in removed:
+            continue
+        if item_id in pending:
+            record = f'{csv_record(pending.pop(item_id), header)}\n'
+        output.append(record)
+        if group_idx is not None:
+            last_in_group[values[group_idx]] = len(output) - 1
+
+    # New records, grouped with their show (inserted from the end so positions stay valid)
+    inserts: List[Tuple[int, str]] = []
+    for entry in pending.values():
+        group = str(entry.get(group_key, '')) if group_idx is not None else None
+        position = last_in_group.get(group, len(output) - 1) if group is not None else len(output) - 1
+        inserts.append((position, f'{csv_record(entry, header)}\n'))
+    for position, record in sorted(inserts, key=lambda x: x[0], reverse=True):
+        output.insert(position + 1, record)
+
+    tmp_file = file_loc.with_suffix(f'.{os.getpid()}.tmp')
+    tmp_file.write_text(''.join(output), encoding='UTF-8')
+    os.replace(tmp_file, file_loc)
+    return True
+
+
+# == Snapshot =======================================================================================
+def watermark(item: dict) -> list:
+    return [ item.get(prop) for prop in WATERMARK_PROPERTIES ]
+
+def diff_watermarks(previous: Watermarks, current: Watermarks) -> Tuple[Set[str], Set[str], Set[str]]:
+    """Return (new, changed, removed) item ids"""
+    new_ids = { item_id for item_id in current.keys() if item_id not in previous }
+    changed_ids = { item_id for item_id, marks in current.items() if item_id in previous and previous[item_id] != marks }
+    removed_ids = { item_id for item_id in previous.keys() if item_id not in current }
+    return new_ids, changed_ids, removed_ids
+
+def carry_forward(previous: Watermarks, current: Watermarks, new_ids: Set[str], changed_ids: Set[str], retrieved: Iterable[str]) -> Watermarks:
+    """Watermarks to store, items that could not be retrieved stay new/changed for the next sync"""
+    marks = dict(current)
+    for item_id in (new_ids | changed_ids) - set(retrieved):
+        if item_id in new_ids:
+            del marks[item_id]
+        else:
+            marks[item_id] = previous[item_id]
+    return marks
+
+def load_snapshot(host: str, file_nm: str = SNAPSHOT_FILE) -> dict:
+    """Return the snapshot for host, an empty snapshot if none (or taken from another host)"""
+    empty = {'version': SNAPSHOT_VERSION, 'host': host, 'synced': None, 'movies': None, 'episodes': None}
+    file_loc = pathlib.Path(file_nm)
+    if not file_loc.exists():
+        return empty
+    try:
+        snapshot = kodi_json.loads(file_loc.read_bytes())
+    except ValueError as ve:
+        LOGGER.warning(f'Snapshot {file_nm} is not readable, full sync - {repr(ve)}')
+        return empty
+    if snapshot.get('version') != SNAPSHOT_VERSION or snapshot.get('host') != host:
+        LOGGER.info(f'Snapshot {file_nm} is for another host/version, full sync')
+        return empty
+    return snapshot
+
+def save_snapshot(snapshot: dict, file_nm: str = SNAPSHOT_FILE):
+    snapshot['synced'] = time.strftime('%Y-%m-%d %H:%M:%S')
+    file_loc = pathlib.Path(file_nm)
+    tmp_file = file_loc.with_suffix(f'.{os.getpid()}.tmp')
+    tmp_file.write_bytes(kodi_json.dumpb(snapshot))
+    os.replace(tmp_file, file_loc)
+
+def make_watermarks(items: Iterable[dict], id_key: str) -> Watermarks:
+    return { str(item[id_key]): watermark(item) for item in items }
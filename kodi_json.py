@@ -0,0 +1,118 @@
+"""
+JSON codec used for Kodi requests/responses, definition files and output.
+
+orjson is used when it is installed (several times faster, decodes bytes directly),
+otherwise the stdlib json module.  KODI_CLI_JSON=json (or orjson) selects a codec.
+
+Decoding accepts bytes, a response body is parsed as received without being decoded to
+a str first.  dumpb() encodes to bytes (request payloads, output written to a binary
+stream), dumps() to str.  The codec is selected (and orjson imported) on first use.
+"""
+import json
+import os
+import threading
+from typing import Any, List, Union
+
+from kodi_logger import LOGGER
+
+CODEC_ENV_VAR = 'KODI_CLI_JSON'
+CODECS = ['orjson', 'json']  # in order of preference
+
+JsonData = Union[bytes, bytearray, str]
+
+
+class JsonCodec():
+    """stdlib json"""
+    name = 'json'
+
+    def loads(self, data: JsonData) -> Any:
+        return json.loads(data)
+
+    def dumps(self, obj: Any, pretty: bool = False) -> str:
+        return json.dumps(obj, indent=2) if pretty else json.dumps(obj)
+
+    def dumpb(self, obj: Any, pretty: bool = False) -> bytes:
+        return self.dumps(obj, pretty).encode('utf-8')
+
+
+class OrjsonCodec(JsonCodec):
+    """orjson (raises ImportError if not installed)"""
+    name = 'orjson'
+
+    def __init__(self):
+        import orjson
+        self._orjson = orjson
+        self._options = orjson.OPT_NON_STR_KEYS  # int keys are written as strings, as json does
+
+    def loads(self, data: JsonData) -> Any:
+        return self._orjson.loads(data)
+
+    def dumps(self, obj: Any, pretty: bool = False) -> str:
+        return self.dumpb(obj, pretty).decode('utf-8')
+
+    def dumpb(self, obj: Any, pretty: bool = False) -> bytes:
+        try:
+            return self._orjson.dumps(obj, option=(self._options | self._orjson.OPT_INDENT_2) if pretty else self._options)
+        except TypeError:
+            # i.e. integers beyond 64 bit
+            return JsonCodec.dumps(self, obj, pretty).encode('utf-8')
+
+
+def create_codec(name: str) -> JsonCodec:
+    """Return codec name (json|orjson), ImportError if it is not installed"""
+    if name == 'orjson':
+        return OrjsonCodec()
+    if name == 'json':
+        return JsonCodec()
+    raise ValueError(f"Unknown json codec '{name}', valid values: {', '.join(CODECS)}")
+
+def available_codecs() -> List[str]:
+    """Names of the codecs that can be used (installed)"""
+    names = []
+    for name in CODECS:
+        try:
+            create_codec(name)
+        except ImportError:
+            continue
+        names.append(name)
+    return names
+
+
+_codec: JsonCodec = None
+_codec_lock = threading.Lock()
+
+def get_codec() -> JsonCodec:
+    """The codec in use: KODI_CLI_JSON, else (or if it is not a valid codec) the first installed of CODECS"""
+    global _codec
+    if _codec is None:
+        with _codec_lock:
+            if _codec is None:
+                requested = os.getenv(CODEC_ENV_VAR)
+                names = [requested] + [ name for name in CODECS if name != requested ] if requested else CODECS
+                for name in names:
+                    try:
+                        _codec = create_codec(name)
+                        break
+                    except ImportError:
+                        continue
+                    except ValueError as ve:
+                        LOGGER.warning(f'{CODEC_ENV_VAR}: {ve}')
+                        continue
+    return _codec
+
+def use_codec(name: str) -> JsonCodec:
+    """Switch the codec in use (i.e. benchmarks)"""
+    global _codec
+    codec = create_codec(name)
+    with _codec_lock:
+        _codec = codec
+    return codec
+
+def loads(data: JsonData) -> Any:
+    return get_codec().loads(data)
+
+def dumps(obj: Any, pretty: bool = False) -> str:
+    return get_codec().dumps(obj, pretty)
+
+def dumpb(obj: Any, pretty: bool = False) -> bytes:
+    return get_codec().dumpb(obj, pretty)
@@ -0,0 +1,109 @@
+import re
+from typing import Iterable, Iterator
+
+from kodi_logger import LOGGER
+import kodi_json
+
+
+class JsonListStream():
+    """
+    Incrementally parse a Kodi json response, yielding the entries of the result list node
+    (i.e. 'songs') one at a time as the body chunks arrive.
+
+    Only the entry currently being decoded is held in memory.  Once the stream has been
+    consumed, response holds the response envelope (id, error, result.limits,...) with the
+    list node emptied.
+
+    The body is scanned as bytes for the end of each entry (braces outside of strings), the
+    entry is then decoded by the json codec (kodi_json) straight from the bytes.
+    """
+    _OPEN = (ord('{'), ord('['))
+    _QUOTE = ord('"')
+    _LIST_END = ord(']')
+    _SEPARATORS = re.compile(rb'[\s,]*')
+    # up to the next brace outside of a string (see JsonMessageSplitter)
+    _SKIP = re.compile(rb'[^"{}\[\]]*(?:"[^"\\]*(?:\\.[^"\\]*)*"[^"{}\[\]]*)*', re.DOTALL)
+    _STRING = re.compile(rb'"[^"\\]*(?:\\.[^"\\]*)*"', re.DOTALL)
+    _LITERAL = re.compile(rb'[^\s,\]]+')  # number, true, false, null
+
+    def __init__(self, chunks: Iterable[bytes], list_key: str):
+        self._chunks = iter(chunks)
+        self._list_key = list_key
+        self._list_start = re.compile(rb'"%s"\s*:\s*\[' % re.escape(list_key.encode('utf-8')))
+        self._eof = False
+        self.item_count = 0
+        self.response = None
+
+    def __iter__(self) -> Iterator[dict]:
+        # Phase 1 - everything up to the start of the list node
+        prefix = bytearray()
+        match = None
+        while match is None:
+            scan_from = max(0, len(prefix) - len(self._list_key) - 16)
+            if not self._fill(prefix):
+                # No list node (error response or empty result)
+                self.response = kodi_json.loads(prefix)
+                return
+            # Re-scan a little of the previous data in case the key spans chunks
+            match = self._list_start.search(prefix, scan_from)
+        buffer = prefix[match.end():]
+        del prefix[match.end()-1:]
+        LOGGER.trace(f'JsonListStream: found list node "{self._list_key}"')
+
+        # Phase 2 - list entries
+        pos = 0
+        while True:
+            pos = self._SEPARATORS.match(buffer, pos).end()
+            end = self._entry_end(buffer, pos) if pos < len(buffer) else -1
+            if end < 0:
+                # Entry is incomplete, read more (buffer keeps the entry only)
+                del buffer[:pos]
+                pos = 0
+                if not self._fill(buffer):
+                    raise ValueError(f'Unexpected end of response in "{self._list_key}" list')
+                continue
+            if end == pos:
+                break
+            item = kodi_json.loads(buffer[pos:end])
+            pos = end
+            self.item_count += 1
+            yield item
+
+        # Phase 3 - remainder of the envelope (i.e. limits)
+        tail = buffer[pos+1:]
+        while self._fill(tail):
+            pass
+        self.response = kodi_json.loads(prefix + b'[]' + tail)
+        LOGGER.trace(f'JsonListStream: {self.item_count} entries parsed')
+
+    def _entry_end(self, buffer: bytearray, pos: int) -> int:
+        """End of the entry at pos, pos at the end of the list, -1 if not complete yet"""
+        first = buffer[pos]
+        if first == self._LIST_END:
+            return pos
+        if first in self._OPEN:
+            depth = 0
+            while True:
+                pos = self._SKIP.match(buffer, pos).end()
+                if pos >= len(buffer) or buffer[pos] == self._QUOTE:
+                    return -1
+                depth += 1 if buffer[pos] in self._OPEN else -1
+                pos += 1
+                if depth == 0:
+                    return pos
+        if first == self._QUOTE:
+            match = self._STRING.match(buffer, pos)
+            return match.end() if match else -1
+        end = self._LITERAL.match(buffer, pos).end()
+        return end if end < len(buffer) else -1
+
+    def _fill(self, buffer: bytearray) -> bool:
+        """Append the next chunk to buffer, False at the end of the body"""
+        if self._eof:
+            return False
+        for chunk in self._chunks:
+            if chunk:
+                buffer.extend(chunk)
+                return True
+        self._eof = True
+        return False
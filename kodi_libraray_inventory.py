@@ -1,22 +1,32 @@
 import argparse
-import json
+import itertools
+import math
 import pathlib
 import textwrap
-from typing import Any, List, Tuple
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 
-from loguru import logger as LOGGER
+from kodi_logger import LOGGER
 
 import cfg
-import kodi_common as util
+import kodi_inventory_store as store
 from kodi_interface import KodiObj
+from kodi_library_db import LibraryMirror
+from kodi_metrics import MetricsRecorder
+from kodi_retry import RetryPolicy
 
 EPISODE_FILE='./episodes.csv'
 MOVIE_FILE='./movies.csv'
+SONG_FILE='./songs.csv'
+EPISODE_PAGE_SIZE=1000
+SEASON_WINDOW=2  # seasons requested ahead per worker
 
 class KodiCommand:
     TVSHOW_OPTIONS = ['watchedepisodes','season','episode']
     TVSHOW_EPISODE_OPTIONS = ['dateadded','episode','firstaired','playcount','plot','runtime','season','showtitle','title','rating','votes']
     MOVIE_OPTIONS = ['dateadded','genre','lastplayed','mpaa','playcount','plot','plotoutline','premiered','rating','runtime','title','userrating','votes','year']
+    SONG_OPTIONS = ['album','artist','dateadded','duration','genre','lastplayed','playcount','title','track','year']
 
     def __init__(self, namespace: str, method: str, parms: dict = None) -> None:
         self.namespace = namespace
@@ -37,7 +47,7 @@ def get_tv_shows(kodi: KodiObj) -> List[dict]:
     if not _call_kodi(kodi, cmd):
         LOGGER.error(f'ERROR: {kodi.response_status_code} - {kodi.response_text}')
     else:
-        r_json = json.loads(kodi.response_text)
+        r_json = kodi.response_json
         for show in r_json['result']['tvshows']:
             # if show['episode'] > 0 and show['episode'] > show['watchedepisodes']:
             if show['episode'] > 0:
@@ -49,60 +59,287 @@ def get_tv_shows(kodi: KodiObj) -> List[dict]:
     return tv_shows
 
 def get_tv_show_episodes(kodi: KodiObj, show_name: str, tvshow_id: int, season: int) -> List[dict]:
+    _, episodes = _get_season_episodes(kodi, show_name, tvshow_id, season)
+    return episodes
+
+def _get_season_episodes(kodi: KodiObj, show_name: str, tvshow_id: int, season: int) -> Tuple[bool, List[dict]]:
     episodes = list()
     LOGGER.info(f'- Retrieving {show_name}  season {season}...')
     cmd = KodiCommand('VideoLibrary', 'GetEpisodes', {'tvshowid': tvshow_id, 'season': season, 'properties': KodiCommand.TVSHOW_EPISODE_OPTIONS})
-    if not _call_kodi(kodi, cmd):
+    success = _call_kodi(kodi, cmd)
+    if not success:
         LOGGER.error(f'  ERROR: {kodi.response_status_code} - {kodi.response_text}')
     else:
-        r_json = json.loads(kodi.response_text)
+        r_json = kodi.response_json
         for episode in r_json['result']['episodes']:
             entry:dict = {"show_name": show_name}
             entry.update(episode)
             episodes.append(entry)
             # print(episode)
         LOGGER.trace(f'  {len(episodes)} loaded.')
+    return success, episodes
+
+def iter_season_episodes(kodi: KodiObj, tv_shows: List[dict], workers: int = 1,
+                         failed: List[Tuple[str, int]] = None) -> Iterator[List[dict]]:
+    """
+    Yield the episodes of each season of all shows, in show/season order, retrieved with up to
+    'workers' concurrent requests.  Only a window of seasons is requested ahead of the season
+    being consumed, so memory does not grow with the library.  Failed seasons are reported per
+    show (and added to failed as (show, season), they are yielded as empty seasons).
+    """
+    workers = max(1, workers)
+    seasons = ( (tvshow, season) for tvshow in tv_shows for season in range(1, tvshow['season']+1) )
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        def request_next():
+            tvshow, season = next(seasons, (None, None))
+            if tvshow is not None:
+                pending.append((tvshow, season, executor.submit(_get_season_episodes, kodi, tvshow['label'], tvshow['tvshowid'], season)))
+
+        for _ in range(SEASON_WINDOW * workers):
+            request_next()
+        current_show = None
+        failed_seasons = []
+        while pending:
+            tvshow, season, future = pending.popleft()
+            request_next()
+            if tvshow is not current_show:
+                _report_failed_seasons(current_show, failed_seasons)
+                current_show, failed_seasons = tvshow, []
+            try:
+                success, season_episodes = future.result()
+            except Exception as ex:
+                LOGGER.debug(repr(ex))
+                success, season_episodes = False, []
+            if not success:
+                failed_seasons.append(season)
+                if failed is not None:
+                    failed.append((tvshow['label'], season))
+            yield season_episodes
+        _report_failed_seasons(current_show, failed_seasons)
+
+def _report_failed_seasons(tvshow: dict, failed_seasons: List[int]):
+    if failed_seasons:
+        LOGGER.error(f'{tvshow["label"]}: unable to retrieve season(s) {", ".join(str(x) for x in failed_seasons)}')
+
+def get_all_tv_show_episodes(kodi: KodiObj, tv_shows: List[dict], workers: int = 1) -> List[dict]:
+    """Retrieve episodes for all seasons of all shows (show/season order), see iter_season_episodes()"""
+    return list(itertools.chain.from_iterable(iter_season_episodes(kodi, tv_shows, workers)))
+
+def get_all_episodes_paged(kodi: KodiObj, tv_shows: List[dict], page_size: int = EPISODE_PAGE_SIZE) -> List[dict]:
+    """
+    Retrieve every library episode with paged GetEpisodes calls (no tvshowid), show names are
+    joined locally from the tv_shows list.  Episodes are returned in show/season/episode order.
+    """
+    show_names = { show['tvshowid']: show['label'] for show in tv_shows }
+    show_order = { show['tvshowid']: idx for idx, show in enumerate(tv_shows) }
+    properties = KodiCommand.TVSHOW_EPISODE_OPTIONS + ['tvshowid']
+    episodes = list()
+    start = 0
+    total = None
+    while total is None or start < total:
+        LOGGER.info(f'- Retrieving episodes {start}..{start+page_size}...')
+        cmd = KodiCommand('VideoLibrary', 'GetEpisodes', {'properties': properties, 'limits': {'start': start, 'end': start+page_size}})
+        for episode in kodi.stream_results(cmd.namespace, cmd.method, cmd.parms):
+            tvshow_id = episode.pop('tvshowid', None)
+            # Match per-season retrieval, specials (season 0) and shows without episodes are excluded
+            if tvshow_id in show_names and episode.get('season', 0) > 0:
+                entry:dict = {"show_name": show_names[tvshow_id]}
+                entry.update(episode)
+                entry['_order'] = show_order[tvshow_id]
+                episodes.append(entry)
+        if kodi.response_status_code != 0:
+            LOGGER.error(f'  ERROR: {kodi.response_status_code} - {kodi.response_text}')
+            break
+        total = kodi.response_json['result']['limits']['total']
+        start += page_size
+
+    episodes.sort(key=lambda x: (x.pop('_order'), x.get('season', 0), x.get('episode', 0)))
+    LOGGER.trace(f'  {len(episodes)} loaded.')
     return episodes
 
-def get_movies(kodi: KodiObj) -> list:
+def plan_episode_queries(tv_shows: List[dict], page_size: int = EPISODE_PAGE_SIZE) -> str:
+    """Return 'bulk' or 'season', whichever retrieval plan needs the fewest round trips"""
+    season_calls = sum(show['season'] for show in tv_shows)
+    bulk_calls = math.ceil(sum(show['episode'] for show in tv_shows) / max(1, page_size))
+    plan = 'bulk' if bulk_calls <= season_calls else 'season'
+    LOGGER.debug(f'Episode query plan: {plan}  (season calls: {season_calls}, bulk calls: {bulk_calls})')
+    return plan
+
+def iter_movies(kodi: KodiObj) -> Iterator[dict]:
+    """Yield the library movies as they are parsed from the response"""
     LOGGER.info('Retrieve Movies...')
-    movies = []
-    cmd = KodiCommand('VideoLibrary', 'GetMovies', {'properties': KodiCommand.MOVIE_OPTIONS})
-    if not _call_kodi(kodi, cmd):
+    yield from _iter_library(kodi, KodiCommand('VideoLibrary', 'GetMovies', {'properties': KodiCommand.MOVIE_OPTIONS}), 'movies')
+
+def iter_songs(kodi: KodiObj) -> Iterator[dict]:
+    """Yield the library songs as they are parsed from the response"""
+    LOGGER.info('Retrieve Songs...')
+    yield from _iter_library(kodi, KodiCommand('AudioLibrary', 'GetSongs', {'properties': KodiCommand.SONG_OPTIONS}), 'songs')
+
+def _iter_library(kodi: KodiObj, cmd: KodiCommand, list_key: str) -> Iterator[dict]:
+    count = 0
+    if kodi.check_command(cmd.namespace, cmd.method, cmd.parms):
+        for item in kodi.stream_results(cmd.namespace, cmd.method, cmd.parms):
+            count += 1
+            yield item
+    if kodi.response_status_code != 0:
         LOGGER.error(f'ERROR: {kodi.response_status_code} - {kodi.response_text}')
     else:
-        r_json = json.loads(kodi.response_text)
-        for movie in r_json['result']['movies']:
-            movies.append(movie)
-        LOGGER.info(f'  Returned movies: {len(movies)}')
-
-    return movies
-
-def create_csv(file_nm: str, entries: list) -> bool:
-    header_list = [x for x in entries[0].keys()]
-    header_line = ','.join(header_list)
-    with pathlib.Path(file_nm).open('w', encoding='UTF-8') as csv_out:
-        csv_out.write(f'{header_line}\n')
-        for entry in entries:
-            detail_list = list()
-            for v in entry.values():
-                if util.is_integer(v):
-                    detail_list.append(str(v))
-                elif isinstance(v, dict):
-                    v = ','.join(v.values())
-                    detail_list.append(f'"{v}"')
-                elif isinstance(v, list):
-                    v = ','.join(v)
-                    detail_list.append(f'"{v}"')
-                else:
-                    v = v.replace('"', "'")
-                    detail_list.append(f'"{v}"')
-            detail_line = ",".join(detail_list)
-            csv_out.write(f'{detail_line}\n')
+        LOGGER.info(f'  Returned {list_key}: {count}')
 
-def initialize_loggers():
-    log_filename = pathlib.Path(cfg.logging_filename) # pathlib.Path('./logs/da-photo.log')
+def get_movies(kodi: KodiObj) -> list:
+    return list(iter_movies(kodi))
+
+def get_songs(kodi: KodiObj) -> list:
+    return list(iter_songs(kodi))
+
+def mirror_episodes(episodes: Iterable[dict], tv_shows: List[dict]) -> Iterator[dict]:
+    """Episodes with their tvshowid (the csv only carries show_name)"""
+    show_ids = { show['label']: show['tvshowid'] for show in tv_shows }
+    return ( dict(episode, tvshowid=show_ids.get(episode['show_name'])) for episode in episodes )
+
+class _RetrievalFailed(Exception):
+    """Raised to the consumers of an export when the entries were not all retrieved"""
 
+
+def create_csv(file_nm: str, entries: Iterable[dict]) -> int:
+    """Write entries to file_nm, returns the number of records written"""
+    count, _ = export_csv(file_nm, entries)
+    return count
+
+def export_csv(file_nm: str, entries: Iterable[dict], mirror_write: Callable[[Iterable[dict]], Any] = None,
+               watermark_key: str = None, failed: Callable[[], bool] = None) -> Tuple[Optional[int], Optional[store.Watermarks]]:
+    """
+    Write entries to file_nm as they are produced (consumer of the retrieval pipeline).
+
+    Entries are passed on to mirror_write (the sqlite mirror) as they are written, and the
+    watermarks of the entries (delta snapshot, id watermark_key) are collected on the way, so
+    no list of all entries is needed.  Returns the number of records and the watermarks, when
+    there are no entries neither the file nor the mirror is written.
+
+    failed() is checked once the entries are consumed, if the retrieval failed part way the
+    partial file is discarded, the mirror write is rolled back and (None, None) is returned.
+    """
+    watermarks = {} if watermark_key else None
+    entries = iter(entries)
+    first_entry = next(entries, None)
+    if first_entry is None:
+        # nothing retrieved (or failed), the csv file and the mirror are left as they are
+        return (None, None) if failed is not None and failed() else (0, watermarks)
+    entries = itertools.chain([first_entry], entries)
+    try:
+        with store.CsvWriter(file_nm) as writer:
+            def written() -> Iterator[dict]:
+                for entry in entries:
+                    writer.write(entry)
+                    if watermarks is not None:
+                        watermarks[str(entry[watermark_key])] = store.watermark(entry)
+                    yield entry
+                if failed is not None and failed():
+                    # raised through mirror_write (transaction rolled back) and the writer (file discarded)
+                    raise _RetrievalFailed(file_nm)
+
+            records = written()
+            if mirror_write is not None:
+                mirror_write(records)
+            for _ in records:
+                pass
+    except _RetrievalFailed:
+        LOGGER.error(f'Retrieval failed, {file_nm} (and the library mirror) left as they were')
+        return None, None
+    return writer.count, watermarks
+
+# === Delta sync ==========================================================================
+def get_watermarks(kodi: KodiObj, cmd: KodiCommand, list_key: str, id_key: str, include=None) -> store.Watermarks:
+    """Retrieve dateadded/lastplayed/playcount of every item (small response, no details)"""
+    LOGGER.info(f'- Retrieving {list_key} watermarks...')
+    items = [ item for item in kodi.stream_results(cmd.namespace, cmd.method, cmd.parms) if include is None or include(item) ]
+    if kodi.response_status_code != 0:
+        LOGGER.error(f'  ERROR: {kodi.response_status_code} - {kodi.response_text}')
+        return None
+    return store.make_watermarks(items, id_key)
+
+def get_item_details(kodi: KodiObj, new_ids: List[str], changed_ids: List[str], recent_cmd: KodiCommand, detail_method: str,
+                     list_key: str, id_key: str, properties: List[str], batch_size: int = 20) -> Dict[str, dict]:
+    """
+    Retrieve full details of new/changed items.  New items are usually the most recently added,
+    they are taken from one recently-added call, the rest are retrieved with batched
+    Get*Details calls.
+    """
+    details = {}
+    if new_ids:
+        recent_cmd.parms['limits'] = {'start': 0, 'end': len(new_ids)}
+        if _call_kodi(kodi, recent_cmd):
+            for item in kodi.response_json.get('result', {}).get(list_key, []):
+                if str(item[id_key]) in new_ids:
+                    details[str(item[id_key])] = item
+    remaining = [ item_id for item_id in new_ids + changed_ids if item_id not in details ]
+    if remaining:
+        LOGGER.info(f'- Retrieving details for {len(remaining)} {list_key}...')
+        commands = [ ('VideoLibrary', detail_method, {id_key: int(item_id), 'properties': properties}) for item_id in remaining ]
+        detail_key = f'{list_key[:-1]}details'
+        for item_id, resp in zip(remaining, kodi.send_batch(commands, batch_size)):
+            if 'error' in resp:
+                LOGGER.error(f'  {detail_method}({item_id}): {resp["error"]}')
+            else:
+                details[item_id] = resp['result'][detail_key]
+    return details
+
+def sync_movies_delta(kodi: KodiObj, snapshot: dict, mirror: LibraryMirror = None) -> bool:
+    """Update MOVIE_FILE with movies added/changed/removed since the snapshot"""
+    cmd = KodiCommand('VideoLibrary', 'GetMovies', {'properties': store.WATERMARK_PROPERTIES})
+    current = get_watermarks(kodi, cmd, 'movies', 'movieid')
+    if current is None:
+        return False
+    new_ids, changed_ids, removed_ids = store.diff_watermarks(snapshot['movies'], current)
+    LOGGER.info(f'  Movies new: {len(new_ids)}  changed: {len(changed_ids)}  removed: {len(removed_ids)}')
+    recent_cmd = KodiCommand('VideoLibrary', 'GetRecentlyAddedMovies', {'properties': KodiCommand.MOVIE_OPTIONS})
+    updates = get_item_details(kodi, sorted(new_ids), sorted(changed_ids), recent_cmd, 'GetMovieDetails', 'movies', 'movieid', KodiCommand.MOVIE_OPTIONS)
+    if not store.patch_csv(MOVIE_FILE, 'movieid', updates, removed_ids):
+        return False
+    if mirror is not None:
+        mirror.write_items('movies', updates.values(), kodi._host, replace=False)
+        mirror.delete_items('movies', removed_ids)
+    snapshot['movies'] = store.carry_forward(snapshot['movies'], current, new_ids, changed_ids, updates.keys())
+    LOGGER.success(f'{len(updates)} movies updated, {len(removed_ids)} removed in {MOVIE_FILE}')
+    return True
+
+def _episode_filter(tv_shows: List[dict]):
+    # Same selection as full retrieval, specials (season 0) and shows without episodes are excluded
+    show_ids = { show['tvshowid'] for show in tv_shows }
+    return lambda episode: episode.get('tvshowid') in show_ids and episode.get('season', 0) > 0
+
+def get_episode_watermarks(kodi: KodiObj, tv_shows: List[dict]) -> store.Watermarks:
+    cmd = KodiCommand('VideoLibrary', 'GetEpisodes', {'properties': store.WATERMARK_PROPERTIES + ['tvshowid', 'season']})
+    return get_watermarks(kodi, cmd, 'episodes', 'episodeid', _episode_filter(tv_shows))
+
+def sync_episodes_delta(kodi: KodiObj, tv_shows: List[dict], snapshot: dict, mirror: LibraryMirror = None) -> bool:
+    """Update EPISODE_FILE with episodes added/changed/removed since the snapshot"""
+    current = get_episode_watermarks(kodi, tv_shows)
+    if current is None:
+        return False
+    new_ids, changed_ids, removed_ids = store.diff_watermarks(snapshot['episodes'], current)
+    LOGGER.info(f'  Episodes new: {len(new_ids)}  changed: {len(changed_ids)}  removed: {len(removed_ids)}')
+    properties = KodiCommand.TVSHOW_EPISODE_OPTIONS + ['tvshowid']
+    recent_cmd = KodiCommand('VideoLibrary', 'GetRecentlyAddedEpisodes', {'properties': properties})
+    details = get_item_details(kodi, sorted(new_ids), sorted(changed_ids), recent_cmd, 'GetEpisodeDetails', 'episodes', 'episodeid', properties)
+    show_names = { show['tvshowid']: show['label'] for show in tv_shows }
+    updates = {}
+    for item_id, episode in details.items():
+        entry:dict = {"show_name": show_names.get(episode.pop('tvshowid', None), '')}
+        entry.update(episode)
+        updates[item_id] = entry
+    if not store.patch_csv(EPISODE_FILE, 'episodeid', updates, removed_ids, group_key='show_name'):
+        return False
+    if mirror is not None:
+        mirror.write_items('tvshows', tv_shows, kodi._host)
+        mirror.write_items('episodes', mirror_episodes(updates.values(), tv_shows), kodi._host, replace=False)
+        mirror.delete_items('episodes', removed_ids)
+    snapshot['episodes'] = store.carry_forward(snapshot['episodes'], current, new_ids, changed_ids, updates.keys())
+    LOGGER.success(f'{len(updates)} episodes updated, {len(removed_ids)} removed in {EPISODE_FILE}')
+    return True
+
+def initialize_loggers():
     if cfg.logging_level.upper() == 'INFO':
         console_format = cfg.DEFAULT_CONSOLE_LOGFMT
     else:
@@ -111,6 +348,7 @@ def initialize_loggers():
     c_handle = cfg.configure_logger(log_format=console_format, log_level=cfg.logging_level)
     f_handle = -1
     if cfg.logging_enabled:
+        log_filename = pathlib.Path(cfg.logging_filename) # pathlib.Path('./logs/da-photo.log')
         f_handle = cfg.configure_logger(log_filename, log_format=cfg.DEFAULT_FILE_LOGFMT, log_level=cfg.logging_level,
                                        rotation=cfg.logging_rotation, retention=cfg.logging_retention)
         
@@ -150,38 +388,102 @@ def main():
         ''')
     parser.add_argument("-H","--host", type=str, default=cfg.host, help="Kodi hostname")
     parser.add_argument("-P","--port", type=int, default=cfg.port,help="Kodi RPC listen port")
+    parser.add_argument("--pool-size", type=int, default=cfg.pool_size,help="Max keep-alive connections per host")
+    parser.add_argument("-T","--transport", type=str, choices=['http','tcp'], default=cfg.transport, help="Kodi RPC transport, tcp pipelines worker requests on one socket")
+    parser.add_argument("--tcp-port", type=int, default=cfg.tcp_port, help="Kodi RPC tcp port (tcp transport)")
     parser.add_argument("-u","--kodi-user", type=str, default=cfg.kodi_user,help="Kodi authenticaetion username")
     parser.add_argument("-p","--kodi_pw", type=str, default=cfg.kodi_pw,help="Kodi autentication password")
     parser.add_argument('-t',"--tv-shows", action='store_true')
     parser.add_argument('-m',"--movies", action='store_true')
+    parser.add_argument('-s',"--songs", action='store_true')
+    parser.add_argument('-w',"--workers", type=int, default=1, help="Number of concurrent episode requests")
+    parser.add_argument("--plan", choices=['auto','bulk','season'], default='auto', help="Episode retrieval: paged bulk export or per show/season (auto picks fewest calls)")
+    parser.add_argument("--page-size", type=int, default=EPISODE_PAGE_SIZE, help="Episodes per page for bulk retrieval")
+    parser.add_argument("-d","--delta", action='store_true', help=f"Only retrieve items added/changed since the last delta run ({store.SNAPSHOT_FILE}), patch the csv files")
+    parser.add_argument("--sqlite", type=str, nargs='?', const=cfg.library_db, default=None, metavar='FILE',
+                        help=f"Also write the library to an indexed sqlite mirror for kodi-cli query (default {cfg.library_db})")
+    parser.add_argument("--stats", action="store_true", help="Print timing/size statistics of the requests sent (stderr)")
+    parser.add_argument("--metrics-file", type=str, default=cfg.metrics_file, help="Append per-request metrics (ndjson) to this file")
     parser.add_argument("-v","--verbose", action='count', help="Verbose output, -v = INFO, -vv = DEBUG, -vvv TRACE")
     
     args = parser.parse_args()
     apply_overrides(args)
     initialize_loggers()  # Incase loggers got overridden
 
-    kodi = KodiObj(cfg.host)
+    # Pool must be at least as large as the worker count, or connections get discarded
+    port = cfg.tcp_port if cfg.transport == 'tcp' else cfg.port
+    metrics = MetricsRecorder(cfg.metrics_file or None, keep=args.stats) if args.stats or cfg.metrics_file else None
+    kodi = KodiObj(cfg.host, port, cfg.kodi_user, cfg.kodi_pw, pool_size=max(cfg.pool_size, args.workers), transport=cfg.transport,
+                   metrics=metrics, retry_policy=RetryPolicy.from_settings(cfg))
+
+    # Delta runs patch the csv files from the snapshot of the previous (delta) run, the first run is a full sync
+    snapshot = store.load_snapshot(cfg.host) if args.delta else None
+    # A mirror table is only patched by a delta run if it holds a full sync of this host
+    mirror = LibraryMirror(args.sqlite) if args.sqlite else None
 
     # TODO: set options for watched, unwatched, all (default)
     if args.tv_shows:
         LOGGER.info('='*40)
-        episodes = list()
         tv_shows = get_tv_shows(kodi)
-        for tvshow in tv_shows:
-            show_name = tvshow['label']
-            for season in range(1,tvshow['season']):
-                season_episodes = get_tv_show_episodes(kodi, tvshow['label'], tvshow['tvshowid'], season )
-                if len(season_episodes) > 0:
-                    episodes.extend(season_episodes)
-            
-        create_csv(EPISODE_FILE, episodes)
-        LOGGER.success(f'{len(episodes)} episodes loaded into {EPISODE_FILE}')
+        mirror_current = mirror is None or mirror.synced('episodes', cfg.host)
+        if snapshot and snapshot['episodes'] is not None and mirror_current and sync_episodes_delta(kodi, tv_shows, snapshot, mirror):
+            pass
+        else:
+            plan = args.plan
+            if plan == 'auto':
+                plan = plan_episode_queries(tv_shows, args.page_size)
+            if plan == 'bulk':
+                # sorted into show/season order, the whole list is held
+                episodes = get_all_episodes_paged(kodi, tv_shows, args.page_size)
+                failed = lambda: kodi.response_status_code != 0
+            else:
+                # one season in memory at a time
+                failed_seasons = []
+                episodes = itertools.chain.from_iterable(iter_season_episodes(kodi, tv_shows, args.workers, failed_seasons))
+                failed = lambda: bool(failed_seasons)
+
+            mirror_write = None
+            if mirror is not None:
+                mirror.write_items('tvshows', tv_shows, cfg.host)
+                mirror_write = lambda records: mirror.write_items('episodes', mirror_episodes(records, tv_shows), cfg.host)
+            count, _ = export_csv(EPISODE_FILE, episodes, mirror_write, failed=failed)
+            if count is not None:
+                LOGGER.success(f'{count} episodes loaded into {EPISODE_FILE}')
+                if snapshot is not None:
+                    snapshot['episodes'] = get_episode_watermarks(kodi, tv_shows)
 
     if args.movies:
         LOGGER.info('='*40)
-        movies = get_movies(kodi)
-        create_csv(MOVIE_FILE, movies)
-        LOGGER.success(f'{len(movies)} movies loaded into {MOVIE_FILE}')
+        mirror_current = mirror is None or mirror.synced('movies', cfg.host)
+        if snapshot and snapshot['movies'] is not None and mirror_current and sync_movies_delta(kodi, snapshot, mirror):
+            pass
+        else:
+            mirror_write = (lambda records: mirror.write_items('movies', records, cfg.host)) if mirror is not None else None
+            count, watermarks = export_csv(MOVIE_FILE, iter_movies(kodi), mirror_write, 'movieid',
+                                           failed=lambda: kodi.response_status_code != 0)
+            if count is not None:
+                LOGGER.success(f'{count} movies loaded into {MOVIE_FILE}')
+                if snapshot is not None:
+                    snapshot['movies'] = watermarks
+
+    if args.songs:
+        LOGGER.info('='*40)
+        mirror_write = (lambda records: mirror.write_items('songs', records, cfg.host)) if mirror is not None else None
+        count, _ = export_csv(SONG_FILE, iter_songs(kodi), mirror_write, failed=lambda: kodi.response_status_code != 0)
+        if count:
+            LOGGER.success(f'{count} songs loaded into {SONG_FILE}')
+
+    if snapshot is not None:
+        store.save_snapshot(snapshot)
+    if mirror is not None:
+        LOGGER.success(f'Library mirror updated: {args.sqlite}')
+        mirror.close()
+
+    kodi.close()
+    if metrics is not None:
+        metrics.close()
+        if args.stats:
+            metrics.print_summary()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
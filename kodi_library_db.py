@@ -0,0 +1,278 @@
+"""
+Local SQLite mirror of the Kodi library.
+
+kodi_libraray_inventory --sqlite writes movies, tv shows, episodes and songs into indexed
+tables (the full Kodi entry is kept as json in the data column), titles and plots are
+full-text indexed.  kodi-cli query answers common questions from the mirror without
+contacting the Kodi host.
+"""
+import pathlib
+import sqlite3
+import time
+from typing import Dict, Iterable, List, Tuple
+
+from kodi_logger import LOGGER
+import kodi_json
+
+DEFAULT_LIBRARY_DB = '~/.kodi_cli/library.sqlite'
+SCHEMA_VERSION = 1
+
+# table -> (id column, [(column, entry key)], indexes)
+_TABLES = {
+    'movies': ('movieid', [('title', 'title'), ('year', 'year'), ('genre', 'genre'), ('rating', 'rating'), ('mpaa', 'mpaa'),
+                           ('runtime', 'runtime'), ('playcount', 'playcount'), ('lastplayed', 'lastplayed'),
+                           ('dateadded', 'dateadded'), ('plot', 'plot')],
+               ['year', 'playcount', 'dateadded']),
+    'tvshows': ('tvshowid', [('title', 'label'), ('season', 'season'), ('episode', 'episode'), ('watchedepisodes', 'watchedepisodes')],
+                []),
+    'episodes': ('episodeid', [('tvshowid', 'tvshowid'), ('show_name', 'show_name'), ('season', 'season'), ('episode', 'episode'),
+                               ('title', 'title'), ('firstaired', 'firstaired'), ('rating', 'rating'), ('runtime', 'runtime'),
+                               ('playcount', 'playcount'), ('dateadded', 'dateadded'), ('plot', 'plot')],
+                 ['tvshowid, season, episode', 'show_name', 'playcount', 'dateadded']),
+    'songs': ('songid', [('title', 'title'), ('artist', 'artist'), ('album', 'album'), ('genre', 'genre'), ('year', 'year'),
+                         ('track', 'track'), ('duration', 'duration'), ('playcount', 'playcount'), ('lastplayed', 'lastplayed'),
+                         ('dateadded', 'dateadded')],
+              ['artist', 'album', 'year', 'dateadded']),
+}
+# List values (genre, artist) are also stored one row per value for indexed lookups
+_LIST_TABLES = {'movies': ('movie_genres', 'genre'), 'songs': ('song_artists', 'artist')}
+_FTS_COLUMNS = {'movies': ('title', 'plot'), 'episodes': ('title', 'plot'), 'songs': ('title', 'album'), 'tvshows': ('label', None)}
+
+
+def _column_value(value):
+    if isinstance(value, list):
+        return ', '.join(str(x) for x in value)
+    if isinstance(value, dict):
+        return kodi_json.dumps(value)
+    return value
+
+
+class LibraryMirror():
+    def __init__(self, db_file: str = DEFAULT_LIBRARY_DB, read_only: bool = False):
+        self._db_file = pathlib.Path(db_file).expanduser()
+        self._read_only = read_only
+        self._db: sqlite3.Connection = None
+
+    @property
+    def exists(self) -> bool:
+        return self._db_file.exists()
+
+    def connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            if self._read_only:
+                self._db = sqlite3.connect(f'file:{self._db_file}?mode=ro', uri=True)
+            else:
+                self._db_file.parent.mkdir(parents=True, exist_ok=True)
+                self._db = sqlite3.connect(str(self._db_file))
+                self._create_schema()
+            self._db.row_factory = sqlite3.Row
+        return self._db
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    # -- Writing ---------------------------------------------------------------------------------
+    def write_items(self, table: str, items: Iterable[dict], host: str, replace: bool = True) -> int:
+        """Store library entries in table, replacing the table contents (or upserting entries)"""
+        db = self.connect()
+        id_col, columns, _ = _TABLES[table]
+        col_names = [ col for col, _ in columns ]
+        insert_sql = (f'INSERT OR REPLACE INTO {table} ({id_col}, {", ".join(col_names)}, data) '
+                      f'VALUES ({", ".join(["?"] * (len(col_names) + 2))})')
+        count = 0
+        with db:
+            if replace:
+                self._delete(table, None)
+            for item in items:
+                item_id = item[id_col]
+                if not replace:
+                    self._delete(table, [item_id])
+                values = [item_id] + [ _column_value(item.get(key)) for _, key in columns ] + [kodi_json.dumps(item)]
+                db.execute(insert_sql, values)
+                self._write_list_values(table, item_id, item)
+                self._write_fts(table, item_id, item)
+                count += 1
+            db.execute('INSERT OR REPLACE INTO sync_info (tbl, host, synced) VALUES (?, ?, ?)',
+                       (table, host, time.strftime('%Y-%m-%d %H:%M:%S')))
+        LOGGER.debug(f'  {count} {table} written to {self._db_file}')
+        return count
+
+    def synced(self, table: str, host: str) -> bool:
+        """True if table holds a full sync of host (a delta run can then update it)"""
+        row = self.connect().execute('SELECT host FROM sync_info WHERE tbl = ?', (table,)).fetchone()
+        return row is not None and row[0] == host
+
+    def delete_items(self, table: str, item_ids: Iterable):
+        with self.connect():
+            self._delete(table, list(item_ids))
+
+    # -- Querying --------------------------------------------------------------------------------
+    def query(self, sql: str, params: Iterable = ()) -> List[dict]:
+        return [ dict(row) for row in self.connect().execute(sql, tuple(params)) ]
+
+    def search(self, text: str, limit: int = 50) -> List[dict]:
+        """Full-text search over titles and plots, best matches first"""
+        if self._has_fts():
+            sql = ("SELECT kind, item_id, title, snippet(library_fts, 3, '[', ']', '...', 12) AS match "
+                   "FROM library_fts WHERE library_fts MATCH ? ORDER BY rank LIMIT ?")
+            return self.query(sql, (text, limit))
+        sql = ('SELECT kind, item_id, title, substr(plot, 1, 80) AS match FROM library_fts '
+               'WHERE title LIKE ? OR plot LIKE ? LIMIT ?')
+        return self.query(sql, (f'%{text}%', f'%{text}%', limit))
+
+    # -- Internals -------------------------------------------------------------------------------
+    def _has_fts(self) -> bool:
+        row = self.connect().execute("SELECT sql FROM sqlite_master WHERE name = 'library_fts'").fetchone()
+        return row is not None and 'fts5' in row[0].lower()
+
+    def _create_schema(self):
+        db = self._db
+        with db:
+            db.execute('CREATE TABLE IF NOT EXISTS sync_info (tbl TEXT PRIMARY KEY, host TEXT, synced TEXT)')
+            for table, (id_col, columns, indexes) in _TABLES.items():
+                col_defs = ', '.join(f'{col}' for col, _ in columns)
+                db.execute(f'CREATE TABLE IF NOT EXISTS {table} ({id_col} INTEGER PRIMARY KEY, {col_defs}, data TEXT)')
+                for index_cols in indexes:
+                    index_name = f'{table}_{index_cols.split(",")[0].strip()}'
+                    db.execute(f'CREATE INDEX IF NOT EXISTS {index_name} ON {table} ({index_cols})')
+            for table, (list_table, col) in _LIST_TABLES.items():
+                id_col = _TABLES[table][0]
+                db.execute(f'CREATE TABLE IF NOT EXISTS {list_table} ({id_col} INTEGER, {col} TEXT)')
+                db.execute(f'CREATE INDEX IF NOT EXISTS {list_table}_{col} ON {list_table} ({col} COLLATE NOCASE)')
+                db.execute(f'CREATE INDEX IF NOT EXISTS {list_table}_{id_col} ON {list_table} ({id_col})')
+            try:
+                db.execute('CREATE VIRTUAL TABLE IF NOT EXISTS library_fts USING fts5(kind UNINDEXED, item_id UNINDEXED, title, plot)')
+            except sqlite3.OperationalError as oe:
+                # sqlite built without fts5, search falls back to LIKE matching
+                LOGGER.debug(f'  Full-text index disabled: {repr(oe)}')
+                db.execute('CREATE TABLE IF NOT EXISTS library_fts (kind TEXT, item_id INTEGER, title TEXT, plot TEXT)')
+
+    def _delete(self, table: str, item_ids: List):
+        db = self._db
+        id_col = _TABLES[table][0]
+        list_table = _LIST_TABLES.get(table, (None, None))[0]
+        if item_ids is None:
+            db.execute(f'DELETE FROM {table}')
+            if list_table:
+                db.execute(f'DELETE FROM {list_table}')
+            db.execute('DELETE FROM library_fts WHERE kind = ?', (table,))
+            return
+        for item_id in item_ids:
+            db.execute(f'DELETE FROM {table} WHERE {id_col} = ?', (item_id,))
+            if list_table:
+                db.execute(f'DELETE FROM {list_table} WHERE {id_col} = ?', (item_id,))
+            db.execute('DELETE FROM library_fts WHERE kind = ? AND item_id = ?', (table, item_id))
+
+    def _write_list_values(self, table: str, item_id: int, item: dict):
+        if table not in _LIST_TABLES:
+            return
+        list_table, key = _LIST_TABLES[table]
+        values = item.get(key) or []
+        if not isinstance(values, list):
+            values = [ x.strip() for x in str(values).split(',') ]
+        id_col = _TABLES[table][0]
+        self._db.executemany(f'INSERT INTO {list_table} ({id_col}, {key}) VALUES (?, ?)', [ (item_id, value) for value in values if value ])
+
+    def _write_fts(self, table: str, item_id: int, item: dict):
+        title_key, text_key = _FTS_COLUMNS[table]
+        title = item.get(title_key) or item.get('label', '')
+        text = item.get(text_key, '') if text_key else ''
+        self._db.execute('INSERT INTO library_fts (kind, item_id, title, plot) VALUES (?, ?, ?, ?)', (table, item_id, title, text))
+
+
+# == Queries (kodi-cli query) =======================================================================
+def _unwatched(mirror: LibraryMirror, args: Dict[str, str]) -> Tuple[str, List[dict]]:
+    if 'show' in args:
+        sql = ('SELECT show_name, season, episode, title, firstaired FROM episodes '
+               'WHERE playcount = 0 AND show_name LIKE ? ORDER BY season, episode')
+        return 'episodes', mirror.query(sql, (f'%{args["show"]}%',))
+    sql = ('SELECT show_name, COUNT(*) AS unwatched, MIN(season) AS first_season FROM episodes '
+           'WHERE playcount = 0 GROUP BY tvshowid, show_name ORDER BY show_name')
+    return 'tvshows', mirror.query(sql)
+
+def _movies(mirror: LibraryMirror, args: Dict[str, str]) -> Tuple[str, List[dict]]:
+    where = []
+    params = []
+    if 'genre' in args:
+        where.append('movieid IN (SELECT movieid FROM movie_genres WHERE genre = ? COLLATE NOCASE)')
+        params.append(args['genre'])
+    if 'year' in args:
+        if '-' in args['year']:
+            first, last = args['year'].split('-', 1)
+            where.append('year BETWEEN ? AND ?')
+            params.extend([int(first), int(last)])
+        else:
+            where.append('year = ?')
+            params.append(int(args['year']))
+    if 'unwatched' in args:
+        where.append('playcount = 0')
+    where_sql = f'WHERE {" AND ".join(where)} ' if where else ''
+    sql = f'SELECT movieid, title, year, genre, rating, runtime, playcount FROM movies {where_sql}ORDER BY year, title'
+    return 'movies', mirror.query(sql, params)
+
+def _recent(mirror: LibraryMirror, args: Dict[str, str]) -> Tuple[str, List[dict]]:
+    limit = int(args.get('limit', 25))
+    sql = ('SELECT * FROM (SELECT \'movie\' AS kind, title, NULL AS show_name, dateadded FROM movies '
+           'UNION ALL SELECT \'episode\', title, show_name, dateadded FROM episodes) ORDER BY dateadded DESC LIMIT ?')
+    return 'items', mirror.query(sql, (limit,))
+
+def _artist(mirror: LibraryMirror, args: Dict[str, str]) -> Tuple[str, List[dict]]:
+    sql = ('SELECT songid, artist, album, track, title, year FROM songs WHERE songid IN '
+           '(SELECT songid FROM song_artists WHERE artist = ? COLLATE NOCASE) ORDER BY album, track')
+    return 'songs', mirror.query(sql, (args.get('name', ''),))
+
+def _search(mirror: LibraryMirror, args: Dict[str, str]) -> Tuple[str, List[dict]]:
+    return 'matches', mirror.search(args.get('text', ''), int(args.get('limit', 50)))
+
+def _stats(mirror: LibraryMirror, args: Dict[str, str]) -> Tuple[str, List[dict]]:
+    rows = []
+    for table in _TABLES.keys():
+        count = mirror.query(f'SELECT COUNT(*) AS count FROM {table}')[0]['count']
+        info = mirror.query('SELECT host, synced FROM sync_info WHERE tbl = ?', (table,))
+        rows.append({'table': table, 'count': count, 'host': info[0]['host'] if info else None, 'synced': info[0]['synced'] if info else None})
+    return 'tables', rows
+
+def _sql(mirror: LibraryMirror, args: Dict[str, str]) -> Tuple[str, List[dict]]:
+    return 'rows', mirror.query(args.get('text', ''))
+
+# name -> (function, positional argument name, description)
+QUERIES = {
+    'unwatched': (_unwatched, 'show',  'Unwatched episode count per show, or the unwatched episodes of show=<name>'),
+    'movies':    (_movies,    None,    'Movies, filter with genre=<genre> year=<yyyy|yyyy-yyyy> unwatched'),
+    'recent':    (_recent,    'limit', 'Most recently added movies and episodes (limit=25)'),
+    'artist':    (_artist,    'name',  'Songs of an artist'),
+    'search':    (_search,    'text',  'Full-text search of titles and plots (fts5 syntax, i.e. "space station" OR mars)'),
+    'stats':     (_stats,     None,    'Rows per table and time of last sync'),
+    'sql':       (_sql,       'text',  'Run a (read-only) SQL statement'),
+}
+
+def parse_query_args(tokens: List[str], positional: str) -> Dict[str, str]:
+    """key=value tokens, other tokens are joined into the positional argument (or used as flags)"""
+    args = {}
+    words = []
+    for token in tokens:
+        if '=' in token and not token.startswith('='):
+            key, value = token.split('=', 1)
+            args[key] = value
+        elif positional:
+            words.append(token)
+        else:
+            args[token] = True
+    if words:
+        args[positional] = ' '.join(words)
+    return args
+
+def run_query(db_file: str, name: str, tokens: List[str]) -> Tuple[str, List[dict]]:
+    """Run the named query against the mirror, returns (list name, rows)"""
+    if name not in QUERIES:
+        raise ValueError(f"Unknown query '{name}', valid queries: {', '.join(QUERIES.keys())}")
+    func, positional, _ = QUERIES[name]
+    mirror = LibraryMirror(db_file, read_only=True)
+    if not mirror.exists:
+        raise FileNotFoundError(f'{mirror._db_file} does not exist, create it with kodi_libraray_inventory --sqlite')
+    try:
+        return func(mirror, parse_query_args(tokens, positional))
+    finally:
+        mirror.close()
@@ -0,0 +1,226 @@
+"""
+Load generator for kodi-cli bench: drive JSON-RPC calls against a host from concurrent workers.
+
+Calls go through KodiObj.send_request() (parameter validation, payload building and the
+configured transport), so the numbers include the client path as well as the host.  A
+mix is a weighted list of methods (from methods.json), each worker picks the next call
+at random by weight.  A run ends after a duration or a total number of requests.
+
+    mix: Namespace.Method[:weight],...     i.e. JSONRPC.Ping:5,VideoLibrary.GetMovies:1
+         readonly                          every read-only method without required parameters
+         FILE.json                         [{"method": "VideoLibrary.GetMovies", "params": {...}, "weight": 2}, ...]
+"""
+import pathlib
+import random
+import threading
+import time
+from typing import Dict, List, Tuple
+
+from kodi_logger import LOGGER
+from kodi_interface import KodiObj
+import kodi_json
+from kodi_metrics import percentile
+
+BENCH_OPTIONS = {'workers': 4, 'duration': 10.0, 'requests': 0, 'warmup': 1, 'mix': None, 'report': None}
+
+
+class BenchCommand():
+    def __init__(self, namespace: str, method: str, params: dict = None, weight: float = 1.0):
+        self.namespace = namespace
+        self.method = method
+        self.params = params if params else {}
+        self.weight = weight
+
+    @property
+    def name(self) -> str:
+        return f'{self.namespace}.{self.method}'
+
+
+# == Mix ============================================================================================
+def parse_bench_options(tokens: List[str]) -> Tuple[dict, List[str]]:
+    """Split bench tokens into (options, command tokens), options are key=value tokens before the method"""
+    options = dict(BENCH_OPTIONS)
+    idx = 0
+    while idx < len(tokens) and '=' in tokens[idx]:
+        key, value = tokens[idx].split('=', 1)
+        if key not in BENCH_OPTIONS:
+            raise ValueError(f'Unknown bench option {key} (options: {", ".join(BENCH_OPTIONS.keys())})')
+        default = BENCH_OPTIONS[key]
+        try:
+            options[key] = type(default)(value) if default is not None else value
+        except ValueError:
+            raise ValueError(f'{key}: {value} is not a number') from None
+        idx += 1
+    if options['workers'] < 1:
+        raise ValueError('workers: at least 1 worker is required')
+    return options, tokens[idx:]
+
+def load_mix(kodi: KodiObj, spec: str) -> List[BenchCommand]:
+    """Return the commands of a mix spec (weights, readonly or a json file), checked against methods.json"""
+    if spec == 'readonly':
+        commands = []
+        for namespace in kodi.get_namespace_list():
+            for method, definition in kodi._namespaces[namespace].items():
+                required = [ p for p in definition.get('params', []) if p.get('required', False) ]
+                if kodi.is_cacheable(namespace, method) and not required and definition.get('description') != 'NOT IMPLEMENTED.':
+                    commands.append(BenchCommand(namespace, method))
+        return commands
+
+    if spec.endswith('.json'):
+        entries = kodi_json.loads(pathlib.Path(spec).expanduser().read_bytes())
+        if isinstance(entries, dict):
+            entries = [ {'method': name, 'weight': weight} for name, weight in entries.items() ]
+    else:
+        entries = []
+        for token in spec.split(','):
+            name, _, weight = token.partition(':')
+            entries.append({'method': name.strip(), 'weight': weight or 1})
+
+    commands = []
+    for entry in entries:
+        namespace, _, method = entry['method'].partition('.')
+        try:
+            weight = float(entry.get('weight', 1))
+        except ValueError:
+            raise ValueError(f'{entry["method"]}: weight {entry["weight"]} is not a number') from None
+        if not kodi.check_command(namespace, method, entry.get('params')):
+            raise ValueError(f'{entry["method"]}: {kodi.response_text}')
+        commands.append(BenchCommand(namespace, method, entry.get('params'), weight))
+    return commands
+
+
+# == Run ============================================================================================
+class _Sample():
+    __slots__ = ('name', 'elapsed', 'status_code', 'size')
+
+    def __init__(self, name: str, elapsed: float, status_code: int, size: int):
+        self.name = name
+        self.elapsed = elapsed
+        self.status_code = status_code
+        self.size = size
+
+def run_load(kodi: KodiObj, commands: List[BenchCommand], workers: int = 4, duration: float = 10.0,
+             requests: int = 0, warmup: int = 1) -> dict:
+    """
+    Send the commands from workers threads until duration seconds passed or requests calls were sent
+    (requests > 0), return the report (see summarize_samples).  Each worker first sends warmup
+    calls that are not recorded (connection setup).  Ctrl-C ends the run early.
+    """
+    weights = [ command.weight for command in commands ]
+    if not commands or sum(weights) <= 0:
+        raise ValueError('Bench mix has no methods with a weight above 0')
+    stop = threading.Event()
+    sent_lock = threading.Lock()
+    sent = [0]
+    worker_samples: List[List[_Sample]] = [ [] for _ in range(workers) ]
+
+    def next_request() -> bool:
+        if stop.is_set():
+            return False
+        if requests > 0:
+            with sent_lock:
+                if sent[0] >= requests:
+                    return False
+                sent[0] += 1
+        return True
+
+    def worker(samples: List[_Sample], seed: int):
+        rng = random.Random(seed)
+        try:
+            for _ in range(warmup):
+                command = rng.choices(commands, weights)[0]
+                kodi.send_request(command.namespace, command.method, command.params)
+        finally:
+            ready.wait()
+        while next_request():
+            command = rng.choices(commands, weights)[0]
+            start = time.perf_counter()
+            success = kodi.send_request(command.namespace, command.method, command.params)
+            elapsed = time.perf_counter() - start
+            status_code = kodi.response_status_code if success else (kodi.response_status_code or -1)
+            samples.append(_Sample(command.name, elapsed, status_code, len(kodi.response or '')))
+
+    LOGGER.info(f'Bench {len(commands)} method(s), {workers} workers, ' +
+                (f'{requests} requests' if requests > 0 else f'{duration} seconds'))
+    ready = threading.Barrier(workers + 1)  # all workers warmed up, the clock starts
+    threads = [ threading.Thread(target=worker, args=(worker_samples[idx], idx), daemon=True) for idx in range(workers) ]
+    for thread in threads:
+        thread.start()
+    ready.wait()
+    start = time.perf_counter()
+    deadline = start + duration if requests <= 0 else None
+    try:
+        for thread in threads:
+            while thread.is_alive():
+                if deadline and time.perf_counter() >= deadline:
+                    stop.set()
+                thread.join(0.05)
+    except KeyboardInterrupt:
+        LOGGER.warning('Bench interrupted, reporting requests sent so far')
+        stop.set()
+        for thread in threads:
+            thread.join()
+    elapsed = time.perf_counter() - start
+    samples = [ sample for samples in worker_samples for sample in samples ]
+    return summarize_samples(samples, elapsed, workers)
+
+def _stats(samples: List[_Sample], elapsed: float) -> dict:
+    times = [ sample.elapsed for sample in samples ]
+    sizes = [ sample.size for sample in samples ]
+    errors: Dict[str, int] = {}
+    for sample in samples:
+        if sample.status_code != 0:
+            errors[str(sample.status_code)] = errors.get(str(sample.status_code), 0) + 1
+    error_count = sum(errors.values())
+    return {
+        'requests': len(samples),
+        'rps': round(len(samples) / elapsed, 1) if elapsed else 0.0,
+        'errors': error_count,
+        'error_rate': round(error_count / len(samples), 4),
+        'error_codes': errors,
+        'mean_ms': round(sum(times) / len(times) * 1000, 3),
+        'p50_ms': round(percentile(times, 50) * 1000, 3),
+        'p95_ms': round(percentile(times, 95) * 1000, 3),
+        'p99_ms': round(percentile(times, 99) * 1000, 3),
+        'max_ms': round(max(times) * 1000, 3),
+        'mean_bytes': round(sum(sizes) / len(sizes)),
+        'max_bytes': max(sizes),
+        'total_bytes': sum(sizes),
+    }
+
+def summarize_samples(samples: List[_Sample], elapsed: float, workers: int) -> dict:
+    """{'elapsed', 'workers', 'total': stats, 'methods': {name: stats}} (stats: throughput, latency, errors, sizes)"""
+    report = {'elapsed': round(elapsed, 3), 'workers': workers, 'total': None, 'methods': {}}
+    if not samples:
+        return report
+    report['total'] = _stats(samples, elapsed)
+    by_method: Dict[str, List[_Sample]] = {}
+    for sample in samples:
+        by_method.setdefault(sample.name, []).append(sample)
+    for name in sorted(by_method.keys()):
+        report['methods'][name] = _stats(by_method[name], elapsed)
+    return report
+
+def report_rows(report: dict) -> List[dict]:
+    """One row per method (and the total), for csv output"""
+    rows = []
+    entries = list(report['methods'].items()) + ([('total', report['total'])] if report['total'] else [])
+    for name, stats in entries:
+        row = {'method': name}
+        row.update({ key: value for key, value in stats.items() if key != 'error_codes' })
+        row['error_codes'] = ','.join(f'{code}:{count}' for code, count in stats['error_codes'].items())
+        rows.append(row)
+    return rows
+
+def print_report(report: dict, host: str):
+    print(f'\nkodi-cli bench  host: {host}  workers: {report["workers"]}  elapsed: {report["elapsed"]} s\n')
+    print(f'  {"Method":40} {"requests":>9} {"req/s":>9} {"errors":>7} {"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9} {"avg bytes":>10}')
+    print(f"  {'—'*40} {'—'*9} {'—'*9} {'—'*7} {'—'*9} {'—'*9} {'—'*9} {'—'*10}")
+    for row in report_rows(report):
+        if row['method'] == 'total':
+            print(f"  {'—'*40} {'—'*9} {'—'*9} {'—'*7} {'—'*9} {'—'*9} {'—'*9} {'—'*10}")
+        print(f'  {row["method"]:40} {row["requests"]:9} {row["rps"]:9.1f} {row["error_rate"]*100:6.1f}% '
+              f'{row["p50_ms"]:9.2f} {row["p95_ms"]:9.2f} {row["p99_ms"]:9.2f} {row["mean_bytes"]:10}')
+    if report['total'] and report['total']['errors']:
+        print(f'\n  Error codes: {", ".join(f"{code} ({count})" for code, count in report["total"]["error_codes"].items())}')
+    print()
@@ -0,0 +1,129 @@
+"""
+Deferred loguru logger.
+
+LOGGER is a stand-in for loguru's logger that postpones importing loguru until a message
+at (or above) the level of a configured sink is logged, or a loguru feature is used.
+Sinks added (and handlers removed/modules disabled) before then are replayed on the real
+logger when it is loaded.  For short commands that log nothing, loguru is never imported.
+
+Before the first sink is added, messages below INFO are dropped.
+"""
+import threading
+from typing import Any, Callable, Dict, List, Tuple
+
+_LEVELS = {'TRACE': 5, 'DEBUG': 10, 'INFO': 20, 'SUCCESS': 25, 'WARNING': 30, 'ERROR': 40, 'CRITICAL': 50}
+_DEFAULT_HANDLE = 0  # loguru's pre-installed stderr handler
+
+
+class DeferredLogger():
+    def __init__(self):
+        self._logger = None
+        self._next_handle = 10000  # well clear of loguru handler ids, see remove()
+        self._sinks: Dict[int, Tuple[tuple, dict]] = {}
+        self._handle_map: Dict[int, int] = {}
+        self._default_removed = False
+        self._disabled: List[str] = []
+        self._threshold = _LEVELS['INFO']
+        self._load_lock = threading.Lock()  # first message may come from several threads
+
+    # -- Logging methods -------------------------------------------------------------------------
+    def trace(self, message: Any, *args, **kwargs):
+        self._log('TRACE', 'trace', message, *args, **kwargs)
+
+    def debug(self, message: Any, *args, **kwargs):
+        self._log('DEBUG', 'debug', message, *args, **kwargs)
+
+    def info(self, message: Any, *args, **kwargs):
+        self._log('INFO', 'info', message, *args, **kwargs)
+
+    def success(self, message: Any, *args, **kwargs):
+        self._log('SUCCESS', 'success', message, *args, **kwargs)
+
+    def warning(self, message: Any, *args, **kwargs):
+        self._log('WARNING', 'warning', message, *args, **kwargs)
+
+    def error(self, message: Any, *args, **kwargs):
+        self._log('ERROR', 'error', message, *args, **kwargs)
+
+    def critical(self, message: Any, *args, **kwargs):
+        self._log('CRITICAL', 'critical', message, *args, **kwargs)
+
+    # -- Configuration methods -------------------------------------------------------------------
+    def add(self, sink, *args, **kwargs) -> int:
+        if self._logger:
+            return self._logger.add(sink, *args, **kwargs)
+        handle = self._next_handle
+        self._next_handle += 1
+        self._sinks[handle] = ((sink,) + args, kwargs)
+        self._threshold = self._min_level()
+        return handle
+
+    def remove(self, handle_id: int = None):
+        if self._logger:
+            self._logger.remove(self._handle_map.get(handle_id, handle_id))
+            return
+        if handle_id is None:
+            self._sinks.clear()
+            self._default_removed = True
+        elif handle_id == _DEFAULT_HANDLE and not self._default_removed:
+            self._default_removed = True
+        elif handle_id in self._sinks:
+            del self._sinks[handle_id]
+        else:
+            raise ValueError(f'There is no existing handler with id {handle_id}')
+        self._threshold = self._min_level()
+
+    def disable(self, name: str):
+        if self._logger:
+            self._logger.disable(name)
+        else:
+            self._disabled.append(name)
+
+    @property
+    def loaded(self) -> bool:
+        """True if loguru has been imported"""
+        return self._logger is not None
+
+    # -- Internals -------------------------------------------------------------------------------
+    def __getattr__(self, name: str) -> Any:
+        # Anything else (opt, bind, level, exception, ...) needs the real logger
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self._load(), name)
+
+    def _log(self, level: str, method: str, message: Any, *args, **kwargs):
+        if self._logger is None and _LEVELS[level] < self._threshold:
+            return
+        # depth=2 reports the caller of LOGGER.xxx(), not this proxy
+        logger_method: Callable = getattr(self._load().opt(depth=2), method)
+        logger_method(message, *args, **kwargs)
+
+    def _min_level(self) -> int:
+        if not self._sinks:
+            return _LEVELS['INFO']
+        levels = [ self._level_no(kwargs.get('level', 'DEBUG')) for _, kwargs in self._sinks.values() ]
+        return min(levels)
+
+    def _level_no(self, level) -> int:
+        if isinstance(level, int):
+            return level
+        return _LEVELS.get(str(level).upper(), 0)
+
+    def _load(self):
+        if self._logger is not None:
+            return self._logger
+        with self._load_lock:
+            if self._logger is not None:
+                return self._logger
+            from loguru import logger
+            if self._default_removed:
+                logger.remove(_DEFAULT_HANDLE)
+            for handle, (args, kwargs) in self._sinks.items():
+                self._handle_map[handle] = logger.add(*args, **kwargs)
+            for name in self._disabled:
+                logger.disable(name)
+            self._logger = logger
+            return self._logger
+
+
+LOGGER = DeferredLogger()
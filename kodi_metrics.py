@@ -0,0 +1,156 @@
+"""
+Per-request instrumentation.
+
+When a KodiObj has a MetricsRecorder, every call to the host is measured: DNS and connect
+time (new connections only), time to first byte, total time, request/response bytes, retries
+and json decode time.  The call in progress is kept in a thread-local, so transports (and the
+connection setup deep inside requests/urllib3) can add their timings without passing it along.
+
+Records are kept for the --stats summary and/or appended to a file as json lines (ndjson).
+"""
+import contextlib
+import pathlib
+import sys
+import threading
+import time
+from typing import Dict, Iterator, List, Optional
+
+import kodi_json
+
+_current = threading.local()
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of values"""
+    ordered = sorted(values)
+    rank = max(1, int(round(pct / 100 * len(ordered) + 0.5)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+class RequestMetrics():
+    """Measurements of one call (times in ms, None if not applicable, i.e. dns on a reused connection)"""
+    __slots__ = ('timestamp', 'host', 'transport', 'method', 'status_code', 'dns_ms', 'connect_ms', 'ttfb_ms',
+                 'total_ms', 'request_bytes', 'response_bytes', 'retries', 'decode_ms')
+
+    def __init__(self, method: str, host: str, transport: str):
+        self.timestamp = time.time()
+        self.host = host
+        self.transport = transport
+        self.method = method
+        self.status_code: Optional[int] = None
+        self.dns_ms: Optional[float] = None
+        self.connect_ms: Optional[float] = None
+        self.ttfb_ms: Optional[float] = None
+        self.total_ms = 0.0
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.retries = 0
+        self.decode_ms: Optional[float] = None
+
+    def add_time(self, name: str, seconds: float):
+        """Add seconds (as ms) to a timing, timings of retried attempts add up"""
+        setattr(self, name, (getattr(self, name) or 0.0) + seconds * 1000)
+
+    def to_dict(self) -> dict:
+        entry = { name: getattr(self, name) for name in self.__slots__ }
+        for name in ('dns_ms', 'connect_ms', 'ttfb_ms', 'total_ms', 'decode_ms'):
+            if entry[name] is not None:
+                entry[name] = round(entry[name], 3)
+        return entry
+
+
+def current() -> Optional[RequestMetrics]:
+    """The metrics of the call in progress on this thread (None if not measured)"""
+    return getattr(_current, 'metrics', None)
+
+@contextlib.contextmanager
+def measuring(metrics: RequestMetrics) -> Iterator[RequestMetrics]:
+    """Make metrics the call in progress on this thread, total_ms is the time spent in the block"""
+    previous = getattr(_current, 'metrics', None)
+    _current.metrics = metrics
+    start = time.perf_counter()
+    try:
+        yield metrics
+    finally:
+        metrics.total_ms = (time.perf_counter() - start) * 1000
+        _current.metrics = previous
+
+
+class MetricsRecorder():
+    """Collects RequestMetrics (keep, for summary()) and/or appends them to an ndjson file"""
+    def __init__(self, ndjson_file: str = None, keep: bool = True):
+        self._keep = keep
+        self._records: List[RequestMetrics] = []
+        self._lock = threading.Lock()
+        self._file_loc = pathlib.Path(ndjson_file).expanduser() if ndjson_file else None
+        self._file_handle = None
+
+    @property
+    def records(self) -> List[RequestMetrics]:
+        with self._lock:
+            return list(self._records)
+
+    def record(self, metrics: RequestMetrics):
+        with self._lock:
+            if self._keep:
+                self._records.append(metrics)
+            if self._file_loc is not None:
+                if self._file_handle is None:
+                    self._file_loc.parent.mkdir(parents=True, exist_ok=True)
+                    self._file_handle = open(self._file_loc, 'a', encoding='UTF-8')
+                self._file_handle.write(f'{kodi_json.dumps(metrics.to_dict())}\n')
+                self._file_handle.flush()
+
+    def close(self):
+        with self._lock:
+            if self._file_handle is not None:
+                self._file_handle.close()
+                self._file_handle = None
+
+    def summary(self) -> Dict[str, dict]:
+        """Per method (and 'total') aggregates of the kept records"""
+        by_method: Dict[str, List[RequestMetrics]] = {}
+        for metrics in self.records:
+            by_method.setdefault(metrics.method, []).append(metrics)
+        summary = { method: self._aggregate(entries) for method, entries in sorted(by_method.items()) }
+        if len(by_method) > 1:
+            summary['total'] = self._aggregate([ metrics for entries in by_method.values() for metrics in entries ])
+        return summary
+
+    def print_summary(self, file=sys.stderr):
+        summary = self.summary()
+        if not summary:
+            print('\nNo requests sent', file=file)
+            return
+        columns = f'{"calls":>6} {"errors":>6} {"total ms":>9} {"p95 ms":>8} {"ttfb ms":>8} {"dns ms":>7} {"conn ms":>8} ' \
+                  f'{"decode ms":>9} {"sent":>9} {"received":>10} {"retries":>7}'
+        print(f'\n  {"Method":40} {columns}', file=file)
+        print(f'  {"—"*40} {"—"*len(columns)}', file=file)
+        for method, stats in summary.items():
+            print(f'  {method[:40]:40} {stats["calls"]:6} {stats["errors"]:6} {stats["total_ms"]:9.2f} {stats["p95_ms"]:8.2f} '
+                  f'{_ms(stats["ttfb_ms"]):>8} {_ms(stats["dns_ms"]):>7} {_ms(stats["connect_ms"]):>8} {_ms(stats["decode_ms"]):>9} '
+                  f'{stats["request_bytes"]:9} {stats["response_bytes"]:10} {stats["retries"]:7}', file=file)
+        print('\n  total/ttfb/decode: mean per call, dns/conn: mean per new connection, sent/received: bytes', file=file)
+
+    @staticmethod
+    def _aggregate(entries: List[RequestMetrics]) -> dict:
+        def mean(name: str) -> Optional[float]:
+            values = [ getattr(metrics, name) for metrics in entries if getattr(metrics, name) is not None ]
+            return sum(values) / len(values) if values else None
+
+        return {
+            'calls': len(entries),
+            'errors': sum(1 for metrics in entries if metrics.status_code != 0),
+            'total_ms': mean('total_ms'),
+            'p95_ms': percentile([ metrics.total_ms for metrics in entries ], 95),
+            'ttfb_ms': mean('ttfb_ms'),
+            'dns_ms': mean('dns_ms'),
+            'connect_ms': mean('connect_ms'),
+            'decode_ms': mean('decode_ms'),
+            'request_bytes': sum(metrics.request_bytes for metrics in entries),
+            'response_bytes': sum(metrics.response_bytes for metrics in entries),
+            'retries': sum(metrics.retries for metrics in entries),
+        }
+
+def _ms(value: Optional[float]) -> str:
+    return '-' if value is None else f'{value:.2f}'
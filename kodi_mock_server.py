@@ -0,0 +1,308 @@
+"""
+Stand-in Kodi JSON-RPC server, for testing kodi-cli without a Kodi host.
+
+Serves JSON-RPC over HTTP (POST /jsonrpc) and raw TCP.  Methods that return a list
+(i.e. AudioLibrary.GetSongs, VideoLibrary.GetEpisodes) return generated entries and honor
+limits, JSONRPC.Ping returns "pong", any other valid method echoes its method and params.
+List sizes default to -n, a synthetic library can be sized per item type (i.e. 40 shows of
+5 seasons of 10 episodes), episodes then belong to their show/season and honor the
+tvshowid/season filters.  With -e, a notification is sent to the tcp clients every few seconds.
+
+TCP requests are handled concurrently and, with --shuffle, batch and pipelined responses
+are returned out of order (as a real host may do).
+
+    python kodi_mock_server.py [-p HTTP_PORT] [-t TCP_PORT] [-n LIST_SIZE] [-d DELAY] [--shuffle] [-e SECONDS]
+                               [--shows N] [--seasons N] [--episodes N] [--movies N] [--songs N]
+"""
+import argparse
+import json
+import pathlib
+import random
+import socket
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+
+from kodi_transport import JsonMessageSplitter
+
+THIS_PATH = pathlib.Path(__file__).absolute().parent
+# Requested properties returned as numbers, anything else is returned as a string
+NUMERIC_PROPERTIES = ['season', 'episode', 'playcount', 'watchedepisodes', 'year', 'track', 'duration', 'rating', 'runtime']
+# Synthetic library sizes: shows, seasons (per show), episodes (per season), movies, songs
+LIBRARY_SIZES = ['shows', 'seasons', 'episodes', 'movies', 'songs']
+
+
+class MockKodi():
+    """JSON-RPC request handling (transport independent)"""
+    def __init__(self, list_size: int = 25, delay: float = 0.0, shuffle: bool = False, json_loc: str = './json-defs', library: Dict[str, int] = None):
+        self.list_size = list_size
+        self.library = { key: value for key, value in (library or {}).items() if key in LIBRARY_SIZES and value is not None }
+        self.delay = delay
+        self.shuffle = shuffle
+        self.request_count = 0
+        self._count_lock = threading.Lock()
+        with open(THIS_PATH / json_loc / 'methods.json') as json_fh:
+            self._methods = json.load(json_fh)
+
+    def handle_text(self, request_text: str) -> str:
+        """Return the response text for a request (single or batch)"""
+        try:
+            request = json.loads(request_text)
+        except ValueError:
+            return json.dumps(self._error(None, -32700, 'Parse error.'))
+        if self.delay:
+            time.sleep(random.uniform(0, self.delay) if self.shuffle else self.delay)
+        if isinstance(request, list):
+            response = [ self.handle(entry) for entry in request ]
+            if self.shuffle:
+                random.shuffle(response)
+        else:
+            response = self.handle(request)
+        return json.dumps(response)
+
+    def handle(self, request: dict) -> dict:
+        with self._count_lock:
+            self.request_count += 1
+        req_id = request.get('id')
+        method = request.get('method', '')
+        params = request.get('params', {})
+        if method not in self._methods:
+            return self._error(req_id, -32601, 'Method not found.')
+        if method == 'JSONRPC.Ping':
+            return {'id': req_id, 'jsonrpc': '2.0', 'result': 'pong'}
+        list_key = self._list_key(method)
+        if list_key:
+            result = self._list_result(list_key, params, 'RecentlyAdded' in method)
+            return {'id': req_id, 'jsonrpc': '2.0', 'result': result}
+        details_key = self._details_key(method)
+        if details_key:
+            item_name = details_key[:-len('details')]
+            entry = self._list_entry(item_name, int(params.get(f'{item_name}id', 1)) - 1, params.get('properties', []))
+            return {'id': req_id, 'jsonrpc': '2.0', 'result': {details_key: entry}}
+        return {'id': req_id, 'jsonrpc': '2.0', 'result': {'method': method, 'params': params}}
+
+    def _list_key(self, method: str) -> str:
+        returns = self._methods[method].get('returns', {})
+        properties = returns.get('properties', {}) if isinstance(returns, dict) else {}
+        if 'limits' in properties:
+            return next((key for key in properties.keys() if key != 'limits'), None)
+        return None
+
+    def _details_key(self, method: str) -> str:
+        returns = self._methods[method].get('returns', {})
+        properties = returns.get('properties', {}) if isinstance(returns, dict) else {}
+        return next((key for key in properties.keys() if key.endswith('details')), None)
+
+    def _list_result(self, list_key: str, params: dict, newest_first: bool = False) -> dict:
+        limits = params.get('limits', {})
+        properties = params.get('properties', [])
+        first, total = self._list_range(list_key, params)
+        start = int(limits.get('start', 0))
+        end = int(limits.get('end', -1))
+        end = total if end < 0 else min(end, total)
+        ids = range(total-1-start, total-1-end, -1) if newest_first else range(start, end)
+        entries = [ self._list_entry(list_key[:-1], first + idx, properties) for idx in ids ]
+        return {list_key: entries, 'limits': {'start': start, 'end': max(start, end), 'total': total}}
+
+    def _list_range(self, list_key: str, params: dict) -> tuple:
+        """Return (first index, count) of the list entries, episodes may be filtered by tvshowid/season"""
+        if list_key == 'tvshows' and 'shows' in self.library:
+            return 0, self.library['shows']
+        if list_key in ('movies', 'songs') and list_key in self.library:
+            return 0, self.library[list_key]
+        if list_key == 'episodes' and 'shows' in self.library:
+            seasons, episodes = self.library.get('seasons', 1), self.library.get('episodes', 1)
+            show = int(params.get('tvshowid', 0)) - 1
+            season = int(params.get('season', 0)) - 1
+            if show < 0:
+                return 0, self.library['shows'] * seasons * episodes
+            if show >= self.library['shows']:
+                return 0, 0
+            if season < 0:
+                return show * seasons * episodes, seasons * episodes
+            if season >= seasons:
+                return 0, 0
+            return (show * seasons + season) * episodes, episodes
+        return 0, self.list_size
+
+    def _list_entry(self, item_name: str, idx: int, properties: list) -> dict:
+        # Library ids start at 1, as in Kodi
+        entry = {f'{item_name}id': idx + 1, 'label': f'{item_name} {idx}'}
+        for prop in properties:
+            entry[prop] = idx % 5 + 1 if prop in NUMERIC_PROPERTIES else f'{prop} {idx}'
+        if 'tvshowid' in properties:
+            entry['tvshowid'] = idx % 4 + 1
+        if 'shows' in self.library:
+            self._library_properties(item_name, idx, entry, properties)
+        return entry
+
+    def _library_properties(self, item_name: str, idx: int, entry: dict, properties: list):
+        """Set the show/season/episode numbers of the synthetic library"""
+        seasons, episodes = self.library.get('seasons', 1), self.library.get('episodes', 1)
+        if item_name == 'tvshow':
+            numbers = {'season': seasons, 'episode': seasons * episodes}
+        elif item_name == 'episode':
+            numbers = {'tvshowid': idx // (seasons * episodes) + 1, 'season': idx // episodes % seasons + 1, 'episode': idx % episodes + 1}
+        else:
+            return
+        entry.update({ key: value for key, value in numbers.items() if key in properties })
+
+    def _error(self, req_id, code: int, message: str) -> dict:
+        return {'id': req_id, 'jsonrpc': '2.0', 'error': {'code': code, 'message': message}}
+
+
+# == HTTP ===========================================================================================
+class _HttpHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True  # headers and body are separate writes, avoid the delayed ack stall
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.server.kodi.handle_text(self.rfile.read(length).decode('utf-8')).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+# == TCP ============================================================================================
+class _TcpHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        kodi: MockKodi = self.server.kodi
+        send_lock = threading.Lock()
+        splitter = JsonMessageSplitter()
+        with self.server.clients_lock:
+            self.server.clients[self.request] = send_lock
+
+        def respond(message: bytes):
+            response = kodi.handle_text(message.decode('utf-8')).encode('utf-8')
+            with send_lock:
+                try:
+                    self.request.sendall(response)
+                except OSError:
+                    pass
+
+        while True:
+            try:
+                data = self.request.recv(65536)
+            except OSError:
+                break
+            if not data:
+                break
+            for message in splitter.feed(data):
+                # Each request is handled on its own thread, responses go out when ready
+                threading.Thread(target=respond, args=(message,), daemon=True).start()
+        with self.server.clients_lock:
+            self.server.clients.pop(self.request, None)
+
+
+class _ThreadingTcpServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.clients = {}  # connected socket -> send lock
+        self.clients_lock = threading.Lock()
+
+
+class MockKodiServer():
+    """Runs the http and tcp servers on background threads (port 0 picks a free port)"""
+    def __init__(self, kodi: MockKodi = None, host: str = '127.0.0.1', http_port: int = 0, tcp_port: int = 0):
+        self.kodi = kodi if kodi else MockKodi()
+        self._http = ThreadingHTTPServer((host, http_port), _HttpHandler)
+        self._http.daemon_threads = True
+        self._tcp = _ThreadingTcpServer((host, tcp_port), _TcpHandler)
+        self._http.kodi = self.kodi
+        self._tcp.kodi = self.kodi
+        self._threads: List[threading.Thread] = []
+
+    @property
+    def http_port(self) -> int:
+        return self._http.server_address[1]
+
+    @property
+    def tcp_port(self) -> int:
+        return self._tcp.server_address[1]
+
+    def start(self) -> 'MockKodiServer':
+        for server in (self._http, self._tcp):
+            thread = threading.Thread(target=server.serve_forever, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def notify(self, method: str, data=None, sender: str = 'xbmc') -> int:
+        """Send a notification to all connected tcp clients, returns number of clients"""
+        message = json.dumps({'jsonrpc': '2.0', 'method': method, 'params': {'sender': sender, 'data': data}}).encode('utf-8')
+        with self._tcp.clients_lock:
+            clients = list(self._tcp.clients.items())
+        for sock, send_lock in clients:
+            with send_lock:
+                try:
+                    sock.sendall(message)
+                except OSError:
+                    pass
+        return len(clients)
+
+    def stop(self):
+        for server in (self._http, self._tcp):
+            server.shutdown()
+            server.server_close()
+        # Drop connected tcp clients, as a host shutting down would
+        with self._tcp.clients_lock:
+            clients = list(self._tcp.clients.keys())
+        for sock in clients:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Stand-in Kodi JSON-RPC server (http and tcp)')
+    parser.add_argument('-p', '--http-port', type=int, default=8080, help='HTTP port (default 8080)')
+    parser.add_argument('-t', '--tcp-port', type=int, default=9090, help='TCP port (default 9090)')
+    parser.add_argument('-n', '--list-size', type=int, default=25, help='Number of entries in list results')
+    parser.add_argument('-d', '--delay', type=float, default=0.0, help='Seconds to delay each response')
+    parser.add_argument('--shuffle', action='store_true', help='Random delays (up to -d), batch responses out of order')
+    for size in LIBRARY_SIZES:
+        parser.add_argument(f'--{size}', type=int, help=f'Synthetic library: number of {size}' + (' per show' if size == 'seasons' else ' per season' if size == 'episodes' else ''))
+    parser.add_argument('-e', '--events', type=float, default=0.0, help='Send a (Player/VideoLibrary) notification every N seconds')
+    args = parser.parse_args()
+
+    kodi = MockKodi(args.list_size, args.delay, args.shuffle, library={ size: getattr(args, size) for size in LIBRARY_SIZES })
+    server = MockKodiServer(kodi, http_port=args.http_port, tcp_port=args.tcp_port).start()
+    print(f'Mock Kodi listening - http: {server.http_port}  tcp: {server.tcp_port}  (Ctrl-C to stop)')
+    events = [
+        ('Player.OnPlay', {'item': {'type': 'movie', 'id': 1}, 'player': {'playerid': 1, 'speed': 1}}),
+        ('Player.OnPause', {'item': {'type': 'movie', 'id': 1}, 'player': {'playerid': 1, 'speed': 0}}),
+        ('Player.OnStop', {'item': {'type': 'movie', 'id': 1}, 'end': False}),
+        ('VideoLibrary.OnUpdate', {'item': {'type': 'movie', 'id': 1}, 'playcount': 1}),
+    ]
+    try:
+        idx = 0
+        while True:
+            time.sleep(args.events if args.events > 0 else 1)
+            if args.events > 0:
+                server.notify(*events[idx % len(events)])
+                idx += 1
+    except KeyboardInterrupt:
+        pass
+    server.stop()
+    print(f'{kodi.request_count} requests handled')
+
+if __name__ == "__main__":
+    main()
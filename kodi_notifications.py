@@ -0,0 +1,181 @@
+"""
+Kodi push notification listener.
+
+Kodi announces events (Player.OnPlay, VideoLibrary.OnUpdate, System.OnQuit, ...) to the
+clients connected to its json-rpc tcp port.  NotificationListener keeps a connection open,
+passes each notification to the handlers registered for it and reconnects (with backoff)
+when the connection is lost, i.e. when Kodi restarts.
+"""
+import fnmatch
+import socket
+import sys
+import threading
+import time
+from typing import Callable, List, Tuple
+
+from kodi_logger import LOGGER
+import kodi_json
+from kodi_transport import DEFAULT_TCP_PORT, JsonMessageSplitter
+
+# Namespaces that can be switched on/off with JSONRPC.SetConfiguration, others are 'Other'
+CONFIGURABLE_NAMESPACES = ['Player', 'Playlist', 'GUI', 'System', 'AudioLibrary', 'VideoLibrary', 'Application', 'Input']
+
+NotificationHandler = Callable[[str, dict], None]
+
+STABLE_CONNECTION = 30.0  # seconds up after which a lost connection starts over with the initial backoff
+
+
+class NotificationListener():
+    """
+    Receive notifications from host:port and dispatch them to handlers.
+
+    Handlers are registered for a notification name or a fnmatch pattern (Player.*, *) and
+    are called with (host, notification) where notification is the json-rpc message
+    ({"jsonrpc": "2.0", "method": "Player.OnPlay", "params": {"sender": .., "data": ..}}).
+    When only some namespaces are of interest, Kodi is asked (JSONRPC.SetConfiguration) not
+    to send the others.
+    """
+    def __init__(self, host: str, port: int = DEFAULT_TCP_PORT, reconnect: bool = True, max_backoff: float = 30.0, connect_timeout: float = 5.0):
+        self._host = host
+        self._port = port
+        self._reconnect = reconnect
+        self._max_backoff = max_backoff
+        self._connect_timeout = connect_timeout
+        self._handlers: List[Tuple[str, NotificationHandler]] = []
+        self._stop = threading.Event()
+        self._sock: socket.socket = None
+        self._sock_lock = threading.Lock()
+        self.notification_count = 0
+
+    def add_handler(self, pattern: str, handler: NotificationHandler):
+        """Call handler for notifications matching pattern (i.e. Player.OnPlay, Player.*, *), once per notification"""
+        self._handlers.append((pattern, handler))
+
+    def run(self) -> bool:
+        """Listen until stop() is called (or the connection is lost and reconnect is off)"""
+        self._stop.clear()
+        backoff = 1.0
+        while not self._stop.is_set():
+            try:
+                sock = self._connect()
+            except OSError as ose:
+                if not self._reconnect:
+                    LOGGER.error(f'Unable to connect to {self._host}:{self._port} - {repr(ose)}')
+                    return False
+                LOGGER.warning(f'Unable to connect to {self._host}:{self._port}, retry in {backoff:.0f}s - {repr(ose)}')
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, self._max_backoff)
+                continue
+            LOGGER.info(f'Listening for notifications from {self._host}:{self._port}')
+            connected_at = time.monotonic()
+            received = self.notification_count
+            self._configure(sock)
+            error = self._read_loop(sock)
+            self._close()
+            if self._stop.is_set():
+                break
+            if not self._reconnect:
+                LOGGER.error(f'Connection to {self._host}:{self._port} lost - {repr(error)}')
+                return False
+            if self.notification_count > received or time.monotonic() - connected_at >= STABLE_CONNECTION:
+                # the connection was working, the host is likely back soon (i.e. Kodi restart)
+                backoff = 1.0
+            LOGGER.warning(f'Connection to {self._host}:{self._port} lost, reconnecting in {backoff:.0f}s - {repr(error)}')
+            # A host that accepts and then drops connections (booting, proxy) is not retried in a tight loop
+            self._stop.wait(backoff)
+            backoff = min(backoff * 2, self._max_backoff)
+        return True
+
+    def stop(self):
+        """Stop run() (may be called from a handler or another thread)"""
+        self._stop.set()
+        self._close()
+
+    def _connect(self) -> socket.socket:
+        sock = socket.create_connection((self._host, self._port), timeout=self._connect_timeout)
+        sock.settimeout(None)
+        with self._sock_lock:
+            self._sock = sock
+        return sock
+
+    def _close(self):
+        with self._sock_lock:
+            sock, self._sock = self._sock, None
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            sock.close()
+
+    def _configure(self, sock: socket.socket):
+        """Ask Kodi to only announce the namespaces handlers are registered for"""
+        namespaces = self._namespaces()
+        if namespaces is None:
+            return
+        config = { ns: (ns in namespaces) for ns in CONFIGURABLE_NAMESPACES }
+        config['Other'] = any(ns not in CONFIGURABLE_NAMESPACES for ns in namespaces)
+        LOGGER.debug(f'  Notification config: {config}')
+        request = {"jsonrpc": "2.0", "id": "kodi-cli-listen", "method": "JSONRPC.SetConfiguration", "params": {"notifications": config}}
+        try:
+            sock.sendall(kodi_json.dumpb(request))
+        except OSError as ose:
+            LOGGER.debug(f'  Unable to set notification config: {repr(ose)}')
+
+    def _namespaces(self) -> List[str]:
+        """Namespaces the handlers need, None if all"""
+        namespaces = []
+        for pattern, _ in self._handlers:
+            ns = pattern.split('.')[0]
+            if any(ch in ns for ch in '*?['):
+                return None
+            namespaces.append(ns)
+        return namespaces if namespaces else None
+
+    def _read_loop(self, sock: socket.socket) -> Exception:
+        splitter = JsonMessageSplitter()
+        while not self._stop.is_set():
+            try:
+                data = sock.recv(65536)
+            except OSError as ose:
+                return ose
+            if not data:
+                return ConnectionResetError('Connection closed by host')
+            for message in splitter.feed(data):
+                self._dispatch(message)
+        return None
+
+    def _dispatch(self, message: bytes):
+        try:
+            notification = kodi_json.loads(message)
+        except ValueError as ve:
+            LOGGER.debug(f'Unparsable message from {self._host}: {repr(ve)}')
+            return
+        if not isinstance(notification, dict) or 'method' not in notification or 'id' in notification:
+            # Response to our own request (i.e. SetConfiguration)
+            LOGGER.trace(f'  Response: {message[:200]}')
+            return
+        method = notification['method']
+        LOGGER.trace(f'  Notification: {method}')
+        self.notification_count += 1
+        called = []
+        for pattern, handler in self._handlers:
+            # a handler registered for overlapping patterns (i.e. Player.* and *) is called once
+            if handler not in called and fnmatch.fnmatchcase(method, pattern):
+                called.append(handler)
+                try:
+                    handler(self._host, notification)
+                except Exception as ex:
+                    LOGGER.error(f'Notification handler for {pattern} failed: {repr(ex)}')
+
+
+def ndjson_writer(output=None) -> NotificationHandler:
+    """Handler writing each notification as a json line (host, time, method, params)"""
+    output = output or sys.stdout
+
+    def write(host: str, notification: dict):
+        event = {'host': host, 'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+                 'method': notification['method'], 'params': notification.get('params', {})}
+        output.write(f'{kodi_json.dumps(event)}\n')
+        output.flush()
+    return write
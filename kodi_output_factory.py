@@ -1,7 +1,7 @@
 # Json Raw 
 # Json Formatted
-# CSV Formatted
-#     CSV only available for specific commands
+# CSV/TSV/NDJSON Formatted
+#     list returning methods only (kodi_columns)
 
 # https://www.geeksforgeeks.org/convert-json-to-csv-in-python/
 
@@ -9,9 +9,16 @@
 # Python program to convert
 # JSON file to CSV
  
-import json
 import csv
+import itertools
 import sys
+from typing import Callable, Iterable, Iterator, List
+
+from kodi_columns import ColumnLayout, ListSchema
+import kodi_json
+from kodi_transport import JsonResponse
+
+OUTPUT_FORMATS = ['json', 'csv', 'tsv', 'ndjson']  # builder keys in upper case
 
 # ===========================================================================
 class ObjectFactory:
@@ -29,57 +36,166 @@ class ObjectFactory:
 
 # ===========================================================================
 class JSON_OutputServiceBuilder:
-    def __init__(self):
-        self._instance = None
-
-    def __call__(self, response_text: str, pretty: bool = False, **_ignored):
-        if not self._instance:
-            self._instance = JSON_OutputService(response_text, pretty)
-        return self._instance   
+    # Builders are long-lived (shell/daemon mode), a service is created for each response
+    def __call__(self, response_text: str = None, pretty: bool = False, items: Iterable[dict] = None, list_key: str = None,
+                 response: JsonResponse = None, envelope: Callable[[], JsonResponse] = None, **_ignored):
+        return JSON_OutputService(_as_response(response, response_text), pretty, items, list_key, envelope)
 
 
 class JSON_OutputService:
-    def __init__(self, output_text: str, pretty: bool = False):
-        self._output_text = output_text
+    # Stands in for the list node while the envelope is encoded
+    _ITEMS_MARKER = '__kodi_cli_items__'
+
+    def __init__(self, response: JsonResponse, pretty: bool = False, items: Iterable[dict] = None, list_key: str = None,
+                 envelope: Callable[[], JsonResponse] = None):
+        self._response = response
         self._pretty = pretty
+        self._items = items
+        self._list_key = list_key
+        self._envelope = envelope
     
     def output_result(self) -> str:
+        if self._items is not None:
+            self._output_items()
+            return
         if self._pretty:
-            result = json.dumps(json.loads(self._output_text), indent=2)
-        else:
-            result = json.dumps(json.loads(self._output_text))
-        print(result)
+            try:
+                print(kodi_json.dumps(self._response.json, pretty=True))
+                return
+            except ValueError:
+                pass  # not json (a message), output as is
+        self._output_raw()
+
+    def _output_raw(self):
+        """Output the response as received, it is not decoded (and re-encoded)"""
+        out = getattr(sys.stdout, 'buffer', None)
+        if out is None:
+            # stdout captured as text (daemon mode)
+            sys.stdout.write(f'{self._response.text}\n')
+            return
+        sys.stdout.flush()
+        out.write(self._response.content)
+        out.write(b'\n')
+        out.flush()
+
+    def _output_items(self):
+        """
+        Output paged/streamed items as a single response, items are written as they are retrieved.
+
+        The envelope (id, jsonrpc, result.limits,...) is the one of the response the items came
+        from: envelope() is called before the first item (id, jsonrpc) and once the items are
+        consumed (limits).
+        """
+        if self._pretty:
+            items = list(self._items)
+            print(kodi_json.dumps(self._with_items(self._current_envelope(), items), pretty=True))
+            return
+        # Encoded with the envelope (marker for the list node), so the separators are the codec's throughout
+        marker = f'"{self._ITEMS_MARKER}"'
+        envelope = self._current_envelope()
+        head = kodi_json.dumps(self._with_items(envelope, self._ITEMS_MARKER))
+        item_sep = kodi_json.dumps([0, 0])[2:-2]
+        sys.stdout.write(head[:head.index(marker)] + '[')
+        sep = ''
+        for item in self._items:
+            sys.stdout.write(f'{sep}{kodi_json.dumps(item)}')
+            sep = item_sep
+        # an error response (failed after the first page) has no result, the first envelope is closed
+        tail = kodi_json.dumps(self._with_items(self._current_envelope() or envelope, self._ITEMS_MARKER))
+        sys.stdout.write(']' + tail[tail.index(marker) + len(marker):] + '\n')
+
+    def _current_envelope(self) -> dict:
+        """The envelope of the response the items come from, None if not known (or an error response)"""
+        response = self._envelope() if self._envelope is not None else None
+        try:
+            envelope = response.json if response is not None else None
+        except ValueError:
+            return None
+        return envelope if isinstance(envelope, dict) and isinstance(envelope.get('result'), dict) else None
+
+    def _with_items(self, envelope: dict, items) -> dict:
+        """envelope with items as the list node (first in result)"""
+        if envelope is None:
+            return {"id": 1, "jsonrpc": "2.0", "result": {self._list_key: items}}
+        result = { key: value for key, value in envelope['result'].items() if key != self._list_key }
+        return dict(envelope, result=dict({self._list_key: items}, **result))
      
 
 # ===========================================================================
-class CSV_OutputServiceBuilder:
-    def __init__(self):
-        self._instance = None
+class List_OutputServiceBuilder:
+    """Builder of the list writers (csv, tsv, ndjson), items or the list node of a response"""
+    def __call__(self, response_text: str = None, list_key: str = None, items: Iterable[dict] = None, response: JsonResponse = None,
+                 list_schema: ListSchema = None, properties: List[str] = None, **_ignored):
+        return self.service(_as_response(response, response_text), list_key, items, list_schema, properties)
 
-    def __call__(self, response_text: str, list_key: str, **_ignored):
-        if not self._instance:
-            self._instance = CSV_OutputService(response_text, list_key)
-        return self._instance   
+class CSV_OutputServiceBuilder(List_OutputServiceBuilder):
+    def service(self, *args):
+        return CSV_OutputService(*args)
 
-class CSV_OutputService:
-    def __init__(self, output_text: str, list_key: str):
-        self._output_text = output_text
-        self._list_key = list_key
+class TSV_OutputServiceBuilder(List_OutputServiceBuilder):
+    def service(self, *args):
+        return TSV_OutputService(*args)
+
+class NDJSON_OutputServiceBuilder(List_OutputServiceBuilder):
+    def service(self, *args):
+        return NDJSON_OutputService(*args)
+
+
+class List_OutputService:
+    """
+    Write list items as they are decoded, one row per item.
+
+    Items come from an iterator (paged/streamed results, rows are written as the items are
+    decoded) or the list node of the response.  The column order (ColumnLayout) is the key columns of the
+    list schema followed by the requested properties, else the keys of the first item.
+    """
+    def __init__(self, response: JsonResponse, list_key: str, items: Iterable[dict] = None, list_schema: ListSchema = None,
+                 properties: List[str] = None):
+        self._response = response
+        self._list_key = list_key or (list_schema.key if list_schema else None)
+        self._items = items
+        self._list_schema = list_schema
+        self._properties = properties
 
     def output_result(self):
-        data = json.loads(self._output_text)
-        json_list = data['result'][self._list_key]
-        sys.stdout.reconfigure(encoding='utf-8')
-        csv_writer = csv.writer(sys.stdout, lineterminator='\n')
-        # Counter variable used for writing headers to the CSV file
-        count = 0
-        for item in json_list:
-            if count == 0:
-                # Writing headers of CSV file
-                header = item.keys()
-                csv_writer.writerow(header)
-                count += 1
-        
-            # Writing data of CSV file
-            csv_writer.writerow(item.values())
+        if self._items is not None:
+            items = iter(self._items)
+        else:
+            # the body has been received, decoding it at once (codec) is faster than entry by entry
+            items = iter(self._response.json['result'][self._list_key])
+        if hasattr(sys.stdout, 'reconfigure'):
+            # not available when stdout is captured (daemon mode)
+            sys.stdout.reconfigure(encoding='utf-8')
+        first_item = next(items, None)
+        layout = ColumnLayout.create(self._list_schema, self._properties, first_item, self._list_key)
+        self._write(layout, itertools.chain([first_item], items) if first_item is not None else items)
+
+    def _write(self, layout: ColumnLayout, items: Iterator[dict]):
+        raise NotImplementedError
+
+
+class CSV_OutputService(List_OutputService):
+    dialect = csv.excel
+
+    def _write(self, layout: ColumnLayout, items: Iterator[dict]):
+        csv_writer = csv.writer(sys.stdout, self.dialect, lineterminator='\n')
+        csv_writer.writerow(layout.header)
+        row = layout.row
+        for item in items:
+            csv_writer.writerow(row(item))
+
+class TSV_OutputService(CSV_OutputService):
+    dialect = csv.excel_tab
+
+class NDJSON_OutputService(List_OutputService):
+    def _write(self, layout: ColumnLayout, items: Iterator[dict]):
+        # json keeps the nesting, items are only put in column order
+        ordered = layout.ordered
+        for item in items:
+            sys.stdout.write(f'{kodi_json.dumps(ordered(item))}\n')
+
 
+def _as_response(response: JsonResponse, response_text: str) -> JsonResponse:
+    if response is None and response_text is not None:
+        return JsonResponse(text=response_text)
+    return response
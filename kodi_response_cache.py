@@ -0,0 +1,164 @@
+"""
+TTL response cache for read-only Kodi methods.
+
+Responses are keyed on host + port + method + normalized params.  A bounded in-memory LRU
+tier is backed by an sqlite file (~/.kodi_cli/response_cache.sqlite) so cached responses
+survive between kodi-cli runs.  Time to live is set per namespace (0 = not cached).
+Entries of a host/namespace are dropped when a method changing that namespace is sent.
+"""
+import collections
+import hashlib
+import json
+import pathlib
+import threading
+import time
+from typing import Dict, Tuple
+
+from kodi_logger import LOGGER
+
+DEFAULT_CACHE_FILE = '~/.kodi_cli/response_cache.sqlite'
+DEFAULT_TTL = 300
+# Player/Playlist state changes constantly, definitions and addons rarely
+DEFAULT_NAMESPACE_TTLS = {'Player': 0, 'Playlist': 0, 'GUI': 5, 'Application': 5, 'JSONRPC': 3600, 'Addons': 900, 'Settings': 900}
+
+CacheEntry = Tuple[float, int, str]  # expires, status_code, response text
+
+
+def parse_namespace_ttls(ttl_spec: str) -> Dict[str, int]:
+    """Parse 'Player=0,Addons=900' into {'Player': 0, 'Addons': 900}"""
+    ttls = {}
+    for token in str(ttl_spec).split(','):
+        if '=' in token:
+            ns, ttl = token.split('=', 1)
+            ttls[ns.strip()] = int(ttl)
+    return ttls
+
+
+class ResponseCache():
+    def __init__(self, cache_file: str = DEFAULT_CACHE_FILE, max_entries: int = 1000, default_ttl: int = DEFAULT_TTL,
+                 namespace_ttls: Dict[str, int] = None, persistent: bool = True):
+        self._cache_file = pathlib.Path(cache_file).expanduser()
+        self._max_entries = max(1, max_entries)
+        self._default_ttl = default_ttl
+        self._namespace_ttls = dict(DEFAULT_NAMESPACE_TTLS)
+        self._namespace_ttls.update(namespace_ttls or {})
+        self._persistent = persistent
+        self._memory: 'collections.OrderedDict[str, CacheEntry]' = collections.OrderedDict()
+        self._key_info: Dict[str, Tuple[str, str]] = {}  # key -> (host, namespace), for invalidation
+        self._lock = threading.RLock()
+        self._db = None
+        self.hits = 0
+        self.misses = 0
+
+    def ttl(self, namespace: str) -> int:
+        return self._namespace_ttls.get(namespace, self._default_ttl)
+
+    def make_key(self, host: str, port: int, method: str, params: dict) -> str:
+        # stdlib json (not kodi_json), keys of the persistent cache must not depend on the codec installed
+        normalized = json.dumps(params, sort_keys=True, separators=(',', ':'))
+        return hashlib.sha1(f'{host}:{port}|{method}|{normalized}'.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Tuple[int, str]:
+        """Return (status_code, response text) if cached and current, else None"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None and self._persistent:
+                entry = self._db_get(key)
+                if entry is not None:
+                    self._memory_put(key, entry)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    self._memory.pop(key, None)
+                self.misses += 1
+                return None
+            self._memory.move_to_end(key)
+            self.hits += 1
+            return entry[1], entry[2]
+
+    def put(self, key: str, host: str, namespace: str, method: str, status_code: int, text: str):
+        ttl = self.ttl(namespace)
+        if ttl <= 0:
+            return
+        entry = (time.time() + ttl, status_code, text)
+        with self._lock:
+            self._key_info[key] = (host, namespace)
+            self._memory_put(key, entry)
+            if self._persistent:
+                self._db_put(key, host, namespace, method, entry)
+
+    def invalidate(self, host: str, namespace: str):
+        """Drop cached responses of namespace on host"""
+        with self._lock:
+            keys = [ key for key, info in self._key_info.items() if info == (host, namespace) ]
+            for key in keys:
+                self._memory.pop(key, None)
+                self._key_info.pop(key, None)
+            if self._persistent:
+                db = self._get_db()
+                if db is not None:
+                    with db:
+                        db.execute('DELETE FROM responses WHERE host = ? AND namespace = ?', (host, namespace))
+        LOGGER.debug(f'  Response cache: {host} {namespace} invalidated')
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._key_info.clear()
+            if self._persistent:
+                db = self._get_db()
+                if db is not None:
+                    with db:
+                        db.execute('DELETE FROM responses')
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    # -- Internals -------------------------------------------------------------------------------
+    def _memory_put(self, key: str, entry: CacheEntry):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self._max_entries:
+            old_key, _ = self._memory.popitem(last=False)
+            self._key_info.pop(old_key, None)
+
+    def _get_db(self):
+        if self._db is None and self._persistent:
+            import sqlite3
+            try:
+                self._cache_file.parent.mkdir(parents=True, exist_ok=True)
+                db = sqlite3.connect(str(self._cache_file), timeout=5, check_same_thread=False)
+                with db:
+                    db.execute('CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, host TEXT, namespace TEXT, method TEXT, '
+                               'expires REAL, status_code INTEGER, text TEXT)')
+                    db.execute('CREATE INDEX IF NOT EXISTS responses_ns ON responses (host, namespace)')
+                    db.execute('DELETE FROM responses WHERE expires <= ?', (time.time(),))
+                self._db = db
+                LOGGER.debug(f'  Response cache: {self._cache_file}')
+            except sqlite3.Error as se:
+                LOGGER.debug(f'  Response cache disk tier disabled, {self._cache_file}: {repr(se)}')
+                self._persistent = False
+        return self._db
+
+    def _db_get(self, key: str) -> CacheEntry:
+        db = self._get_db()
+        if db is None:
+            return None
+        row = db.execute('SELECT expires, status_code, text, host, namespace FROM responses WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        self._key_info[key] = (row[3], row[4])
+        return row[0], row[1], row[2]
+
+    def _db_put(self, key: str, host: str, namespace: str, method: str, entry: CacheEntry):
+        db = self._get_db()
+        if db is None:
+            return
+        with db:
+            db.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)', (key, host, namespace, method) + entry)
+            # Keep the disk tier bounded as well, dropping the entries closest to expiring
+            db.execute('DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY expires DESC LIMIT -1 OFFSET ?)',
+                       (self._max_entries,))
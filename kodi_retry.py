@@ -0,0 +1,123 @@
+"""
+Retry policy and per-host circuit breaker for calls to Kodi.
+
+Failed calls of idempotent (read-only) methods are retried on transient failures (connection
+refused/reset, timeouts, 5xx, unreadable response) with exponential backoff and jitter, as
+long as the retry fits in the policy deadline.
+
+A host that keeps failing (breaker_threshold consecutive transient failures) has its circuit
+opened: calls to it fail at once instead of waiting for connect timeouts, and a background
+probe checks (tcp connect) every probe_interval seconds whether it is back.  The breaker is
+shared by all KodiObj instances calling the same host:port.
+"""
+import random
+import socket
+import threading
+import time
+from typing import Dict, Tuple
+
+from kodi_logger import LOGGER
+
+
+class RetryPolicy():
+    def __init__(self, attempts: int = 3, backoff: float = 0.25, max_backoff: float = 4.0, deadline: float = 10.0,
+                 breaker_threshold: int = 3, probe_interval: float = 5.0):
+        self.attempts = max(1, attempts)            # including the first attempt
+        self.backoff = backoff                      # delay before the first retry, doubled for each retry
+        self.max_backoff = max_backoff
+        self.deadline = deadline                    # no retry is started after this many seconds
+        self.breaker_threshold = breaker_threshold  # 0 = no circuit breaker
+        self.probe_interval = probe_interval
+
+    @classmethod
+    def from_settings(cls, settings) -> 'RetryPolicy':
+        """Policy from the retry_*/breaker_* settings (i.e. the cfg module)"""
+        return cls(settings.retry_attempts, settings.retry_backoff, deadline=settings.retry_deadline,
+                   breaker_threshold=settings.breaker_threshold, probe_interval=settings.breaker_probe)
+
+    def delay(self, retry: int) -> float:
+        """Seconds to wait before retry (1..), exponential with equal jitter"""
+        delay = min(self.max_backoff, self.backoff * (2 ** (retry - 1)))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def __repr__(self) -> str:
+        return (f'RetryPolicy(attempts={self.attempts}, backoff={self.backoff}, max_backoff={self.max_backoff}, '
+                f'deadline={self.deadline}, breaker_threshold={self.breaker_threshold}, probe_interval={self.probe_interval})')
+
+
+# == Circuit breaker ================================================================================
+class CircuitBreaker():
+    CLOSED = 'closed'
+    OPEN = 'open'
+
+    def __init__(self, host: str, port: int, threshold: int = 3, probe_interval: float = 5.0, connect_timeout: float = 2.0):
+        self.host = host
+        self.port = port
+        self.threshold = threshold
+        self.probe_interval = probe_interval
+        self._connect_timeout = connect_timeout
+        self._state = CircuitBreaker.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+        self._probe: threading.Thread = None
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    @property
+    def is_open(self) -> bool:
+        return self._state == CircuitBreaker.OPEN
+
+    @property
+    def down_for(self) -> float:
+        """Seconds since the circuit was opened (0 when closed)"""
+        return time.monotonic() - self._opened_at if self.is_open else 0.0
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            if self._state == CircuitBreaker.OPEN:
+                LOGGER.info(f'{self.host}:{self.port} is responding, circuit closed')
+            self._state = CircuitBreaker.CLOSED
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == CircuitBreaker.OPEN or self._failures < self.threshold:
+                return
+            LOGGER.warning(f'{self.host}:{self.port} failed {self._failures} times, circuit open (calls fail fast, probing every {self.probe_interval}s)')
+            self._state = CircuitBreaker.OPEN
+            self._opened_at = time.monotonic()
+            if self._probe is None or not self._probe.is_alive():
+                self._probe = threading.Thread(target=self._probe_loop, name=f'kodi-probe-{self.host}', daemon=True)
+                self._probe.start()
+
+    def _probe_loop(self):
+        while self.is_open:
+            time.sleep(self.probe_interval)
+            try:
+                sock = socket.create_connection((self.host, self.port), timeout=self._connect_timeout)
+                sock.close()
+            except OSError as ose:
+                LOGGER.debug(f'Probe {self.host}:{self.port} - {repr(ose)}')
+                continue
+            self.record_success()
+
+
+_BREAKERS: Dict[Tuple[str, int], CircuitBreaker] = {}
+_BREAKERS_LOCK = threading.Lock()
+
+def get_breaker(host: str, port: int, policy: RetryPolicy) -> CircuitBreaker:
+    """Return the circuit breaker of host:port (shared by all callers in this process)"""
+    with _BREAKERS_LOCK:
+        breaker = _BREAKERS.get((host, port))
+        if breaker is None:
+            breaker = CircuitBreaker(host, port, policy.breaker_threshold, policy.probe_interval)
+            _BREAKERS[(host, port)] = breaker
+        else:
+            # Latest settings apply (i.e. shell mode config changes)
+            breaker.threshold = policy.breaker_threshold
+            breaker.probe_interval = policy.probe_interval
+        return breaker
@@ -0,0 +1,209 @@
+import hashlib
+import os
+import pathlib
+import pickle
+import sys
+import threading
+
+from kodi_columns import ListSchema, ListSchemaBuilder
+from kodi_help import HelpIndex
+import kodi_json
+from kodi_logger import LOGGER
+from kodi_validator import MethodValidator, SchemaCompiler
+
+# Bump when the structure of the cached data changes
+SCHEMA_CACHE_VERSION = 4
+# Classes pickled in (or building) the cache files, a change to their modules invalidates the cache
+_CACHED_CLASSES = [ListSchema, ListSchemaBuilder, HelpIndex, MethodValidator, SchemaCompiler]
+DEFAULT_CACHE_DIR = '~/.kodi_cli'
+
+
+class KodiSchema():
+    """
+    Kodi method/type/notification definitions (methods.json, types.json, notifications.json,
+    version.txt), processed into namespace -> method -> definition dictionaries, compiled
+    parameter validators and the list layout (ListSchema) of list returning methods.
+
+    The processed structures are pickled to a cache file keyed on the definition file
+    mtimes/sizes, version.txt and the mtimes/sizes of the modules defining the cached classes,
+    and are loaded lazily on first access.  The cache is rebuilt automatically when the
+    definition files or the code change (i.e. after an upgrade).  Once loaded, the data is
+    shared by all KodiSchema objects for the same definitions (i.e. one KodiObj per host).
+    The help index is only needed by help, it has a cache file of its own.
+    """
+    _loaded = {}
+    _loaded_lock = threading.Lock()
+
+    def __init__(self, json_loc: pathlib.Path, cache_dir: str = DEFAULT_CACHE_DIR, use_cache: bool = True):
+        self._json_loc = pathlib.Path(json_loc)
+        # One cache file per definitions location
+        loc_hash = hashlib.sha1(str(self._json_loc.absolute()).encode('utf-8')).hexdigest()[:8]
+        self._cache_file = pathlib.Path(cache_dir).expanduser() / f'schema_cache_{loc_hash}.pickle'
+        self._help_cache_file = self._cache_file.with_name(f'help_index_{loc_hash}.pickle')
+        self._use_cache = use_cache
+        self._data = None
+
+    @property
+    def namespaces(self) -> dict:
+        return self._get_data()['namespaces']
+
+    @property
+    def references(self) -> dict:
+        return self._get_data()['references']
+
+    @property
+    def notifications(self) -> dict:
+        """Notification name (i.e. Player.OnPlay) -> definition"""
+        return self._get_data()['notifications']
+
+    @property
+    def validators(self) -> dict:
+        """Method name (Namespace.Method) -> MethodValidator"""
+        return self._get_data()['validators']
+
+    def get_validator(self, method: str) -> MethodValidator:
+        return self.validators.get(method)
+
+    @property
+    def list_schemas(self) -> dict:
+        """Method name (Namespace.Method) -> ListSchema, for methods that return a list"""
+        return self._get_data()['list_schemas']
+
+    def get_list_schema(self, method: str) -> ListSchema:
+        return self.list_schemas.get(method)
+
+    @property
+    def help_index(self) -> HelpIndex:
+        """Resolved help for all methods, notifications and types, built on first use"""
+        data = self._get_data()
+        if 'help_index' not in data:
+            with KodiSchema._loaded_lock:
+                if 'help_index' not in data:
+                    data['help_index'] = self._load_help_index()
+        return data['help_index']
+
+    @property
+    def api_version(self) -> str:
+        return self._get_data()['api_version']
+
+    def _get_data(self) -> dict:
+        if self._data is None:
+            with KodiSchema._loaded_lock:
+                self._data = KodiSchema._loaded.get(self._cache_file)
+                if self._data is None:
+                    self._data = self._load()
+                    KodiSchema._loaded[self._cache_file] = self._data
+        return self._data
+
+    def _load(self) -> dict:
+        data = None
+        cache_key = self._cache_key()
+        if self._use_cache:
+            data = self._load_cache(cache_key)
+        if data is None:
+            data = self._build()
+            if self._use_cache:
+                self._save_cache(cache_key, data)
+        return data
+
+    def _load_help_index(self) -> HelpIndex:
+        help_index = None
+        cache_key = self._cache_key()
+        if self._use_cache:
+            help_index = self._load_cache(cache_key, self._help_cache_file)
+        if help_index is None:
+            LOGGER.debug('  Building help index')
+            help_index = HelpIndex(self.namespaces, self.references, self.notifications)
+            if self._use_cache:
+                self._save_cache(cache_key, help_index, self._help_cache_file)
+        return help_index
+
+    def _cache_key(self) -> str:
+        key_parts = [str(SCHEMA_CACHE_VERSION), sys.version.split()[0], str(self._json_loc.absolute())]
+        for file_name in ['methods.json', 'types.json', 'notifications.json', 'version.txt']:
+            file_loc = self._json_loc / file_name
+            if file_loc.exists():
+                f_stat = file_loc.stat()
+                key_parts.append(f'{file_name}:{f_stat.st_mtime_ns}:{f_stat.st_size}')
+        version_loc = self._json_loc / 'version.txt'
+        if version_loc.exists():
+            key_parts.append(version_loc.read_text().strip())
+        for module_file in sorted({ sys.modules[cls.__module__].__file__ for cls in _CACHED_CLASSES } | {__file__}):
+            f_stat = os.stat(module_file)
+            key_parts.append(f'{os.path.basename(module_file)}:{f_stat.st_mtime_ns}:{f_stat.st_size}')
+        return hashlib.sha1('|'.join(key_parts).encode('utf-8')).hexdigest()
+
+    def _load_cache(self, cache_key: str, cache_file: pathlib.Path = None):
+        cache_file = cache_file or self._cache_file
+        if not cache_file.exists():
+            return None
+        try:
+            with open(cache_file, 'rb') as cache_fh:
+                cached_key, data = pickle.load(cache_fh)
+        except Exception as ex:
+            LOGGER.debug(f'  Unable to read schema cache {cache_file}: {repr(ex)}')
+            return None
+        if cached_key != cache_key:
+            LOGGER.debug(f'  Schema cache {cache_file.name} is stale, rebuilding')
+            return None
+        LOGGER.debug(f'  Schema loaded from cache: {cache_file}')
+        return data
+
+    def _save_cache(self, cache_key: str, data, cache_file: pathlib.Path = None):
+        cache_file = cache_file or self._cache_file
+        try:
+            cache_file.parent.mkdir(parents=True, exist_ok=True)
+            tmp_file = cache_file.with_suffix(f'.{os.getpid()}.tmp')
+            with open(tmp_file, 'wb') as cache_fh:
+                pickle.dump((cache_key, data), cache_fh, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_file, cache_file)
+            LOGGER.debug(f'  Schema cache written: {cache_file}')
+        except OSError as ex:
+            LOGGER.debug(f'  Unable to write schema cache {cache_file}: {repr(ex)}')
+
+    def _build(self) -> dict:
+        namespaces = {}
+        json_dict_loc = self._json_loc / "methods.json"
+        LOGGER.debug(f'  Loading method definitionsL {json_dict_loc}')
+        all_methods = dict(sorted(self._load_kodi_json_def(json_dict_loc).items()))
+
+        last_ns = ""
+        for entry, value in all_methods.items():
+            token = entry.split('.')
+            ns = token[0]
+            method = token[1]
+            if ns != last_ns:
+                namespaces[ns] = {}
+                last_ns = ns
+            namespaces[ns][method] = value
+
+        json_dict_loc = self._json_loc / "types.json"
+        LOGGER.debug(f'  Loading reference/types definitions: {json_dict_loc}')
+        references = self._load_kodi_json_def(json_dict_loc)
+        LOGGER.debug('  Compiling parameter validators')
+        validators = SchemaCompiler(references).compile_methods(all_methods)
+        LOGGER.debug('  Deriving list layouts from the return definitions')
+        list_schemas = ListSchemaBuilder(references).build(all_methods)
+        for entry in all_methods.keys():
+            ns, method = entry.split('.', 1)
+            namespaces[ns][method]['csv'] = (entry in list_schemas)
+
+        json_dict_loc = self._json_loc / "notifications.json"
+        LOGGER.debug(f'  Loading notification definitions: {json_dict_loc}')
+        notifications = dict(sorted(self._load_kodi_json_def(json_dict_loc).items())) if json_dict_loc.exists() else {}
+
+        kodi_version_loc = self._json_loc / "version.txt"
+        if kodi_version_loc.exists():
+            api_version = kodi_version_loc.read_text().replace('\n','')
+        else:
+            api_version = "Unknown"
+        LOGGER.debug(f'  Kodi RPC Version: {api_version}')
+
+        return {'namespaces': namespaces, 'references': references, 'notifications': notifications, 'validators': validators,
+                'list_schemas': list_schemas, 'api_version': api_version}
+
+    def _load_kodi_json_def(self, file_name: pathlib.Path) -> dict:
+        """Load kodi namespace definition from configuration json file"""
+        if not file_name.exists():
+            raise FileNotFoundError(file_name)
+        return kodi_json.loads(file_name.read_bytes())
@@ -0,0 +1,81 @@
+"""
+Startup time report for kodi-cli.
+
+Reports the import time of kodi_cli (python -X importtime), the time saved by deferring
+the heavy imports (requests, loguru, importlib.metadata, http.client) and the wall time
+of commands that should not need the network (help, validation).
+
+    python kodi_startup_report.py [-r RUNS] [-n TOP]
+"""
+import argparse
+import pathlib
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+THIS_PATH = pathlib.Path(__file__).absolute().parent
+DEFERRED_MODULES = ['requests', 'loguru', 'importlib.metadata', 'http.client']
+
+
+def import_times(statement: str) -> Dict[str, int]:
+    """Return cumulative import time (us) of each top-level import of statement"""
+    cmd = [sys.executable, '-X', 'importtime', '-c', statement]
+    result = subprocess.run(cmd, capture_output=True, text=True, cwd=THIS_PATH)
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if name.startswith(' ') and not name.startswith('  '):
+            # top-level import (one space of indent)
+            modules[name.strip()] = int(cumulative)
+    return modules
+
+def command_times(args: List[str], runs: int) -> List[float]:
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, 'kodi_cli.py'] + args, capture_output=True, cwd=THIS_PATH)
+        times.append(time.perf_counter() - start)
+    return times
+
+def loaded_modules() -> List[str]:
+    statement = f'import sys, kodi_cli; print(",".join(m for m in {DEFERRED_MODULES} if m in sys.modules))'
+    result = subprocess.run([sys.executable, '-c', statement], capture_output=True, text=True, cwd=THIS_PATH)
+    return [ m for m in result.stdout.strip().split(',') if m ]
+
+def main():
+    parser = argparse.ArgumentParser(description='kodi-cli startup time report')
+    parser.add_argument('-r', '--runs', type=int, default=5, help='Runs per timed command')
+    parser.add_argument('-n', '--top', type=int, default=10, help='Number of slowest imports to list')
+    args = parser.parse_args()
+
+    lazy_modules = import_times('import kodi_cli')
+    lazy_total = lazy_modules.get('kodi_cli', 0)
+    eager_modules = import_times(f'import kodi_cli, {", ".join(DEFERRED_MODULES)}')
+    eager_total = sum(eager_modules.get(name, 0) for name in ['kodi_cli'] + DEFERRED_MODULES)
+
+    print('\nImport time (python -X importtime)\n')
+    print(f'  {"Module":35} {"ms":>8}')
+    print(f"  {'—'*35} {'—'*8}")
+    for name, cumulative in sorted(lazy_modules.items(), key=lambda x: x[1], reverse=True)[:args.top]:
+        print(f'  {name:35} {cumulative/1000:8.1f}')
+    print(f"  {'—'*35} {'—'*8}")
+    print(f'  {"import kodi_cli":35} {lazy_total/1000:8.1f}')
+    print(f'  {"with deferred modules imported":35} {eager_total/1000:8.1f}')
+    print(f'  {"deferred import saving":35} {(eager_total-lazy_total)/1000:8.1f}')
+    loaded = loaded_modules()
+    print(f'\n  Deferred modules loaded by import kodi_cli: {", ".join(loaded) if loaded else "none"}')
+
+    print(f'\nCommand wall time ({args.runs} runs)\n')
+    print(f'  {"Command":35} {"min ms":>8} {"median":>8}')
+    print(f"  {'—'*35} {'—'*8} {'—'*8}")
+    for command in [['help'], ['Application', 'help'], ['Application.GetProperties', 'help'], ['Invalid.Method']]:
+        times = command_times(command, args.runs)
+        print(f'  {" ".join(command):35} {min(times)*1000:8.1f} {statistics.median(times)*1000:8.1f}')
+    print()
+
+if __name__ == "__main__":
+    main()
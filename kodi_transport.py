@@ -0,0 +1,491 @@
+"""
+Kodi JSON-RPC transports.
+
+- HttpTransport: HTTP POST to http://host:port/jsonrpc (keep-alive connection pool)
+- TcpTransport : raw JSON-RPC over a TCP socket (Kodi default port 9090).  One socket is
+                 kept open, requests from any number of threads are pipelined on it and the
+                 responses (which may arrive out of order) are matched back by request id.
+
+A transport sends a request payload (dict, or list for a batch) and returns the response
+body as received (JsonResponse, decoded only when needed).  Connection level failures are raised as TransportError.  When the call is measured
+(kodi_metrics.current()), dns/connect time of new connections, time to first byte and the
+request/response sizes are added to its metrics.
+"""
+import re
+import socket
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Tuple, Union
+
+from kodi_logger import LOGGER
+import kodi_json
+import kodi_metrics
+
+TRANSPORTS = ['http', 'tcp']
+DEFAULT_TCP_PORT = 9090
+
+Payload = Union[dict, List[dict]]
+_UNDECODED = object()
+
+
+class TransportError(Exception):
+    """Connection level failure (connect, send, timeout, non-200 response)"""
+    def __init__(self, message: str, transient: bool = True):
+        super().__init__(message)
+        self.transient = transient  # may succeed if tried again (not i.e. 401 Unauthorized)
+
+def _is_transient(ex: Exception) -> bool:
+    # No response (connection refused/reset, timeout) or a server side error
+    response = getattr(ex, 'response', None)
+    return response is None or response.status_code >= 500
+
+
+class JsonResponse():
+    """
+    A JSON-RPC response body, kept as received (bytes) and decoded at most once: on first
+    use of json, or never (i.e. written to stdout as is).  Responses built locally (errors,
+    batch results) start out decoded.  text is also used for plain (non json) messages.
+    """
+    __slots__ = ('_content', '_text', '_json')
+
+    def __init__(self, content: bytes = None, text: str = None, decoded: Any = _UNDECODED):
+        self._content = content
+        self._text = text
+        self._json = decoded
+
+    @classmethod
+    def from_json(cls, decoded: Any) -> 'JsonResponse':
+        return cls(decoded=decoded)
+
+    @property
+    def content(self) -> bytes:
+        if self._content is None:
+            self._content = self.text.encode('utf-8')
+        return self._content
+
+    @property
+    def text(self) -> str:
+        if self._text is None:
+            self._text = self._content.decode('utf-8') if self._content is not None else kodi_json.dumps(self._json)
+        return self._text
+
+    @property
+    def decoded(self) -> bool:
+        return self._json is not _UNDECODED
+
+    @property
+    def json(self) -> Any:
+        """The decoded body, raises ValueError if it is not json"""
+        if self._json is _UNDECODED:
+            self._json = kodi_json.loads(self._content if self._content is not None else self._text)
+        return self._json
+
+    def error_code(self) -> int:
+        """Code of a JSON-RPC error response, else 0.  The body is only decoded if it contains an "error" key"""
+        if self._json is _UNDECODED:
+            if self._content is not None:
+                if b'"error"' not in self._content:
+                    return 0
+            elif '"error"' not in self._text:
+                return 0
+        resp_json = self.json
+        if isinstance(resp_json, dict) and 'error' in resp_json.keys():
+            return resp_json['error']['code']
+        return 0
+
+    def __len__(self) -> int:
+        return len(self.content)
+
+    def __str__(self) -> str:
+        # Debug logging: a preview, a large body is not decoded for it
+        if self._text is None and self._content is not None:
+            preview, size = self._content[:500].decode('utf-8', 'replace'), len(self._content)
+        else:
+            preview, size = self.text[:500], len(self.text)
+        return preview if size <= 500 else f'{preview}... ({size} total)'
+
+
+class KodiTransport():
+    """Base transport"""
+    def __init__(self, host: str, port: int, timeout: Tuple[float, float] = (5, 3)):
+        self._host = host
+        self._port = port
+        self._timeout = timeout  # connect, read
+
+    @property
+    def url(self) -> str:
+        raise NotImplementedError
+
+    def send(self, payload: Payload) -> JsonResponse:
+        """Send payload, return the response body"""
+        raise NotImplementedError
+
+    def stream(self, payload: Payload, chunk_size: int = 65536) -> Iterator[bytes]:
+        """Send payload, yield the response body in chunks (default: the whole response)"""
+        yield self.send(payload).content
+
+    def close(self):
+        pass
+
+
+# == HTTP ===========================================================================================
+class HttpTransport(KodiTransport):
+    def __init__(self, host: str, port: int, user: str = None, password: str = None, pool_size: int = 10, timeout: Tuple[float, float] = (5, 3)):
+        super().__init__(host, port, timeout)
+        self._user = user
+        self._password = password
+        self._pool_size = pool_size
+        self._session = None
+        self._session_lock = threading.Lock()
+        self._url = f'http://{host}:{port}/jsonrpc'
+
+    @property
+    def url(self) -> str:
+        return self._url
+
+    def send(self, payload: Payload) -> JsonResponse:
+        import requests
+        data = kodi_json.dumpb(payload)
+        try:
+            resp = self._get_session().post(self._url, data=data, timeout=self._timeout)
+            resp.raise_for_status()
+        except requests.RequestException as re:
+            raise TransportError(repr(re), _is_transient(re)) from re
+        metrics = kodi_metrics.current()
+        if metrics is not None:
+            # elapsed: request sent until the response headers are parsed
+            metrics.ttfb_ms = resp.elapsed.total_seconds() * 1000
+            metrics.request_bytes += len(data)
+            metrics.response_bytes += len(resp.content)
+        # Kodi sends utf-8 json, the body is passed on undecoded
+        return JsonResponse(resp.content)
+
+    def stream(self, payload: Payload, chunk_size: int = 65536) -> Iterator[bytes]:
+        import requests
+        data = kodi_json.dumpb(payload)
+        metrics = kodi_metrics.current()
+        try:
+            with self._get_session().post(self._url, data=data, timeout=self._timeout, stream=True) as resp:
+                resp.raise_for_status()
+                if metrics is not None:
+                    metrics.ttfb_ms = resp.elapsed.total_seconds() * 1000
+                    metrics.request_bytes += len(data)
+                for chunk in resp.iter_content(chunk_size):
+                    if metrics is not None:
+                        metrics.response_bytes += len(chunk)
+                    yield chunk
+        except requests.RequestException as re:
+            raise TransportError(repr(re), _is_transient(re)) from re
+
+    def close(self):
+        """Close the keep-alive connection pool (re-opened on next request)"""
+        with self._session_lock:
+            if self._session is not None:
+                LOGGER.debug(f'Closing connection pool for {self._host}')
+                self._session.close()
+                self._session = None
+
+    def _get_session(self) -> 'requests.Session':
+        """Return the keep-alive session for this host, creating the connection pool on first use"""
+        # requests is imported on first use, commands that don't call kodi never load it
+        import requests
+        with self._session_lock:
+            if self._session is None:
+                LOGGER.trace(f'Creating connection pool for {self._host} (size: {self._pool_size})')
+                session = requests.Session()
+                adapter = _timed_adapter_class()(pool_connections=1, pool_maxsize=self._pool_size)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                session.auth = (self._user, self._password)
+                session.headers.update({"Content-type": "application/json"})
+                self._session = session
+            return self._session
+
+
+_TIMED_ADAPTER = None
+
+def _timed_adapter_class() -> type:
+    """
+    requests HTTPAdapter whose new connections add dns/connect time to the call's metrics.
+    The classes are built on first use (requests/urllib3 are imported lazily).
+    """
+    global _TIMED_ADAPTER
+    if _TIMED_ADAPTER is None:
+        from requests.adapters import HTTPAdapter
+        from urllib3.connection import HTTPConnection
+        from urllib3.connectionpool import HTTPConnectionPool
+
+        class TimedHTTPConnection(HTTPConnection):
+            def _new_conn(self):
+                metrics = kodi_metrics.current()
+                if metrics is None:
+                    return super()._new_conn()
+                dns_host = self._dns_host
+                start = time.perf_counter()
+                try:
+                    # Resolved here to time it apart from the connect, the connect then uses the address
+                    self._dns_host = socket.getaddrinfo(dns_host, self.port, 0, socket.SOCK_STREAM)[0][4][0]
+                except (OSError, IndexError):
+                    pass  # the connect below raises the resolution error as usual
+                resolved = time.perf_counter()
+                try:
+                    sock = super()._new_conn()
+                finally:
+                    self._dns_host = dns_host
+                metrics.add_time('dns_ms', resolved - start)
+                metrics.add_time('connect_ms', time.perf_counter() - resolved)
+                return sock
+
+        class TimedHTTPConnectionPool(HTTPConnectionPool):
+            ConnectionCls = TimedHTTPConnection
+
+        class TimedHTTPAdapter(HTTPAdapter):
+            def init_poolmanager(self, *args, **kwargs):
+                super().init_poolmanager(*args, **kwargs)
+                self.poolmanager.pool_classes_by_scheme = dict(self.poolmanager.pool_classes_by_scheme, http=TimedHTTPConnectionPool)
+
+        _TIMED_ADAPTER = TimedHTTPAdapter
+    return _TIMED_ADAPTER
+
+
+# == TCP ============================================================================================
+_LEADING_ID = re.compile(rb'\s*\{\s*"id"\s*:\s*(-?\d+)\s*[,}]')
+
+class _PendingRequest():
+    def __init__(self, ids: List[int]):
+        self.ids = ids
+        self.done = threading.Event()
+        self.response: JsonResponse = None
+        self.error: Exception = None
+        self.first_byte: float = None  # perf_counter() when the response started to arrive
+        self.size = 0
+
+
+class JsonMessageSplitter():
+    """
+    Split a byte stream of concatenated json values (as sent on the Kodi TCP socket) into
+    complete messages.  Braces are counted incrementally, outside of strings, so a large
+    response arriving in many pieces is scanned once.  Text between braces (strings
+    included) is skipped with one regex match, a string not complete yet is scanned again
+    from its opening quote when more data arrives.
+    """
+    _OPEN = (ord('{'), ord('['))
+    _QUOTE = ord('"')
+    # up to the next brace outside of a string (unrolled loops, no backtracking)
+    _SKIP = re.compile(rb'[^"{}\[\]]*(?:"[^"\\]*(?:\\.[^"\\]*)*"[^"{}\[\]]*)*', re.DOTALL)
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._pos = 0
+        self._depth = 0
+
+    @property
+    def pending(self) -> bool:
+        """True while a message is partially received"""
+        return bool(self._buffer)
+
+    def feed(self, data: bytes) -> List[bytes]:
+        """Add received data, return the messages completed by it"""
+        self._buffer.extend(data)
+        messages = []
+        buffer = self._buffer
+        pos = self._pos
+        while True:
+            pos = self._SKIP.match(buffer, pos).end()
+            if pos >= len(buffer) or buffer[pos] == self._QUOTE:
+                break  # all scanned, or in a string that is not complete yet
+            if buffer[pos] in self._OPEN:
+                self._depth += 1
+                pos += 1
+                continue
+            self._depth -= 1
+            pos += 1
+            if self._depth == 0:
+                messages.append(bytes(buffer[:pos]).strip())
+                del buffer[:pos]
+                pos = 0
+        self._pos = pos
+        if self._depth == 0 and not buffer.strip():
+            buffer.clear()
+            self._pos = 0
+        return messages
+
+
+class TcpTransport(KodiTransport):
+    """
+    JSON-RPC over a persistent TCP socket.
+
+    send() may be called from many threads, each request is written as soon as it is sent
+    (pipelined) and the caller waits for the response carrying its id.  A reader thread
+    receives the responses and hands them to the waiting callers.  Messages without an id
+    (Kodi notifications) are passed to notification_handler, if set.
+    """
+    def __init__(self, host: str, port: int = DEFAULT_TCP_PORT, timeout: Tuple[float, float] = (5, 3),
+                 notification_handler: Callable[[dict], None] = None):
+        super().__init__(host, port, timeout)
+        self.notification_handler = notification_handler
+        self._sock: socket.socket = None
+        self._reader: threading.Thread = None
+        self._lock = threading.Lock()       # socket state and pending table
+        self._send_lock = threading.Lock()  # whole messages are written one at a time
+        self._pending: Dict[int, _PendingRequest] = {}
+        self._last_recv = 0.0
+
+    @property
+    def url(self) -> str:
+        return f'tcp://{self._host}:{self._port}'
+
+    def send(self, payload: Payload) -> JsonResponse:
+        ids = [ entry['id'] for entry in payload ] if isinstance(payload, list) else [payload['id']]
+        request = _PendingRequest(ids)
+        data = kodi_json.dumpb(payload)
+        sock = self._connect()
+        with self._lock:
+            for req_id in ids:
+                self._pending[req_id] = request
+        sent = time.perf_counter()
+        try:
+            with self._send_lock:
+                sock.sendall(data)
+        except OSError as ose:
+            self._fail_connection(sock, ose)
+            with self._lock:
+                for req_id in ids:
+                    self._pending.pop(req_id, None)
+            if not request.done.is_set():
+                request.error = ose
+                request.done.set()
+        self._wait(request)
+        if request.error:
+            raise TransportError(repr(request.error)) from request.error
+        metrics = kodi_metrics.current()
+        if metrics is not None:
+            metrics.ttfb_ms = (request.first_byte - sent) * 1000 if request.first_byte else None
+            metrics.request_bytes += len(data)
+            metrics.response_bytes += request.size
+        return request.response
+
+    def close(self):
+        with self._lock:
+            sock = self._sock
+        if sock is not None:
+            LOGGER.debug(f'Closing tcp connection to {self._host}:{self._port}')
+            self._fail_connection(sock, ConnectionAbortedError('Connection closed'))
+
+    def _connect(self) -> socket.socket:
+        with self._lock:
+            if self._sock is None:
+                LOGGER.trace(f'Opening tcp connection to {self._host}:{self._port}')
+                try:
+                    sock = self._open_socket()
+                except OSError as ose:
+                    raise TransportError(repr(ose)) from ose
+                sock.settimeout(None)
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                self._sock = sock
+                self._last_recv = time.monotonic()
+                self._reader = threading.Thread(target=self._read_loop, args=(sock,), name=f'kodi-tcp-{self._host}', daemon=True)
+                self._reader.start()
+            return self._sock
+
+    def _open_socket(self) -> socket.socket:
+        metrics = kodi_metrics.current()
+        if metrics is None:
+            return socket.create_connection((self._host, self._port), timeout=self._timeout[0])
+        start = time.perf_counter()
+        address = socket.getaddrinfo(self._host, self._port, 0, socket.SOCK_STREAM)[0][4][0]
+        resolved = time.perf_counter()
+        sock = socket.create_connection((address, self._port), timeout=self._timeout[0])
+        metrics.add_time('dns_ms', resolved - start)
+        metrics.add_time('connect_ms', time.perf_counter() - resolved)
+        return sock
+
+    def _wait(self, request: _PendingRequest):
+        # Read timeout is the time without receiving anything, large responses may take longer overall
+        while not request.done.wait(self._timeout[1]):
+            if time.monotonic() - self._last_recv >= self._timeout[1]:
+                with self._lock:
+                    for req_id in request.ids:
+                        self._pending.pop(req_id, None)
+                request.error = TimeoutError(f'No response from {self.url} in {self._timeout[1]} seconds')
+                return
+
+    def _read_loop(self, sock: socket.socket):
+        splitter = JsonMessageSplitter()
+        try:
+            while True:
+                data = sock.recv(65536)
+                if not data:
+                    raise ConnectionResetError('Connection closed by host')
+                self._last_recv = time.monotonic()
+                received = time.perf_counter()
+                if not splitter.pending:
+                    message_start = received
+                for message in splitter.feed(data):
+                    self._dispatch(message, message_start)
+                    message_start = received
+        except OSError as ose:
+            self._fail_connection(sock, ose)
+
+    def _dispatch(self, message: bytes, first_byte: float = None):
+        response = JsonResponse(message)
+        head = _LEADING_ID.match(message)
+        if head is not None:
+            # {"id": N, ... (Kodi writes keys in order): matched without decoding the response
+            ids = [int(head.group(1))]
+        else:
+            try:
+                resp_json = response.json
+            except ValueError as ve:
+                LOGGER.debug(f'Unparsable message from {self.url}: {repr(ve)}')
+                return
+            if isinstance(resp_json, list):
+                ids = [ entry.get('id') for entry in resp_json if isinstance(entry, dict) ]
+            else:
+                ids = [resp_json.get('id')]
+                if 'id' not in resp_json and 'method' in resp_json:
+                    if self.notification_handler:
+                        self.notification_handler(resp_json)
+                    return
+        with self._lock:
+            request = next((self._pending[req_id] for req_id in ids if req_id in self._pending), None)
+            if request is None and ids == [None] and self._pending:
+                # Request rejected as a whole (i.e. parse error), attribute to the oldest
+                request = next(iter(self._pending.values()))
+            if request is None:
+                LOGGER.debug(f'Unmatched response from {self.url}: {response}')
+                return
+            for req_id in request.ids:
+                self._pending.pop(req_id, None)
+        request.response = response
+        request.first_byte = first_byte
+        request.size = len(message)
+        request.done.set()
+
+    def _fail_connection(self, sock: socket.socket, error: Exception):
+        """Drop the connection, fail all requests waiting on it"""
+        with self._lock:
+            if self._sock is not sock:
+                return
+            self._sock = None
+            pending = list({ id(req): req for req in self._pending.values() }.values())
+            self._pending.clear()
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        sock.close()
+        if pending:
+            LOGGER.debug(f'Connection to {self.url} lost, {len(pending)} request(s) failed: {repr(error)}')
+        for request in pending:
+            request.error = error
+            request.done.set()
+
+
+def create_transport(transport: str, host: str, port: int, user: str = None, password: str = None, pool_size: int = 10) -> KodiTransport:
+    """Return the transport for the transport name (http|tcp)"""
+    if transport == 'http':
+        return HttpTransport(host, port, user, password, pool_size)
+    if transport == 'tcp':
+        return TcpTransport(host, port)
+    raise ValueError(f"Unknown transport '{transport}', valid values: {', '.join(TRANSPORTS)}")
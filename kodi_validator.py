@@ -0,0 +1,363 @@
+"""
+Client-side parameter validation compiled from the Kodi json schema (methods.json, types.json).
+
+Each method's parameter definitions, with every $ref and extends resolved, are compiled once
+into a tree of validator objects (cached with the schema, see KodiSchema).  A validator checks
+a value and coerces command line input to the declared type (i.e. "5" -> 5 for an integer,
+a single value -> [value] for an array), so invalid requests fail locally instead of after a
+round trip to Kodi.
+"""
+import copy
+from typing import Dict, List
+
+INVALID_PARAMS_CODE = -32602  # json-rpc 'Invalid params', as returned by Kodi
+
+
+class ParameterError(ValueError):
+    def __init__(self, path: str, message: str, mismatch: bool = False):
+        super().__init__(f'{path}: {message}')
+        self.path = path
+        self.message = message
+        self.mismatch = mismatch  # value is of another type/shape (as opposed to a bad value)
+
+
+# == Validators =====================================================================================
+class Validator():
+    """Base validator, accepts any value"""
+    __slots__ = ()
+    type_name = 'any'
+
+    def validate(self, value, path: str, coerce: bool = True):
+        """Return value (coerced when allowed), raise ParameterError if it does not match"""
+        return value
+
+    def _fail(self, value, path: str, expected: str = None):
+        raise ParameterError(path, f'expected {expected or self.type_name}, received {value!r}', mismatch=True)
+
+
+class NullValidator(Validator):
+    __slots__ = ()
+    type_name = 'null'
+
+    def validate(self, value, path: str, coerce: bool = True):
+        if value is None:
+            return value
+        if coerce and value in ('', 'null', 'None'):
+            return None
+        self._fail(value, path)
+
+
+class BooleanValidator(Validator):
+    __slots__ = ()
+    type_name = 'boolean'
+
+    def validate(self, value, path: str, coerce: bool = True):
+        if isinstance(value, bool):
+            return value
+        if coerce and isinstance(value, str) and value.lower() in ('true', 'false'):
+            return value.lower() == 'true'
+        self._fail(value, path)
+
+
+class NumberValidator(Validator):
+    __slots__ = ('minimum', 'maximum')
+    type_name = 'number'
+
+    def __init__(self, minimum=None, maximum=None):
+        self.minimum = minimum
+        self.maximum = maximum
+
+    def validate(self, value, path: str, coerce: bool = True):
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            value = self._coerce(value, path) if coerce else self._fail(value, path)
+        if self.minimum is not None and value < self.minimum:
+            raise ParameterError(path, f'{value} is less than the minimum ({self.minimum})')
+        if self.maximum is not None and value > self.maximum:
+            raise ParameterError(path, f'{value} is more than the maximum ({self.maximum})')
+        return value
+
+    def _coerce(self, value, path: str):
+        try:
+            return float(value) if isinstance(value, str) else self._fail(value, path)
+        except ValueError:
+            self._fail(value, path)
+
+
+class IntegerValidator(NumberValidator):
+    __slots__ = ()
+    type_name = 'integer'
+
+    def validate(self, value, path: str, coerce: bool = True):
+        if isinstance(value, float) and value.is_integer() and coerce:
+            value = int(value)
+        elif isinstance(value, float):
+            self._fail(value, path)
+        return super().validate(value, path, coerce)
+
+    def _coerce(self, value, path: str):
+        try:
+            return int(value) if isinstance(value, str) else self._fail(value, path)
+        except ValueError:
+            self._fail(value, path)
+
+
+class StringValidator(Validator):
+    __slots__ = ('enum', 'min_length')
+    type_name = 'string'
+
+    def __init__(self, enum: List[str] = None, min_length: int = None):
+        self.enum = frozenset(enum) if enum else None
+        self.min_length = min_length
+
+    def validate(self, value, path: str, coerce: bool = True):
+        if not isinstance(value, str):
+            # The command line turns numeric/boolean looking values into int/bool
+            if coerce and isinstance(value, bool):
+                value = str(value).lower()
+            elif coerce and isinstance(value, (int, float)):
+                value = str(value)
+            else:
+                self._fail(value, path)
+        if self.enum is not None and value not in self.enum:
+            raise ParameterError(path, f"'{value}' is not one of: {', '.join(sorted(self.enum))}")
+        if self.min_length is not None and len(value) < self.min_length:
+            raise ParameterError(path, f"'{value}' is shorter than {self.min_length} characters")
+        return value
+
+
+class ArrayValidator(Validator):
+    __slots__ = ('items', 'min_items', 'max_items', 'unique')
+    type_name = 'array'
+
+    def __init__(self, items: Validator, min_items: int = None, max_items: int = None, unique: bool = False):
+        self.items = items
+        self.min_items = min_items
+        self.max_items = max_items
+        self.unique = unique
+
+    def validate(self, value, path: str, coerce: bool = True):
+        if not isinstance(value, list):
+            if coerce and isinstance(value, tuple):
+                value = list(value)
+            elif coerce and value is not None and not isinstance(value, dict):
+                value = [value]  # properties=title
+            else:
+                self._fail(value, path)
+        if self.min_items is not None and len(value) < self.min_items:
+            raise ParameterError(path, f'at least {self.min_items} item(s) required')
+        if self.max_items is not None and len(value) > self.max_items:
+            raise ParameterError(path, f'at most {self.max_items} item(s) allowed')
+        items = [ self.items.validate(item, f'{path}[{idx}]', coerce) for idx, item in enumerate(value) ]
+        if self.unique:
+            seen = set()
+            for item in items:
+                key = repr(item)
+                if key in seen:
+                    raise ParameterError(path, f'duplicate item {item!r}')
+                seen.add(key)
+        return items
+
+
+class ObjectValidator(Validator):
+    __slots__ = ('properties', 'required', 'additional')
+    type_name = 'object'
+
+    def __init__(self, properties: Dict[str, Validator], required: List[str], additional: Validator = None):
+        self.properties = properties
+        self.required = tuple(required)
+        self.additional = additional  # None = no additional properties allowed
+
+    def validate(self, value, path: str, coerce: bool = True):
+        if not isinstance(value, dict):
+            self._fail(value, path)
+        for name in self.required:
+            if name not in value:
+                raise ParameterError(f'{path}.{name}', 'required property is missing', mismatch=True)
+        result = {}
+        for name, prop_value in value.items():
+            validator = self.properties.get(name, self.additional)
+            if validator is None:
+                raise ParameterError(path, f"unknown property '{name}', valid: {', '.join(self.properties.keys())}", mismatch=True)
+            result[name] = validator.validate(prop_value, f'{path}.{name}', coerce)
+        return result
+
+
+class UnionValidator(Validator):
+    """Value must match one of the alternatives, an exact match is preferred over a coerced one"""
+    __slots__ = ('alternatives',)
+
+    def __init__(self, alternatives: List[Validator]):
+        self.alternatives = tuple(alternatives)
+
+    @property
+    def type_name(self) -> str:
+        return '|'.join(dict.fromkeys(alt.type_name for alt in self.alternatives))
+
+    def validate(self, value, path: str, coerce: bool = True):
+        errors = []
+        for attempt_coerce in ((False, True) if coerce else (False,)):
+            for alternative in self.alternatives:
+                try:
+                    return alternative.validate(value, path, attempt_coerce)
+                except ParameterError as pe:
+                    errors.append(pe)
+        # Report a bad value of an alternative of the right shape (the deepest), rather than each mismatch
+        value_errors = [ pe for pe in errors if not pe.mismatch ]
+        if value_errors:
+            raise max(value_errors, key=lambda pe: len(pe.path))
+        raise ParameterError(path, f'{value!r} does not match any of: {self.type_name}', mismatch=True)
+
+
+class RefValidator(Validator):
+    """Named type (types.json), resolved after compilation so recursive types are possible"""
+    __slots__ = ('ref_id', 'target')
+
+    def __init__(self, ref_id: str):
+        self.ref_id = ref_id
+        self.target: Validator = None
+
+    @property
+    def type_name(self) -> str:
+        return self.ref_id
+
+    def validate(self, value, path: str, coerce: bool = True):
+        return self.target.validate(value, path, coerce)
+
+
+class MethodValidator():
+    """Validates/coerces the parameters of one method"""
+    __slots__ = ('method', 'params', 'required')
+
+    def __init__(self, method: str, params: Dict[str, Validator], required: List[str]):
+        self.method = method
+        self.params = params
+        self.required = tuple(required)
+
+    def validate(self, input_params: dict, coerce: bool = True) -> dict:
+        for name in self.required:
+            if name not in input_params:
+                raise ParameterError(name, 'required parameter is missing')
+        result = {}
+        for name, value in input_params.items():
+            validator = self.params.get(name)
+            if validator is None:
+                valid = ', '.join(self.params.keys()) or 'none'
+                raise ParameterError(name, f'unknown parameter for {self.method}, valid: {valid}')
+            result[name] = validator.validate(value, name, coerce)
+        return result
+
+
+# == Compiler =======================================================================================
+class SchemaCompiler():
+    """Compile Kodi json schema definitions into validators"""
+    _SIMPLE_TYPES = {'any': Validator, 'null': NullValidator, 'boolean': BooleanValidator}
+
+    def __init__(self, references: dict):
+        self._references = references
+        self._refs: Dict[str, RefValidator] = {}
+        self._any = Validator()
+
+    def compile_methods(self, methods: Dict[str, dict]) -> Dict[str, MethodValidator]:
+        """Method name (Namespace.Method) -> MethodValidator"""
+        return { name: self.compile_method(name, definition.get('params', [])) for name, definition in methods.items() }
+
+    def compile_method(self, method: str, param_list: List[dict]) -> MethodValidator:
+        params = {}
+        required = []
+        for param_def in param_list:
+            params[param_def['name']] = self.compile(param_def)
+            # A default is supplied when the parameter is omitted
+            if param_def.get('required', False) and 'default' not in param_def:
+                required.append(param_def['name'])
+        return MethodValidator(method, params, required)
+
+    def compile(self, definition) -> Validator:
+        if isinstance(definition, str):
+            return self._compile_type_name(definition, {})
+        if 'extends' in definition:
+            definition = self._extend(definition)
+        type_token = definition.get('type')
+        if type_token is None:
+            if '$ref' in definition:
+                return self._compile_ref(definition['$ref'])
+            return self._any
+        if isinstance(type_token, list):
+            return UnionValidator([ self.compile(alt) for alt in type_token ])
+        if isinstance(type_token, dict):
+            return self.compile(type_token)
+        return self._compile_type_name(type_token, definition)
+
+    def _compile_type_name(self, type_name: str, definition: dict) -> Validator:
+        type_name_lc = type_name.lower()
+        if type_name_lc in self._SIMPLE_TYPES:
+            return self._SIMPLE_TYPES[type_name_lc]()
+        if type_name_lc == 'integer':
+            return IntegerValidator(definition.get('minimum'), definition.get('maximum'))
+        if type_name_lc == 'number':
+            return NumberValidator(definition.get('minimum'), definition.get('maximum'))
+        if type_name_lc == 'string':
+            return StringValidator(definition.get('enum') or definition.get('enums'), definition.get('minLength'))
+        if type_name_lc == 'array':
+            items = definition.get('items')
+            return ArrayValidator(self.compile(items) if items else self._any, definition.get('minItems'),
+                                  definition.get('maxItems'), definition.get('uniqueItems', False))
+        if type_name_lc == 'object':
+            return self._compile_object(definition)
+        if type_name in self._references:
+            # Some definitions name a type instead of using $ref
+            return self._compile_ref(type_name)
+        return self._any
+
+    def _compile_object(self, definition: dict) -> ObjectValidator:
+        properties = {}
+        required = []
+        for name, prop_def in definition.get('properties', {}).items():
+            properties[name] = self.compile(prop_def)
+            if isinstance(prop_def, dict) and prop_def.get('required', False):
+                required.append(name)
+        additional = definition.get('additionalProperties', True)
+        if additional is False:
+            additional_validator = None
+        elif isinstance(additional, dict):
+            additional_validator = self.compile(additional)
+        else:
+            additional_validator = self._any
+        return ObjectValidator(properties, required, additional_validator)
+
+    def _compile_ref(self, ref_id: str) -> Validator:
+        if ref_id not in self._references:
+            return self._any
+        ref = self._refs.get(ref_id)
+        if ref is None:
+            ref = RefValidator(ref_id)
+            self._refs[ref_id] = ref  # registered first, the definition may refer to itself
+            ref.target = self.compile(self._references[ref_id])
+        return ref
+
+    def _extend(self, definition: dict) -> dict:
+        """Merge the extended type(s) into the definition (own values win, properties are combined)"""
+        bases = definition['extends']
+        merged = {}
+        for base_id in ([bases] if isinstance(bases, str) else bases):
+            base = self._references.get(base_id, {})
+            if 'extends' in base:
+                base = self._extend(base)
+            merged = self._merge(merged, base)
+        own = { key: value for key, value in definition.items() if key != 'extends' }
+        return self._merge(merged, own)
+
+    def _merge(self, base: dict, own: dict) -> dict:
+        merged = copy.copy(base)
+        for key, value in own.items():
+            if key == 'properties' and isinstance(merged.get(key), dict):
+                merged[key] = dict(merged[key], **value)
+            else:
+                merged[key] = value
+        return merged
+
+
+def invalid_params_response(method: str, error: ParameterError, request_id=1) -> dict:
+    """Error response, in the form Kodi reports invalid parameters"""
+    return {"id": request_id, "jsonrpc": "2.0",
+            "error": {"code": INVALID_PARAMS_CODE, "message": "Invalid params.",
+                      "data": {"method": method, "stack": {"name": error.path, "message": error.message}}}}
@@ -0,0 +1,38 @@
+"""Inventory csv files: a full export and a delta patch write the same records"""
+import kodi_inventory_store as store
+
+MOVIES = [
+    {'movieid': 1, 'title': 'Alien', 'votes': '120', 'rating': 8.5, 'genre': ['Horror', 'Sci-Fi']},
+    {'movieid': 2, 'title': '1917', 'votes': '', 'rating': 8.25, 'genre': ['War']},
+    {'movieid': 3, 'title': 'Heat "95"', 'votes': '75', 'rating': 8, 'genre': []},
+]
+
+
+def _export(file_nm, entries):
+    with store.CsvWriter(str(file_nm)) as writer:
+        for entry in entries:
+            writer.write(entry)
+
+def test_integer_text_in_text_column_is_not_quoted(tmp_path):
+    _export(tmp_path / 'movies.csv', MOVIES)
+    lines = (tmp_path / 'movies.csv').read_text(encoding='UTF-8').splitlines()
+    assert lines[2] == '2,1917,"",8.25,"War"'
+    assert lines[2] == store.csv_record(MOVIES[1])
+
+def test_delta_patch_matches_full_export(tmp_path):
+    full_file = tmp_path / 'full.csv'
+    _export(full_file, MOVIES)
+    patched_file = tmp_path / 'patched.csv'
+    _export(patched_file, [MOVIES[0], dict(MOVIES[1], title='Dunkirk'), MOVIES[2]])
+    assert store.patch_csv(str(patched_file), 'movieid', {'2': MOVIES[1]}, set())
+    assert patched_file.read_bytes() == full_file.read_bytes()
+
+def test_delta_patch_adds_record_as_full_export(tmp_path):
+    full_file = tmp_path / 'full.csv'
+    _export(full_file, MOVIES)
+    patched_file = tmp_path / 'patched.csv'
+    _export(patched_file, [MOVIES[0], MOVIES[2]])
+    assert store.patch_csv(str(patched_file), 'movieid', {'2': MOVIES[1]}, set())
+    full = full_file.read_text(encoding='UTF-8').splitlines()
+    patched = patched_file.read_text(encoding='UTF-8').splitlines()
+    assert sorted(patched) == sorted(full)
@@ -0,0 +1,71 @@
+"""TcpTransport against the mock server: pipelined requests, batches and a dropped connection"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from kodi_mock_server import MockKodi, MockKodiServer
+from kodi_transport import TcpTransport, TransportError
+
+
+def _payload(req_id: int, method: str = 'JSONRPC.Ping', params: dict = None) -> dict:
+    return {"jsonrpc": "2.0", "id": req_id, "method": method, "params": params or {}}
+
+@pytest.fixture
+def shuffled_server():
+    # Random delays (up to 0.2s) so pipelined and batch responses come back out of order
+    with MockKodiServer(MockKodi(list_size=5, delay=0.2, shuffle=True)) as server:
+        yield server
+
+@pytest.fixture
+def transport(shuffled_server):
+    transport = TcpTransport('127.0.0.1', shuffled_server.tcp_port)
+    yield transport
+    transport.close()
+
+
+def test_concurrent_sends_get_their_own_response(transport):
+    params = [ {'limits': {'start': idx, 'end': idx + 1}} for idx in range(20) ]
+
+    def send(idx: int):
+        return transport.send(_payload(idx + 1, 'VideoLibrary.GetMovies', params[idx])).json
+
+    with ThreadPoolExecutor(max_workers=20) as executor:
+        responses = list(executor.map(send, range(20)))
+    for idx, response in enumerate(responses):
+        assert response['id'] == idx + 1
+        assert response['result']['limits']['start'] == idx
+
+def test_batch_responses_match_request_ids(transport):
+    batch = [ _payload(req_id) for req_id in range(100, 110) ]
+    single = threading.Thread(target=transport.send, args=(_payload(1),))
+    single.start()
+    response = transport.send(batch).json
+    single.join()
+    assert sorted(entry['id'] for entry in response) == list(range(100, 110))
+    assert all(entry['result'] == 'pong' for entry in response)
+
+def test_dropped_connection_fails_pending_requests():
+    server = MockKodiServer(MockKodi(delay=5.0)).start()
+    transport = TcpTransport('127.0.0.1', server.tcp_port, timeout=(5, 10))
+    errors = []
+
+    def send(req_id: int):
+        try:
+            transport.send(_payload(req_id))
+        except TransportError as te:
+            errors.append(te)
+
+    senders = [ threading.Thread(target=send, args=(req_id,)) for req_id in range(1, 4) ]
+    for sender in senders:
+        sender.start()
+    time.sleep(0.5)
+    started = time.monotonic()
+    server.stop()
+    for sender in senders:
+        sender.join(timeout=5)
+    assert len(errors) == 3
+    # failed as the connection dropped, not after the server delay or the read timeout
+    assert time.monotonic() - started < 2
+    transport.close()